@@ -0,0 +1,187 @@
+"""
+Batch question answering over the pgvector index.
+
+Reads questions from a JSONL file ({"id": ..., "question": ...} per line) or a
+CSV file with `id`/`question` columns, embeds them in bulk, retrieves context
+for all of them over one connection and runs generations with bounded
+concurrency. Each answer is appended to a JSONL file as soon as it finishes, so
+an interrupted run can be resumed: questions whose id already has an answer in
+the output file are skipped.
+
+With server_url (DM_SERVER_URL, or --server on ollama.py) each question is
+sent to a running server.py instead, which embeds, searches and generates in
+its warm process; this process then needs neither the database nor Ollama.
+"""
+
+import csv
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Set
+
+from context_compress import compress_results, format_context
+from ollama import OLLAMA_MODEL, embed_batch, ensure_folder_indexed, generate, list_folder_pdfs, server_request
+
+
+def _question_id(question: str) -> str:
+    return hashlib.sha1(question.encode("utf-8")).hexdigest()[:12]
+
+
+def read_questions(path: str) -> List[Dict[str, str]]:
+    """Load questions from JSONL or CSV; rows without an id get a hash of the question."""
+    rows: List[Dict[str, str]] = []
+    with open(path, newline="", encoding="utf-8") as handle:
+        if path.lower().endswith(".csv"):
+            records = list(csv.DictReader(handle))
+        else:
+            records = [json.loads(line) for line in handle if line.strip()]
+    for record in records:
+        question = (record.get("question") or "").strip()
+        if not question:
+            continue
+        rows.append({"id": str(record.get("id") or _question_id(question)), "question": question})
+    return rows
+
+
+def answered_ids(output_path: str) -> Set[str]:
+    """Ids that already have a successful answer in output_path."""
+    done: Set[str] = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as handle:
+        for line in handle:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # partially written last line of an interrupted run
+            if record.get("id") and not record.get("error"):
+                done.add(record["id"])
+    return done
+
+
+def _answer(row: Dict[str, str], context: str, model: str) -> Dict:
+    prompt = f"Context:\n{context}\n\nQuestion: {row['question']}\nAnswer based on this context:"
+    started = time.perf_counter()
+    try:
+        data = generate(prompt, model=model, path="batch-rag")
+    except Exception as e:
+        return {"error": f"Error querying Ollama: {e}", "generate_ms": (time.perf_counter() - started) * 1000}
+    return {
+        "answer": data.get("response", "").strip(),
+        "generate_ms": (time.perf_counter() - started) * 1000,
+        "prompt_eval_count": data.get("prompt_eval_count"),
+        "eval_count": data.get("eval_count"),
+    }
+
+
+def _ask_server(server_url: str, row: Dict[str, str], document_paths: Optional[List[str]], k: int) -> Dict:
+    payload = {"question": row["question"], "document_paths": document_paths or [], "k": k, "stream": False}
+    started = time.perf_counter()
+    try:
+        body = server_request(server_url, "/ask", payload)
+    except Exception as e:
+        return {"error": f"Error querying server: {e}", "generate_ms": (time.perf_counter() - started) * 1000}
+    stats = body.get("stats") or {}
+    return {
+        "answer": body.get("answer", ""),
+        "sources": [
+            {"document_title": s["document_title"], "file_path": s["file_path"], "distance": s["distance"]}
+            for s in body.get("sources", [])
+        ],
+        "embed_ms": stats.get("embed_ms"),
+        "search_ms": stats.get("search_ms"),
+        "generate_ms": (time.perf_counter() - started) * 1000,
+    }
+
+
+def _run_on_server(server_url: str, pending: List[Dict[str, str]], output_path: str, pdf_folder: Optional[str], k: int, concurrency: int) -> int:
+    # Indexing is left to ingest_worker.py: the server answers from what is indexed
+    document_paths = list_folder_pdfs(pdf_folder) if pdf_folder else None
+    started = time.perf_counter()
+    written = 0
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = {pool.submit(_ask_server, server_url, row, document_paths, k): row for row in pending}
+        for future in as_completed(futures):
+            row = futures[future]
+            record = {"id": row["id"], "question": row["question"], **future.result()}
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            written += 1
+            print(f"[{written}/{len(pending)}] {row['id']}: {'error' if record.get('error') else 'ok'}")
+    elapsed = time.perf_counter() - started
+    print(f"Answered {written} questions via {server_url} in {elapsed:.1f}s ({written / elapsed:.2f} questions/s)")
+    return written
+
+
+def run_batch(
+    questions_path: str,
+    output_path: str,
+    pdf_folder: Optional[str] = None,
+    k: int = 6,
+    concurrency: int = 4,
+    model: str = OLLAMA_MODEL,
+    verify: bool = False,
+    server_url: Optional[str] = None,
+) -> int:
+    """Answer every pending question in questions_path; returns the number written."""
+    rows = read_questions(questions_path)
+    done = answered_ids(output_path)
+    pending = [row for row in rows if row["id"] not in done]
+    print(f"{len(rows)} questions, {len(rows) - len(pending)} already answered, {len(pending)} to run")
+    if not pending:
+        return 0
+    if server_url:
+        return _run_on_server(server_url, pending, output_path, pdf_folder, k, concurrency)
+
+    from rag_store import RagStore  # needs SQLAlchemy/pgvector
+
+    store = RagStore()
+    store.ensure_schema()
+    document_paths = ensure_folder_indexed(store, pdf_folder, verify=verify) if pdf_folder else None
+
+    started = time.perf_counter()
+    embeddings = embed_batch([row["question"] for row in pending])
+    if len(embeddings) != len(pending):
+        raise RuntimeError("Embedding the questions failed; is the Ollama embedding model available?")
+    embed_ms = (time.perf_counter() - started) * 1000 / len(pending)
+
+    started = time.perf_counter()
+    all_candidates = store.search_many(embeddings, document_paths=document_paths, k=k * 3, include_embeddings=True)
+    all_results = []
+    tokens_saved = 0
+    for embedding, candidates in zip(embeddings, all_candidates):
+        results, stats = compress_results(embedding, candidates, k=k)
+        all_results.append(results)
+        tokens_saved += stats.tokens_saved
+    search_ms = (time.perf_counter() - started) * 1000 / len(pending)
+    print(f"Context compression saved ~{tokens_saved} prompt tokens across the batch")
+
+    written = 0
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = {}
+        for row, results in zip(pending, all_results):
+            context = format_context(results)
+            futures[pool.submit(_answer, row, context, model)] = (row, results)
+        for future in as_completed(futures):
+            row, results = futures[future]
+            record = {
+                "id": row["id"],
+                "question": row["question"],
+                "sources": [
+                    {"document_title": r.document_title, "file_path": r.file_path, "distance": r.distance}
+                    for r in results
+                ],
+                "embed_ms": embed_ms,
+                "search_ms": search_ms,
+            }
+            record.update(future.result())
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            written += 1
+            print(f"[{written}/{len(pending)}] {row['id']}: {'error' if record.get('error') else 'ok'}")
+
+    elapsed = time.perf_counter() - started
+    print(f"Answered {written} questions in {elapsed:.1f}s ({written / elapsed:.2f} questions/s)")
+    return written
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Benchmark the PDF extraction backends in pdf_extract.py on the bundled corpus.
+
+Each backend runs in its own subprocess so peak RSS is measured per backend.
+Reports pages/sec, peak memory and text equivalence against the pypdf2
+reference (word-multiset overlap, 1.0 = same words). Results are saved to
+.pdf_extract_bench.json, which get_extractor() uses to pick the fastest
+available backend automatically.
+
+    python bench_extract.py [--docs DIR] [--limit N] [--backends pypdfium2,pypdf2]
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List
+
+from pdf_extract import BENCH_RESULTS_PATH, BACKENDS, available_backends
+
+HERE = Path(__file__).resolve().parent
+REFERENCE_BACKEND = "pypdf2"
+
+
+def default_docs_dir() -> Path:
+    for candidate in (HERE / "it-management-and-audit-source-main", HERE.parent / "it-management-and-audit-source-main"):
+        if candidate.exists():
+            return candidate
+    return HERE / "it-management-and-audit-source-main"
+
+
+def run_worker(backend: str, pdfs: List[str]) -> None:
+    """Child process: extract every PDF, print per-file stats and word counts as JSON."""
+    extractor = BACKENDS[backend]
+    files = []
+    total_pages = 0
+    started = time.perf_counter()
+    for pdf in pdfs:
+        file_started = time.perf_counter()
+        try:
+            pages = extractor.extract_pages(pdf)
+        except Exception as e:
+            files.append({"path": pdf, "error": str(e)})
+            continue
+        total_pages += len(pages)
+        files.append(
+            {
+                "path": pdf,
+                "pages": len(pages),
+                "seconds": time.perf_counter() - file_started,
+                "words": dict(Counter(" ".join(pages).split())),
+            }
+        )
+    elapsed = time.perf_counter() - started
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KB on Linux, bytes on macOS
+    if sys.platform == "darwin":
+        peak_kb //= 1024
+    json.dump({"name": backend, "pages": total_pages, "seconds": elapsed, "peak_rss_mb": peak_kb / 1024, "files": files}, sys.stdout)
+
+
+def word_overlap(a: Dict[str, int], b: Dict[str, int]) -> float:
+    total = max(sum(a.values()), sum(b.values()))
+    if total == 0:
+        return 1.0
+    return sum(min(count, b.get(word, 0)) for word, count in a.items()) / total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", default=str(default_docs_dir()), help="Folder searched recursively for PDFs.")
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N PDFs (sorted by path).")
+    parser.add_argument("--backends", default=None, help="Comma-separated backends (default: all available).")
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("pdfs", nargs="*", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.pdfs)
+        return
+
+    pdfs = sorted(str(p) for p in Path(args.docs).rglob("*.pdf"))[: args.limit]
+    if not pdfs:
+        sys.exit(f"No PDFs found under {args.docs}")
+    backends = args.backends.split(",") if args.backends else available_backends()
+    print(f"Benchmarking {', '.join(backends)} on {len(pdfs)} PDFs from {args.docs}\n")
+
+    results = []
+    for backend in backends:
+        proc = subprocess.run(
+            [sys.executable, __file__, "--worker", backend, *pdfs],
+            capture_output=True,
+            text=True,
+            cwd=str(HERE),
+        )
+        if proc.returncode != 0:
+            print(f"{backend}: failed\n{proc.stderr}")
+            continue
+        results.append(json.loads(proc.stdout))
+
+    reference = next((r for r in results if r["name"] == REFERENCE_BACKEND), None)
+    reference_words = {f["path"]: f["words"] for f in reference["files"] if "words" in f} if reference else {}
+
+    print(f"{'backend':<14}{'pages':>8}{'seconds':>10}{'pages/s':>10}{'peak MB':>10}{'equiv':>8}{'errors':>8}")
+    summary = []
+    for r in results:
+        ok = [f for f in r["files"] if "words" in f]
+        overlaps = [word_overlap(reference_words[f["path"]], f["words"]) for f in ok if f["path"] in reference_words]
+        equivalence = sum(overlaps) / len(overlaps) if overlaps else None
+        pages_per_sec = r["pages"] / r["seconds"] if r["seconds"] else 0.0
+        summary.append(
+            {
+                "name": r["name"],
+                "pages": r["pages"],
+                "seconds": r["seconds"],
+                "pages_per_sec": pages_per_sec,
+                "peak_rss_mb": r["peak_rss_mb"],
+                "text_equivalence": equivalence,
+                "errors": len(r["files"]) - len(ok),
+            }
+        )
+        equiv_str = f"{equivalence:.3f}" if equivalence is not None else "-"
+        print(
+            f"{r['name']:<14}{r['pages']:>8}{r['seconds']:>10.1f}{pages_per_sec:>10.1f}"
+            f"{r['peak_rss_mb']:>10.0f}{equiv_str:>8}{len(r['files']) - len(ok):>8}"
+        )
+
+    BENCH_RESULTS_PATH.write_text(json.dumps({"docs": args.docs, "files": len(pdfs), "backends": summary}, indent=2))
+    if summary:
+        fastest = max(summary, key=lambda r: r["pages_per_sec"])
+        print(f"\nFastest: {fastest['name']} (saved to {BENCH_RESULTS_PATH.name}, used by get_extractor())")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Round trips and latency of multi-document search as the selection grows.
+
+For 1, 2, 4, ... indexed documents it compares RagStore.search_grouped (top-k
+per document in one statement) with one RagStore.search per document, counting
+the SQL statements each sends. The query vector is a stored chunk embedding,
+so no embedding model is needed. Exits 1 if the grouped search ever needs more
+than GROUPED_STATEMENTS statements: the search itself, plus at most two that
+load the texts of offset-only chunks (see RagStore.compact_texts), whatever
+the number of documents.
+
+    python bench_multidoc.py [--max-docs 32] [--k 3] [--repeats 5]
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from typing import Callable, List, Tuple
+
+from rag_store import Chunk, Document, RagStore
+
+GROUPED_STATEMENTS = 3
+
+
+def measure(store: RagStore, run: Callable[[], object], repeats: int) -> Tuple[float, int]:
+    """Median milliseconds and statements per call of run."""
+    from sqlalchemy import event
+
+    statements = 0
+
+    def count(*_):
+        nonlocal statements
+        statements += 1
+
+    # Searches run on a replica when DATABASE_REPLICA_URLS is set
+    engines = [store.engine, *store.read_engines]
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", count)
+    try:
+        timings: List[float] = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - started) * 1000)
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", count)
+    return statistics.median(timings), statements // repeats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-docs", type=int, default=32)
+    parser.add_argument("--k", type=int, default=3, help="Chunks per document.")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    store = RagStore()
+    with store.SessionLocal() as session:
+        docs = (
+            session.query(Document.id, Document.file_path)
+            .filter(Document.chunks.any())
+            .order_by(Document.id)
+            .limit(args.max_docs)
+            .all()
+        )
+        query = session.query(Chunk.embedding).order_by(Chunk.id).limit(1).scalar()
+    if not docs or query is None:
+        sys.exit("No indexed documents; ingest some PDFs first.")
+    query = list(query)
+
+    print(f"{'docs':>5} {'grouped ms':>11} {'stmts':>6} {'per-doc ms':>11} {'stmts':>6}")
+    sizes = [n for n in (1, 2, 4, 8, 16, 32, 64, 128) if n < len(docs)] + [len(docs)]
+    failures = []
+    for n in sizes:
+        ids = [doc[0] for doc in docs[:n]]
+        paths = [doc[1] for doc in docs[:n]]
+        grouped_ms, grouped_statements = measure(
+            store, lambda: store.search_grouped(query, document_ids=ids, k_per_group=args.k), args.repeats
+        )
+        naive_ms, naive_statements = measure(
+            store, lambda: [store.search(query, document_paths=[path], k=args.k) for path in paths], args.repeats
+        )
+        print(f"{n:>5} {grouped_ms:>11.1f} {grouped_statements:>6} {naive_ms:>11.1f} {naive_statements:>6}")
+        if grouped_statements > GROUPED_STATEMENTS:
+            failures.append(n)
+    if failures:
+        print(f"FAIL: grouped search needed more than {GROUPED_STATEMENTS} statements for {failures} documents")
+        sys.exit(1)
+    print(f"OK: at most {GROUPED_STATEMENTS} statements per grouped search")
+
+
+if __name__ == "__main__":
+    main()
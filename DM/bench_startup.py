@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Import-time budget for the app and CLI entry points.
+
+Imports the modules a fresh app or CLI process loads before doing any work in
+a clean interpreter under `python -X importtime` and fails (exit 1) when
+
+  * their cumulative import time exceeds the budget, or
+  * a heavy dependency that should only load on first use (SQLAlchemy,
+    pgvector, PyPDF2, requests, numpy) is pulled in at import time.
+
+streamlit itself is not counted; it is the fixed cost of the app server.
+
+    python bench_startup.py [--budget-ms 150] [--runs 5]
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+HERE = Path(__file__).resolve().parent
+STARTUP_MODULES = ["catalog", "workflow_meta", "ollama"]
+DEFERRED_MODULES = ["sqlalchemy", "pgvector", "PyPDF2", "requests", "numpy"]
+DEFAULT_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "150"))
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure_once() -> Tuple[Dict[str, int], List[str]]:
+    """Cumulative microseconds per startup module, and every module imported."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + ", ".join(STARTUP_MODULES)],
+        capture_output=True,
+        text=True,
+        cwd=str(HERE),
+    )
+    if proc.returncode != 0:
+        sys.exit(f"Importing startup modules failed:\n{proc.stderr}")
+    cumulative: Dict[str, int] = {}
+    imported: List[str] = []
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        name = match.group(4)
+        imported.append(name)
+        if name in STARTUP_MODULES and len(match.group(3)) == 1:  # top level, not a nested import
+            cumulative[name] = int(match.group(2))
+    return cumulative, imported
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="Maximum median import time (env STARTUP_BUDGET_MS).")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to measure; the median is compared.")
+    args = parser.parse_args()
+
+    totals: List[float] = []
+    per_module: Dict[str, List[float]] = {name: [] for name in STARTUP_MODULES}
+    imported: List[str] = []
+    for _ in range(args.runs):
+        cumulative, imported = measure_once()
+        for name in STARTUP_MODULES:
+            per_module[name].append(cumulative.get(name, 0) / 1000)
+        totals.append(sum(cumulative.values()) / 1000)
+
+    for name in STARTUP_MODULES:
+        print(f"{name:<16}{statistics.median(per_module[name]):>8.1f} ms")
+    median_total = statistics.median(totals)
+    print(f"{'total':<16}{median_total:>8.1f} ms (budget {args.budget_ms:.0f} ms, median of {args.runs})")
+
+    failures = []
+    eager = sorted({name.split(".")[0] for name in imported} & set(DEFERRED_MODULES))
+    if eager:
+        failures.append(f"heavy dependencies imported at startup: {', '.join(eager)}")
+    if median_total > args.budget_ms:
+        failures.append(f"import time {median_total:.1f} ms exceeds budget {args.budget_ms:.0f} ms")
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Precomputed catalog of the documents tree.
+
+The app needs the folder tree for the sidebar and the list of PDFs for the
+selector before its first paint. build_catalog() collects both in a single
+walk, and load_catalog() serves them from a JSON file next to the docs tree
+so a fresh process does not walk the corpus at all. The cache is rebuilt when
+the docs folder, a framework folder or a folder inside one changes (by
+mtime), which covers PDFs added as deep as FRAMEWORK/Standard/file.pdf; run
+
+    python catalog.py
+
+after adding files deeper in the tree, or as a build step for containers.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import List, Tuple
+
+CATALOG_VERSION = 1
+CATALOG_PATH = Path(os.getenv("DM_CATALOG_PATH", str(Path(__file__).resolve().parent / ".catalog.json")))
+
+
+def build_catalog(startpath: str) -> Tuple[str, List[str]]:
+    """Sidebar tree text and absolute PDF paths, from one os.walk."""
+    tree_lines: List[str] = []
+    pdfs: List[str] = []
+    for root, dirs, files in os.walk(startpath):
+        level = root.replace(startpath, '').count(os.sep)
+        indent = ' ' * 4 * level
+        tree_lines.append(f"{indent}📁 {os.path.basename(root)}/")
+        subindent = ' ' * 4 * (level + 1)
+        for f in files:
+            tree_lines.append(f"{subindent}📄 {f}")
+            if f.lower().endswith('.pdf'):
+                pdfs.append(os.path.abspath(os.path.join(root, f)))
+    return "\n".join(tree_lines) + "\n", pdfs
+
+
+def catalog_signature(startpath: str) -> List[float]:
+    """mtimes of the docs folder and of the folders up to two levels below it (one scandir each, no deep walk).
+
+    Most PDFs sit two levels down (e.g. NIST/Cybersecurity Framework (CSF)/CSF 2.0.pdf),
+    so adding one changes the mtime of a second-level folder.
+    """
+    signature = [os.stat(startpath).st_mtime]
+    with os.scandir(startpath) as entries:
+        frameworks = sorted(entry.path for entry in entries if entry.is_dir())
+    for framework in frameworks:
+        signature.append(os.stat(framework).st_mtime)
+        with os.scandir(framework) as entries:
+            signature.extend(sorted(entry.stat().st_mtime for entry in entries if entry.is_dir()))
+    return signature
+
+
+def write_catalog(startpath: str, catalog_path: Path = CATALOG_PATH) -> Tuple[str, List[str]]:
+    tree, pdfs = build_catalog(startpath)
+    payload = {
+        "version": CATALOG_VERSION,
+        "root": os.path.abspath(startpath),
+        "signature": catalog_signature(startpath),
+        "tree": tree,
+        "pdfs": pdfs,
+    }
+    temporary = catalog_path.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        temporary.write_text(json.dumps(payload))
+        os.replace(temporary, catalog_path)
+    except OSError:
+        pass  # read-only checkout: still serve the freshly built catalog
+    return tree, pdfs
+
+
+def load_catalog(startpath: str, catalog_path: Path = CATALOG_PATH) -> Tuple[str, List[str]]:
+    """Cached (tree, pdfs) for startpath, rebuilding the cache when it is missing or stale."""
+    try:
+        payload = json.loads(catalog_path.read_text())
+        if (
+            payload.get("version") == CATALOG_VERSION
+            and payload.get("root") == os.path.abspath(startpath)
+            and payload.get("signature") == catalog_signature(startpath)
+        ):
+            return payload["tree"], payload["pdfs"]
+    except (OSError, ValueError, KeyError):
+        pass
+    return write_catalog(startpath, catalog_path)
+
+
+if __name__ == "__main__":
+    import sys
+
+    docs = sys.argv[1] if len(sys.argv) > 1 else str(Path(__file__).resolve().parent / "it-management-and-audit-source-main")
+    tree, pdfs = write_catalog(docs)
+    print(f"Wrote {CATALOG_PATH} with {len(pdfs)} PDFs")
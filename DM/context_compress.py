@@ -0,0 +1,161 @@
+"""
+Post-retrieval context compression.
+
+RagStore.search tends to return neighbouring chunks of the same section, and
+simple_overlap_chunk repeats `overlap` characters between neighbours, so the
+joined context carries a lot of duplicated text. compress_results trims the
+candidate list before prompting:
+
+1. drop candidates beyond a distance cutoff (absolute, or relative to the best hit),
+2. pick k diverse candidates with maximal marginal relevance (MMR),
+3. merge hits that are consecutive chunks of one document, removing the overlap.
+"""
+
+from dataclasses import dataclass, replace
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rag_store import SearchResult
+
+TOKEN_ESTIMATE_RATIO = 4  # characters per token, same estimate as the app
+
+
+@dataclass
+class CompressionStats:
+    candidates: int
+    selected: int
+    passages: int
+    chars_before: int
+    chars_after: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, (self.chars_before - self.chars_after) // TOKEN_ESTIMATE_RATIO)
+
+
+def format_context(results: Sequence[SearchResult]) -> str:
+    # A passage found in several documents is given once, citing all of them (see dedup_results)
+    return "\n\n".join(
+        f"[From {r.document_title}{' (also in ' + ', '.join(r.also_in) + ')' if r.also_in else ''}]\n{r.text}"
+        for r in results
+    )
+
+
+def apply_distance_cutoff(
+    results: Sequence[SearchResult],
+    max_distance: Optional[float] = None,
+    distance_margin: Optional[float] = None,
+) -> List[SearchResult]:
+    """Keep results within max_distance and within distance_margin of the best hit (adaptive k).
+
+    Results are expected in ascending distance order, as returned by RagStore.search.
+    """
+    if not results:
+        return []
+    kept = list(results)
+    if max_distance is not None:
+        kept = [r for r in kept if r.distance <= max_distance]
+    if distance_margin is not None and kept:
+        best = kept[0].distance
+        kept = [r for r in kept if r.distance <= best + distance_margin]
+    return kept
+
+
+def mmr_select(
+    query_embedding: Sequence[float],
+    results: Sequence[SearchResult],
+    k: int,
+    lambda_mult: float = 0.7,
+) -> List[SearchResult]:
+    """Greedy maximal marginal relevance over results that carry embeddings.
+
+    lambda_mult=1 is plain relevance order, lower values favour diversity.
+    """
+    if len(results) <= k or any(r.embedding is None for r in results):
+        return list(results[:k])
+    matrix = np.asarray([r.embedding for r in results], dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query /= np.linalg.norm(query) + 1e-12
+    relevance = matrix @ query
+    similarity = matrix @ matrix.T
+
+    selected = [int(np.argmax(relevance))]
+    # Highest similarity of each candidate to anything selected so far
+    max_sim = similarity[selected[0]].copy()
+    available = np.ones(len(results), dtype=bool)
+    available[selected[0]] = False
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_sim
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_sim, similarity[best], out=max_sim)
+    return [results[i] for i in selected]
+
+
+def _join_overlapping(left: str, right: str, overlap: int) -> str:
+    if overlap and left.endswith(right[:overlap]):
+        return left + right[overlap:]
+    return f"{left} {right}"
+
+
+def merge_adjacent(results: Sequence[SearchResult], overlap: int = 120) -> List[SearchResult]:
+    """Merge hits that are consecutive chunks of the same document into one passage.
+
+    The merged passage keeps the best distance of its members; output is ordered
+    by that distance.
+    """
+    merged: List[SearchResult] = []
+    ordered = sorted(
+        results,
+        key=lambda r: (r.file_path, r.chunk_index if r.chunk_index is not None else -1),
+    )
+    for result in ordered:
+        previous = merged[-1] if merged else None
+        if (
+            previous is not None
+            and previous.file_path == result.file_path
+            and previous.chunk_index is not None
+            and result.chunk_index == previous.chunk_index + 1
+        ):
+            merged[-1] = replace(
+                previous,
+                text=_join_overlapping(previous.text, result.text, overlap),
+                distance=min(previous.distance, result.distance),
+                chunk_index=result.chunk_index,  # run continues from the last merged chunk
+                page_end=result.page_end,
+                also_in=[title for title in previous.also_in if title in result.also_in],
+            )
+        else:
+            merged.append(result)
+    return sorted(merged, key=lambda r: r.distance)
+
+
+def compress_results(
+    query_embedding: Sequence[float],
+    candidates: Sequence[SearchResult],
+    k: int = 6,
+    lambda_mult: float = 0.7,
+    max_distance: Optional[float] = None,
+    distance_margin: Optional[float] = None,
+    overlap: int = 120,
+) -> Tuple[List[SearchResult], CompressionStats]:
+    """Cut, diversify and merge candidates; stats compare against the plain top-k context.
+
+    Fetch more candidates than k (e.g. 3*k with include_embeddings=True) so MMR
+    has something to choose from.
+    """
+    kept = apply_distance_cutoff(candidates, max_distance=max_distance, distance_margin=distance_margin)
+    selected = mmr_select(query_embedding, kept, k=k, lambda_mult=lambda_mult)
+    passages = merge_adjacent(selected, overlap=overlap)
+    stats = CompressionStats(
+        candidates=len(candidates),
+        selected=len(selected),
+        passages=len(passages),
+        chars_before=len(format_context(candidates[:k])),
+        chars_after=len(format_context(passages)),
+    )
+    return passages, stats
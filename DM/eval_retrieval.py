@@ -0,0 +1,543 @@
+#!/usr/bin/env python3
+"""
+Recall-vs-latency evaluation harness for retrieval settings.
+
+Works on cached embeddings, so sweeps run fully offline once the caches exist:
+
+    # 1. cache a corpus: from the store, or by chunking/embedding the PDFs with given settings
+    python eval_retrieval.py export --out eval_cache/store.npz
+    python eval_retrieval.py build-corpus --chunk-size 400 --overlap 60 --out eval_cache/c400.npz
+    python eval_retrieval.py build-corpus --from-store --chunk-size 400 --overlap 60 --out eval_cache/c400.npz  # no PDF parsing
+
+    # 2. sweep (queries: JSONL with "question" and optional "document", or sampled chunks)
+    python eval_retrieval.py sweep --corpus eval_cache/c400.npz --corpus eval_cache/store.npz \\
+        --queries questions.jsonl --k 3,6,10 --index flat,ivf --probes 1,4,16 \\
+        --quantization none,int8,binary --plot pareto.png
+
+Ground truth is exact brute-force cosine top-k over each corpus. Per
+configuration it reports recall@k against that ground truth, MRR of the true
+nearest neighbour, document hit rate (when queries name their document),
+p50/p99 latency and index size, then marks the Pareto frontier of recall
+against p50 latency within each (corpus, k): recall@1 and recall@10, or recall
+against two corpora's own ground truths, are not comparable. `pg-hnsw` and `pg-ivfflat` index types (ef_search /
+probes) run against a scratch table in --database-url instead of numpy.
+
+`cascade` measures RagStore.search_cascade live against the store: per-stage
+p50 latency, the single-stage reference latency and recall@k against it, for
+each candidate-pool size:
+
+    python eval_retrieval.py cascade --queries questions.jsonl --fast-model all-minilm \
+        --candidates 25,50,100,200
+    python eval_retrieval.py cascade --queries questions.jsonl --truncate 256
+
+`router` measures RagStore.search_routed (document-centroid routing, then
+chunk search in the routed documents) against the flat search: p50 latency
+of both, recall@k against the flat top-k, and the router's miss rate - how
+often the right document (the query's "document" if given, else the flat
+search's best chunk's) was not among those routed:
+
+    python eval_retrieval.py router --queries questions.jsonl --documents 4,8,16 --level document,section
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+CACHE_DIR = Path(os.getenv("EVAL_CACHE_DIR", str(Path(__file__).resolve().parent / "eval_cache")))
+
+
+# ---- corpus and query caches ----
+
+def save_corpus(path: Path, embeddings: np.ndarray, doc_paths: Sequence[str], chunk_index: Sequence[int], meta: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(
+        path,
+        embeddings=np.asarray(embeddings, dtype=np.float32),
+        doc_paths=np.asarray(doc_paths),
+        chunk_index=np.asarray(chunk_index, dtype=np.int32),
+        meta=np.asarray(json.dumps(meta)),
+    )
+
+
+def load_corpus(path: Path) -> Dict:
+    data = np.load(path, allow_pickle=False)
+    return {
+        "name": path.stem,
+        "embeddings": data["embeddings"],
+        "doc_paths": data["doc_paths"],
+        "chunk_index": data["chunk_index"],
+        "meta": json.loads(str(data["meta"])),
+    }
+
+
+def export_store(out: Path) -> None:
+    """Cache every chunk embedding currently in the RagStore."""
+    from rag_store import Chunk, Document, RagStore
+
+    store = RagStore()
+    with store.SessionLocal() as session:
+        rows = (
+            session.query(Chunk.embedding, Document.file_path, Chunk.chunk_index)
+            .join(Document, Chunk.document_id == Document.id)
+            .order_by(Chunk.id)
+            .all()
+        )
+    embeddings = np.asarray([row[0] for row in rows], dtype=np.float32)
+    save_corpus(out, embeddings, [row[1] for row in rows], [row[2] for row in rows], {"source": "store"})
+    print(f"Exported {len(rows)} chunks to {out}")
+
+
+def _document_texts(docs: str, from_store: bool):
+    """(path, text, page offsets) of each document: parsed from the PDFs, or the texts stored in RagStore."""
+    from rag_store import RagStore, join_pages
+
+    if from_store:
+        for _, path, text, page_offsets in RagStore().iter_document_texts():
+            yield path, text, page_offsets
+        return
+    from pdf_extract import iter_pages
+
+    for pdf in sorted(str(p) for p in Path(docs).rglob("*.pdf")):
+        yield (pdf, *join_pages(list(iter_pages(pdf))))
+
+
+def build_corpus(docs: str, chunk_size: int, overlap: int, out: Path, from_store: bool = False) -> None:
+    """Chunk and embed every PDF under docs (or every stored document text) with the given settings (needs Ollama once)."""
+    from ollama import OLLAMA_EMBED_MODEL, embed_batch
+    from rag_store import chunk_text
+
+    embeddings: List[List[float]] = []
+    doc_paths: List[str] = []
+    chunk_index: List[int] = []
+    for pdf, text, page_offsets in _document_texts(docs, from_store):
+        spans = chunk_text(text, page_offsets, chunk_size=chunk_size, overlap=overlap)
+        vectors = embed_batch([span.text for span in spans])
+        if len(vectors) != len(spans):
+            raise RuntimeError(f"Embedding failed for {pdf}")
+        embeddings.extend(vectors)
+        doc_paths.extend([pdf] * len(spans))
+        chunk_index.extend(range(len(spans)))
+        print(f"{os.path.basename(pdf)}: {len(spans)} chunks")
+    meta = {"source": "store-texts" if from_store else "pdfs", "chunk_size": chunk_size, "overlap": overlap, "model": OLLAMA_EMBED_MODEL}
+    save_corpus(out, np.asarray(embeddings, dtype=np.float32), doc_paths, chunk_index, meta)
+    print(f"Saved {len(embeddings)} chunks to {out}")
+
+
+def load_queries(path: Optional[str], corpus: Dict, sample: int, seed: int) -> Tuple[np.ndarray, List[Optional[str]]]:
+    """Query embeddings (cached by question text) and the expected document of each query, if known."""
+    if not path:
+        # Offline fallback: perturbed copies of random chunk embeddings
+        rng = np.random.default_rng(seed)
+        picks = rng.choice(len(corpus["embeddings"]), size=min(sample, len(corpus["embeddings"])), replace=False)
+        base = corpus["embeddings"][picks]
+        noise = rng.normal(scale=0.05 * float(np.abs(base).mean()), size=base.shape).astype(np.float32)
+        return base + noise, [str(corpus["doc_paths"][i]) for i in picks]
+    rows = [json.loads(line) for line in open(path, encoding="utf-8") if line.strip()]
+    questions = [row["question"] for row in rows]
+    cache_path = CACHE_DIR / f"queries_{hashlib.sha1(chr(0).join(questions).encode()).hexdigest()[:12]}.npz"
+    if cache_path.exists():
+        embeddings = np.load(cache_path)["embeddings"]
+    else:
+        from ollama import embed_batch
+
+        embeddings = np.asarray(embed_batch(questions), dtype=np.float32)
+        if len(embeddings) != len(questions):
+            raise RuntimeError("Embedding the queries failed; is Ollama running?")
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(cache_path, embeddings=embeddings)
+    return embeddings, [row.get("document") for row in rows]
+
+
+# ---- indexes ----
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    return matrix / (np.linalg.norm(matrix, axis=-1, keepdims=True) + 1e-12)
+
+
+def exact_topk(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ corpus.T
+    top = np.argpartition(-scores, min(k, scores.shape[1] - 1), axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+class FlatIndex:
+    """Brute force over (optionally quantized) vectors, re-ranked exactly from the top candidates."""
+
+    def __init__(self, vectors: np.ndarray, quantization: str = "none", rerank: int = 4):
+        self.vectors = vectors
+        self.quantization = quantization
+        self.rerank = rerank
+        if quantization == "int8":
+            self.scale = np.abs(vectors).max() / 127.0
+            self.codes = np.round(vectors / self.scale).astype(np.int8)
+        elif quantization == "binary":
+            self.codes = np.packbits(vectors > 0, axis=1)
+        elif quantization != "none":
+            raise ValueError(f"Unknown quantization {quantization!r}")
+
+    @property
+    def nbytes(self) -> int:
+        return self.vectors.nbytes if self.quantization == "none" else self.codes.nbytes
+
+    def _candidates(self, query: np.ndarray, count: int, subset: Optional[np.ndarray] = None) -> np.ndarray:
+        ids = subset if subset is not None else np.arange(len(self.vectors))
+        if self.quantization == "none":
+            scores = self.vectors[ids] @ query
+        elif self.quantization == "int8":
+            scores = self.codes[ids].astype(np.float32) @ query
+        else:
+            bits = np.packbits(query > 0)
+            scores = -np.unpackbits(np.bitwise_xor(self.codes[ids], bits), axis=1).sum(axis=1)
+        count = min(count, len(ids))
+        top = np.argpartition(-scores, count - 1)[:count]
+        return ids[top[np.argsort(-scores[top])]]
+
+    def search(self, query: np.ndarray, k: int, subset: Optional[np.ndarray] = None) -> np.ndarray:
+        if self.quantization == "none":
+            return self._candidates(query, k, subset)
+        candidates = self._candidates(query, k * self.rerank, subset)
+        exact = self.vectors[candidates] @ query
+        return candidates[np.argsort(-exact)[:k]]
+
+
+class IvfIndex:
+    """Inverted file: k-means coarse centroids, search the `probes` nearest lists."""
+
+    def __init__(self, vectors: np.ndarray, nlist: int, quantization: str = "none", seed: int = 0, iterations: int = 10):
+        rng = np.random.default_rng(seed)
+        nlist = min(nlist, len(vectors))
+        centroids = vectors[rng.choice(len(vectors), size=nlist, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = vectors[assignment == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = _normalize(centroids)
+        self.centroids = centroids
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        self.lists = [np.flatnonzero(assignment == c) for c in range(nlist)]
+        self.flat = FlatIndex(vectors, quantization)
+        self.probes = 1
+
+    @property
+    def nbytes(self) -> int:
+        return self.flat.nbytes + self.centroids.nbytes + sum(ids.nbytes for ids in self.lists)
+
+    def search(self, query: np.ndarray, k: int) -> np.ndarray:
+        nearest = np.argsort(-(self.centroids @ query))[: self.probes]
+        subset = np.concatenate([self.lists[c] for c in nearest])
+        if len(subset) == 0:
+            return np.empty(0, dtype=np.int64)
+        return self.flat.search(query, k, subset)
+
+
+class PgVectorIndex:
+    """Scratch table in Postgres with an HNSW or IVFFlat index, queried through pgvector."""
+
+    def __init__(self, database_url: str, vectors: np.ndarray, method: str, m: int = 16, ef_construction: int = 64, lists: int = 100):
+        from sqlalchemy import create_engine, text
+
+        self.text = text
+        self.engine = create_engine(database_url, future=True)
+        self.dim = vectors.shape[1]
+        self.method = method
+        self.table = f"eval_vectors_{method}"
+        with self.engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+            conn.execute(text(f"DROP TABLE IF EXISTS {self.table}"))
+            conn.execute(text(f"CREATE TABLE {self.table} (id integer PRIMARY KEY, embedding vector({self.dim}))"))
+            for start in range(0, len(vectors), 1000):
+                rows = [
+                    {"id": start + i, "embedding": "[" + ",".join(f"{x:.6g}" for x in vec) + "]"}
+                    for i, vec in enumerate(vectors[start:start + 1000])
+                ]
+                conn.execute(text(f"INSERT INTO {self.table} (id, embedding) VALUES (:id, CAST(:embedding AS vector))"), rows)
+            with_clause = f"(m = {m}, ef_construction = {ef_construction})" if method == "hnsw" else f"(lists = {lists})"
+            conn.execute(text(f"CREATE INDEX ON {self.table} USING {method} (embedding vector_cosine_ops) WITH {with_clause}"))
+            self.nbytes = conn.execute(text(f"SELECT pg_indexes_size('{self.table}')")).scalar()
+        self.conn = self.engine.connect()
+        self.setting = 40
+
+    def search(self, query: np.ndarray, k: int) -> np.ndarray:
+        guc = "hnsw.ef_search" if self.method == "hnsw" else "ivfflat.probes"
+        self.conn.execute(self.text(f"SET {guc} = {int(self.setting)}"))
+        literal = "[" + ",".join(f"{x:.6g}" for x in query) + "]"
+        rows = self.conn.execute(
+            self.text(f"SELECT id FROM {self.table} ORDER BY embedding <=> CAST(:q AS vector) LIMIT :k"),
+            {"q": literal, "k": k},
+        ).all()
+        return np.asarray([row[0] for row in rows], dtype=np.int64)
+
+
+# ---- sweep ----
+
+@dataclass
+class EvalResult:
+    corpus: str
+    chunk_size: Optional[int]
+    index: str
+    quantization: str
+    param: Optional[int]
+    k: int
+    recall: float
+    mrr: float
+    doc_hit: Optional[float]
+    p50_ms: float
+    p99_ms: float
+    index_bytes: int
+    pareto: bool = False
+
+
+def evaluate(search, queries: np.ndarray, truth: np.ndarray, k: int, doc_paths: np.ndarray, expected: List[Optional[str]]):
+    latencies: List[float] = []
+    recalls: List[float] = []
+    reciprocal_ranks: List[float] = []
+    doc_hits: List[float] = []
+    for query, true_ids, expected_doc in zip(queries, truth, expected):
+        started = time.perf_counter()
+        found = search(query, k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        recalls.append(len(set(found.tolist()) & set(true_ids[:k].tolist())) / k)
+        hits = np.flatnonzero(found == true_ids[0])
+        reciprocal_ranks.append(1.0 / (hits[0] + 1) if len(hits) else 0.0)
+        if expected_doc:
+            doc_hits.append(float(any(expected_doc in str(doc_paths[i]) for i in found)))
+    return (
+        float(np.mean(recalls)),
+        float(np.mean(reciprocal_ranks)),
+        float(np.mean(doc_hits)) if doc_hits else None,
+        float(np.percentile(latencies, 50)),
+        float(np.percentile(latencies, 99)),
+    )
+
+
+def _pareto_groups(results: List[EvalResult]) -> Dict[Tuple[str, int], List[EvalResult]]:
+    groups: Dict[Tuple[str, int], List[EvalResult]] = {}
+    for r in results:
+        groups.setdefault((r.corpus, r.k), []).append(r)
+    return groups
+
+
+def mark_pareto(results: List[EvalResult]) -> None:
+    """Flag configurations no other configuration of the same corpus and k beats on both recall and p50 latency."""
+    for group in _pareto_groups(results).values():
+        for r in group:
+            r.pareto = not any(
+                o is not r and o.recall >= r.recall and o.p50_ms <= r.p50_ms and (o.recall > r.recall or o.p50_ms < r.p50_ms)
+                for o in group
+            )
+
+
+def sweep(args) -> List[EvalResult]:
+    ks = [int(x) for x in args.k.split(",")]
+    results: List[EvalResult] = []
+    for corpus_path in args.corpus:
+        corpus = load_corpus(Path(corpus_path))
+        vectors = _normalize(corpus["embeddings"].astype(np.float32))
+        queries, expected = load_queries(args.queries, corpus, args.sample_queries, args.seed)
+        queries = _normalize(queries.astype(np.float32))
+        truth = exact_topk(vectors, queries, max(ks))
+        chunk_size = corpus["meta"].get("chunk_size")
+        print(f"{corpus['name']}: {len(vectors)} chunks x {vectors.shape[1]} dims, {len(queries)} queries")
+
+        for index_type in args.index.split(","):
+            if index_type == "flat":
+                configs = [(q, None) for q in args.quantization.split(",")]
+            elif index_type == "ivf":
+                configs = list(itertools.product(args.quantization.split(","), [int(p) for p in args.probes.split(",")]))
+            elif index_type in ("pg-hnsw", "pg-ivfflat"):
+                if not args.database_url:
+                    raise SystemExit(f"{index_type} needs --database-url")
+                settings = args.ef_search if index_type == "pg-hnsw" else args.probes
+                configs = [("none", int(p)) for p in settings.split(",")]
+            else:
+                raise SystemExit(f"Unknown index type {index_type!r}")
+
+            built: Dict = {}
+            for quantization, param in configs:
+                if index_type == "flat":
+                    index = FlatIndex(vectors, quantization)
+                    search = index.search
+                elif index_type == "ivf":
+                    if quantization not in built:
+                        built[quantization] = IvfIndex(vectors, args.nlist, quantization, seed=args.seed)
+                    index = built[quantization]
+                    index.probes = param
+                    search = index.search
+                else:
+                    if "pg" not in built:
+                        built["pg"] = PgVectorIndex(args.database_url, vectors, index_type.split("-", 1)[1])
+                    index = built["pg"]
+                    index.setting = param
+                    search = index.search
+                for k in ks:
+                    recall, mrr, doc_hit, p50, p99 = evaluate(search, queries, truth, k, corpus["doc_paths"], expected)
+                    results.append(
+                        EvalResult(corpus["name"], chunk_size, index_type, quantization, param, k, recall, mrr, doc_hit, p50, p99, int(index.nbytes))
+                    )
+    mark_pareto(results)
+    return results
+
+
+def report(results: List[EvalResult], out: Optional[str], plot: Optional[str]) -> None:
+    header = f"{'corpus':<14}{'chunk':>6}{'index':>11}{'quant':>8}{'param':>6}{'k':>4}{'recall':>8}{'mrr':>7}{'dochit':>8}{'p50 ms':>8}{'p99 ms':>8}{'MB':>8}  pareto"
+    print(header)
+    for r in sorted(results, key=lambda r: (r.corpus, r.k, r.p50_ms)):
+        doc_hit = f"{r.doc_hit:.3f}" if r.doc_hit is not None else "-"
+        print(
+            f"{r.corpus:<14}{r.chunk_size or '-':>6}{r.index:>11}{r.quantization:>8}{r.param if r.param is not None else '-':>6}{r.k:>4}"
+            f"{r.recall:>8.3f}{r.mrr:>7.3f}{doc_hit:>8}{r.p50_ms:>8.2f}{r.p99_ms:>8.2f}{r.index_bytes / 1e6:>8.1f}  {'*' if r.pareto else ''}"
+        )
+    if out:
+        Path(out).write_text("\n".join(json.dumps(asdict(r)) for r in results) + "\n")
+        print(f"\nWrote {len(results)} results to {out}")
+    if plot:
+        try:
+            import matplotlib
+
+            matplotlib.use("Agg")
+            import matplotlib.pyplot as plt
+        except ImportError:
+            print("matplotlib not installed; skipping plot")
+            return
+        fig, ax = plt.subplots(figsize=(8, 5))
+        ax.scatter([r.p50_ms for r in results], [r.recall for r in results], c="lightgray", label="configurations")
+        for (corpus, k), group in sorted(_pareto_groups(results).items()):
+            frontier = sorted((r for r in group if r.pareto), key=lambda r: r.p50_ms)
+            ax.plot([r.p50_ms for r in frontier], [r.recall for r in frontier], "o-", label=f"{corpus} k={k}")
+            for r in frontier:
+                ax.annotate(f"{r.index}/{r.quantization}/{r.param or ''}", (r.p50_ms, r.recall), fontsize=7)
+        ax.set_xlabel("p50 latency (ms)")
+        ax.set_ylabel("recall@k")
+        ax.legend()
+        fig.tight_layout()
+        fig.savefig(plot)
+        print(f"Saved plot to {plot}")
+
+
+def cascade(args) -> None:
+    """Per-stage latency and recall of search_cascade over the questions in args.queries."""
+    from ollama import embed_batch
+    from rag_store import RagStore
+
+    questions = [json.loads(line)["question"] for line in open(args.queries, encoding="utf-8") if line.strip()]
+    strong_queries = embed_batch(questions, model=args.strong_model)
+    fast_queries = embed_batch(questions, model=args.fast_model) if args.fast_model else strong_queries
+    if len(strong_queries) != len(questions) or len(fast_queries) != len(questions):
+        raise RuntimeError("Embedding the queries failed; is Ollama running?")
+    store = RagStore()
+    print(f"{'candidates':>10} {'fast p50':>9} {'strong p50':>11} {'total p50':>10} {'single p50':>11} {'recall':>7}")
+    for candidates in [int(c) for c in args.candidates.split(",")]:
+        stats = [
+            store.search_cascade(
+                strong,
+                fast,
+                fast_model=args.fast_model,
+                strong_model=args.strong_model,
+                truncate=args.truncate,
+                candidates=candidates,
+                k=args.k,
+                measure_recall=True,
+            )[1]
+            for strong, fast in zip(strong_queries, fast_queries)
+        ]
+        print(
+            f"{candidates:>10} {np.median([s.fast_ms for s in stats]):>7.1f}ms {np.median([s.strong_ms for s in stats]):>9.1f}ms "
+            f"{np.median([s.total_ms for s in stats]):>8.1f}ms {np.median([s.reference_ms for s in stats]):>9.1f}ms "
+            f"{np.mean([s.recall for s in stats]):>7.3f}"
+        )
+
+
+def router(args) -> None:
+    """Latency, recall and miss rate of search_routed against the flat search."""
+    from rag_store import RagStore
+
+    queries, expected_documents = load_queries(args.queries, {}, 0, 0)
+    store = RagStore()
+    print(f"{'level':<9} {'docs':>5} {'route p50':>10} {'search p50':>11} {'total p50':>10} {'flat p50':>9} {'speedup':>8} {'recall':>7} {'miss':>6}")
+    for level in args.level.split(","):
+        for documents in [int(d) for d in args.documents.split(",")]:
+            stats, misses = [], []
+            for query, expected in zip(queries, expected_documents):
+                results, s = store.search_routed(query.tolist(), k=args.k, documents=documents, level=level, measure=True)
+                stats.append(s)
+                if expected:
+                    misses.append(not any(path == expected or path.endswith("/" + expected) for path in s.document_paths))
+                else:
+                    misses.append(bool(s.missed))
+            total, flat = np.median([s.total_ms for s in stats]), np.median([s.flat_ms for s in stats])
+            print(
+                f"{level:<9} {documents:>5} {np.median([s.route_ms for s in stats]):>8.1f}ms "
+                f"{np.median([s.search_ms for s in stats]):>9.1f}ms {total:>8.1f}ms {flat:>7.1f}ms "
+                f"{flat / total if total else 0:>7.1f}x {np.mean([s.recall for s in stats]):>7.3f} {np.mean(misses):>6.1%}"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export = sub.add_parser("export", help="Cache the store's chunk embeddings.")
+    export.add_argument("--out", default=str(CACHE_DIR / "store.npz"))
+
+    build = sub.add_parser("build-corpus", help="Chunk and embed PDFs with given settings and cache them.")
+    build.add_argument("--docs", default=str(Path(__file__).resolve().parent.parent / "it-management-and-audit-source-main"))
+    build.add_argument("--chunk-size", type=int, default=800)
+    build.add_argument("--overlap", type=int, default=120)
+    build.add_argument("--out", required=True)
+    build.add_argument("--from-store", action="store_true", help="Chunk the document texts stored in RagStore instead of parsing PDFs.")
+
+    run = sub.add_parser("sweep", help="Evaluate configurations over cached corpora.")
+    run.add_argument("--corpus", action="append", required=True, help="Cached corpus .npz (repeat for several chunkings).")
+    run.add_argument("--queries", help="JSONL with question (and optional document); default samples chunks.")
+    run.add_argument("--sample-queries", type=int, default=200)
+    run.add_argument("--k", default="6")
+    run.add_argument("--index", default="flat,ivf", help="flat, ivf, pg-hnsw, pg-ivfflat")
+    run.add_argument("--quantization", default="none", help="none, int8, binary (flat and ivf)")
+    run.add_argument("--nlist", type=int, default=64)
+    run.add_argument("--probes", default="1,4,16")
+    run.add_argument("--ef-search", default="20,40,100")
+    run.add_argument("--database-url", default=None, help="Scratch database for pg-* index types.")
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--out", default=None, help="Write results as JSONL.")
+    run.add_argument("--plot", default=None, help="Save the recall/latency Pareto plot (needs matplotlib).")
+
+    chain = sub.add_parser("cascade", help="Per-stage latency and recall of the two-stage cascade search.")
+    chain.add_argument("--queries", required=True, help="JSONL with a question per line.")
+    chain.add_argument("--fast-model", default=None, help="chunk_embeddings model for the first stage (default: primary).")
+    chain.add_argument("--strong-model", default=None, help="chunk_embeddings model for re-scoring (default: primary).")
+    chain.add_argument("--truncate", type=int, default=None, help="Truncate first-stage vectors to this many dimensions.")
+    chain.add_argument("--candidates", default="25,50,100,200")
+    chain.add_argument("--k", type=int, default=6)
+
+    route = sub.add_parser("router", help="Latency and miss rate of document-centroid routing vs. the flat search.")
+    route.add_argument("--queries", required=True, help="JSONL with a question (and optional document) per line.")
+    route.add_argument("--documents", default="4,8,16", help="Documents routed to the chunk search.")
+    route.add_argument("--level", default="document,section")
+    route.add_argument("--k", type=int, default=6)
+
+    args = parser.parse_args()
+    if args.command == "export":
+        export_store(Path(args.out))
+    elif args.command == "build-corpus":
+        build_corpus(args.docs, args.chunk_size, args.overlap, Path(args.out), from_store=args.from_store)
+    elif args.command == "cascade":
+        cascade(args)
+    elif args.command == "router":
+        router(args)
+    else:
+        report(sweep(args), args.out, args.plot)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Stat-based cache of file content hashes.
+
+Hashing a large PDF reads the whole file. The cache keeps each file's SHA-256
+together with its stat signature (size, mtime_ns, inode) in a JSON file and
+only re-hashes a file when the signature changes, so repeated "which version
+of this document is this?" checks cost one os.stat().
+
+A file rewritten in place with its size and mtime preserved keeps its
+signature. The verify sweep re-hashes every cached file in parallel to catch
+that, and can queue changed files for re-ingestion:
+
+    python fingerprint.py --verify [--workers 4] [--enqueue]
+    python fingerprint.py FILE...        # print hashes, timing cached vs. full
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+FINGERPRINT_VERSION = 1
+FINGERPRINT_PATH = Path(os.getenv("DM_FINGERPRINT_PATH", str(Path(__file__).resolve().parent / ".fingerprints.json")))
+VERIFY_WORKERS = 4
+
+
+def _signature(stat: os.stat_result) -> List[int]:
+    return [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+
+class FingerprintCache:
+    def __init__(self, path: Path = FINGERPRINT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = self._read()
+        self._dropped = set()
+
+    def _read(self) -> Dict[str, Dict]:
+        try:
+            payload = json.loads(self.path.read_text())
+            if payload.get("version") == FINGERPRINT_VERSION:
+                return payload["files"]
+        except (OSError, ValueError, KeyError):
+            pass
+        return {}
+
+    def _save(self) -> None:
+        # Merge with entries other processes wrote since we loaded, ours win
+        with self._lock:
+            entries = {path: entry for path, entry in self._read().items() if path not in self._dropped}
+            entries.update(self._entries)
+            self._entries = entries
+            payload = json.dumps({"version": FINGERPRINT_VERSION, "files": entries})
+        temporary = self.path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            temporary.write_text(payload)
+            os.replace(temporary, self.path)
+        except OSError:
+            pass  # read-only checkout: the in-memory cache still works
+
+    def lookup(self, file_path: str) -> Optional[str]:
+        """Cached hash of file_path if its stat signature is unchanged, else None."""
+        path = os.path.abspath(file_path)
+        entry = self._entries.get(path)
+        if entry is None or entry["signature"] != _signature(os.stat(path)):
+            return None
+        return entry["sha256"]
+
+    def file_hash(self, file_path: str) -> str:
+        """SHA-256 of file_path, computed only when the file's stat signature changed."""
+        from rag_store import compute_file_hash
+
+        path = os.path.abspath(file_path)
+        signature = _signature(os.stat(path))
+        entry = self._entries.get(path)
+        if entry is not None and entry["signature"] == signature:
+            return entry["sha256"]
+        digest = compute_file_hash(path)
+        with self._lock:
+            self._entries[path] = {"signature": signature, "sha256": digest, "verified_at": time.time()}
+        self._save()
+        return digest
+
+    def verify(self, file_paths: Optional[Sequence[str]] = None, workers: int = VERIFY_WORKERS) -> List[str]:
+        """Re-hash file_paths (default: every cached file) in parallel; returns those whose content changed.
+
+        Entries are refreshed; files that no longer exist are dropped.
+        """
+        from rag_store import compute_file_hash
+
+        paths = [os.path.abspath(p) for p in file_paths] if file_paths is not None else list(self._entries)
+
+        def check(path: str) -> Optional[bool]:
+            try:
+                signature = _signature(os.stat(path))
+                digest = compute_file_hash(path)
+            except OSError:
+                with self._lock:
+                    self._entries.pop(path, None)
+                    self._dropped.add(path)
+                return None
+            with self._lock:
+                previous = self._entries.get(path)
+                self._entries[path] = {"signature": signature, "sha256": digest, "verified_at": time.time()}
+            return previous is not None and previous["sha256"] != digest
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            changed = [path for path, result in zip(paths, pool.map(check, paths)) if result]
+        self._save()
+        return changed
+
+    def verify_in_background(self, file_paths: Optional[Sequence[str]] = None, workers: int = VERIFY_WORKERS, on_changed=None) -> threading.Thread:
+        """Run verify() on a daemon thread; on_changed(paths) is called with any changed files."""
+        def run() -> None:
+            changed = self.verify(file_paths, workers)
+            if changed and on_changed:
+                on_changed(changed)
+
+        thread = threading.Thread(target=run, name="fingerprint-verify", daemon=True)
+        thread.start()
+        return thread
+
+
+_cache: Optional[FingerprintCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> FingerprintCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = FingerprintCache()
+        return _cache
+
+
+def file_hash(file_path: str) -> str:
+    """Content hash of file_path through the process-wide fingerprint cache."""
+    return get_cache().file_hash(file_path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*")
+    parser.add_argument("--verify", action="store_true", help="Re-hash every cached file and report changed ones.")
+    parser.add_argument("--workers", type=int, default=VERIFY_WORKERS)
+    parser.add_argument("--enqueue", action="store_true", help="With --verify, queue changed files for re-ingestion.")
+    args = parser.parse_args()
+
+    cache = get_cache()
+    if args.verify:
+        started = time.perf_counter()
+        changed = cache.verify(args.files or None, workers=args.workers)
+        print(f"Verified {len(args.files) or len(cache._entries)} files in {time.perf_counter() - started:.1f}s; {len(changed)} changed")
+        for path in changed:
+            print(f"  changed: {path}")
+        if changed and args.enqueue:
+            from rag_store import RagStore
+
+            RagStore().enqueue_ingest(changed)
+            print(f"Queued {len(changed)} files for re-ingestion")
+        return
+
+    from rag_store import compute_file_hash
+
+    for path in args.files:
+        cache.file_hash(path)  # hash once if the file is new or changed
+        started = time.perf_counter()
+        digest = cache.file_hash(path)
+        cached_us = (time.perf_counter() - started) * 1e6
+        started = time.perf_counter()
+        compute_file_hash(path)
+        full_ms = (time.perf_counter() - started) * 1000
+        print(f"{digest[:16]}  {path}: fingerprint {cached_us:.0f} us, full hash {full_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
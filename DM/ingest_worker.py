@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Background ingestion worker.
+
+Claims jobs from the ingest_jobs table (see RagStore.enqueue_ingest) and
+ingests them, reporting per-batch progress so the app can show it. Start as
+many workers as you like, on one or several hosts pointing at the same
+DATABASE_URL; each job is claimed by exactly one of them.
+
+    python ingest_worker.py                   # run until interrupted
+    python ingest_worker.py --once            # drain the queue, then exit
+    python ingest_worker.py --enqueue DIR     # queue every PDF under DIR first
+    python ingest_worker.py --enqueue DIR --force  # ... re-ingesting unchanged PDFs too
+    python ingest_worker.py --backfill MODEL  # embed existing chunks with another model
+    python ingest_worker.py --centroids       # compute missing document centroids, then exit
+    python ingest_worker.py --compact-texts   # move chunk texts into per-document text blobs
+    python ingest_worker.py --rechunk 400:60  # re-chunk every stored document text and re-embed
+    python ingest_worker.py --rechunk 800:120:content  # ... with content-defined chunk boundaries
+    python ingest_worker.py --hash-bodies     # content-address chunks stored before body hashes
+
+Chunks are content-addressed: a chunk body already stored for any document
+reuses its embedding instead of calling the embedder again, and each job
+reports the share of its chunks that did so (the dedup ratio). Passages
+shared between overlapping standards are only cut into identical chunks with
+CHUNK_BOUNDARIES=content; the default fixed windows rarely line up, so set it
+and migrate chunks already stored with --rechunk 800:120:content before
+expecting any savings.
+
+A backfill stores a second embedding per chunk (chunk_embeddings) for use by
+RagStore.search_cascade; like jobs, several backfill workers can share the work.
+"""
+
+import argparse
+import os
+import threading
+import time
+from pathlib import Path
+
+from maintenance import after_bulk_ingest
+from ollama import embed_batch
+from rag_store import CHUNK_BOUNDARIES, DedupStats, RagStore
+
+EMBED_BATCH_SIZE = 32
+HEARTBEAT_SECONDS = 60  # well under claim_ingest_job's stale_after_seconds
+
+
+def _heartbeat(store: RagStore, job_id: int, stop: threading.Event) -> None:
+    # Progress only arrives once chunks are embedded; keep a long PDF extraction claimed meanwhile
+    while not stop.wait(HEARTBEAT_SECONDS):
+        try:
+            store.heartbeat_ingest_job(job_id)
+        except Exception as e:
+            print(f"[job {job_id}] heartbeat failed: {e}")
+
+
+def run_job(store: RagStore, job) -> None:
+    started = time.perf_counter()
+    print(f"[job {job.id}] ingesting {job.file_path}")
+    dedup = DedupStats()
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat, args=(store, job.id, stop), daemon=True).start()
+    try:
+        added, changed = store.ingest_pdf(
+            job.file_path,
+            embedder=embed_batch,
+            embed_batch_size=EMBED_BATCH_SIZE,
+            progress=lambda done, total: store.update_ingest_job(job.id, done, total),
+            dedup_stats=dedup,
+            force=job.force,
+        )
+    except Exception as e:
+        store.finish_ingest_job(job.id, error=str(e))
+        print(f"[job {job.id}] failed: {e}")
+        return
+    finally:
+        stop.set()
+    store.finish_ingest_job(job.id)
+    elapsed = time.perf_counter() - started
+    rate = f", {added / elapsed:.1f} chunks/s" if changed and elapsed else ""
+    deduped = f", {dedup.reused} reused stored embeddings (dedup ratio {dedup.ratio:.1%})" if changed else ""
+    print(f"[job {job.id}] {added} chunks ({'updated' if changed else 'cached'}) in {elapsed:.1f}s{rate}{deduped}")
+
+
+def run_backfill(store: RagStore, model: str) -> None:
+    started = time.perf_counter()
+
+    def report(done: int, total: int) -> None:
+        elapsed = time.perf_counter() - started
+        print(f"[backfill {model}] {done}/{total} chunks, {done / elapsed:.1f} chunks/s")
+
+    added = store.backfill_embeddings(
+        model,
+        embedder=lambda texts: embed_batch(texts, batch_size=EMBED_BATCH_SIZE, model=model),
+        batch_size=EMBED_BATCH_SIZE,
+        progress=report,
+    )
+    print(f"[backfill {model}] done: {added} chunks in {time.perf_counter() - started:.1f}s")
+    after_bulk_ingest(store)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--once", action="store_true", help="Exit when the queue is empty.")
+    parser.add_argument("--poll", type=float, default=2.0, help="Seconds to wait between polls of an empty queue.")
+    parser.add_argument("--enqueue", metavar="DIR", help="Queue every PDF under DIR before working.")
+    parser.add_argument("--force", action="store_true", help="With --enqueue, re-ingest PDFs even if unchanged.")
+    parser.add_argument("--backfill", metavar="MODEL", help="Embed every chunk that lacks a MODEL embedding, then exit.")
+    parser.add_argument("--centroids", action="store_true", help="Compute centroids of documents that lack them, then exit.")
+    parser.add_argument("--compact-texts", action="store_true", help="Store chunk texts once per document as offsets, then exit.")
+    parser.add_argument(
+        "--rechunk", metavar="SIZE:OVERLAP[:BOUNDARIES]",
+        help="Re-chunk stored document texts with new windows (BOUNDARIES fixed or content), then exit.",
+    )
+    parser.add_argument("--hash-bodies", action="store_true", help="Set the body hash of chunks that lack one, then exit.")
+    args = parser.parse_args()
+
+    store = RagStore()
+    store.ensure_schema()
+    if args.enqueue:
+        pdfs = sorted(str(p.resolve()) for p in Path(args.enqueue).rglob("*.pdf"))
+        store.enqueue_ingest(pdfs, force=args.force)
+        print(f"Queued {len(pdfs)} PDFs from {args.enqueue}")
+    if args.backfill:
+        run_backfill(store, args.backfill)
+        return
+    if args.compact_texts:
+        converted = store.compact_texts(progress=lambda path, chunks: print(f"[compact] {path}: {chunks} chunks"))
+        print(f"Converted {converted} documents to offset-only chunks")
+        return
+    if args.rechunk:
+        size, overlap, *boundaries = args.rechunk.split(":")
+        started = time.perf_counter()
+        dedup = DedupStats()
+        written = store.rechunk(
+            embed_batch,
+            chunk_size=int(size),
+            overlap=int(overlap),
+            embed_batch_size=EMBED_BATCH_SIZE,
+            progress=lambda path, chunks: print(f"[rechunk] {path}: {chunks} chunks"),
+            boundaries=boundaries[0] if boundaries else None,
+            dedup_stats=dedup,
+        )
+        print(
+            f"Re-chunked into {written} chunks of {size}/{overlap} in {time.perf_counter() - started:.1f}s,"
+            f" {dedup.unique} embedded (dedup ratio {dedup.ratio:.1%})"
+        )
+        return
+    if args.hash_bodies:
+        hashed = store.hash_bodies(progress=lambda document_id, chunks: print(f"[hash] document {document_id}: {chunks} chunks"))
+        stats = store.dedup_stats(read_your_writes=True)
+        print(f"Hashed {hashed} chunks; {stats.chunks} chunks hold {stats.unique} distinct bodies (dedup ratio {stats.ratio:.1%})")
+        return
+    if args.centroids:
+        started = time.perf_counter()
+        rows = store.refresh_centroids(missing_only=True)
+        print(f"{rows} document and section centroids after {time.perf_counter() - started:.1f}s")
+        return
+
+    # Documents without centroids are searched on every routed query; bring them under the router
+    store.refresh_centroids(missing_only=True)
+    print(f"Worker {os.getpid()} waiting for jobs")
+    since_analyze = 0  # jobs run since the queue was last drained
+    try:
+        while True:
+            job = store.claim_ingest_job()
+            if job is None:
+                if since_analyze:
+                    for action in after_bulk_ingest(store):
+                        print(f"Analyzed {action.target}: {action.reason}")
+                    stats = store.dedup_stats(read_your_writes=True)
+                    print(f"Store: {stats.chunks} chunks, {stats.unique} distinct bodies (dedup ratio {stats.ratio:.1%})")
+                    if CHUNK_BOUNDARIES == "fixed":
+                        print("Fixed chunk boundaries rarely dedupe: set CHUNK_BOUNDARIES=content and run --rechunk SIZE:OVERLAP:content")
+                    since_analyze = 0
+                if args.once:
+                    break
+                time.sleep(args.poll)
+                continue
+            run_job(store, job)
+            since_analyze += 1
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
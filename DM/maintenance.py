@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Table and index upkeep for the RagStore tables.
+
+Re-ingesting a document deletes and re-inserts all of its chunks. Autovacuum
+and autoanalyze lag behind such bulk churn: planner statistics go stale,
+dead tuples and index bloat pile up, and an ANN index drifts from the data
+it was built on. For ivfflat the list centroids no longer fit the vectors;
+for hnsw deleted nodes linger in the graph. This module reads
+pg_stat_user_tables and pg_stat_user_indexes and compares each vector index
+with the table size and write counters recorded when it was built
+(index_builds). From that it plans:
+
+    ANALYZE               rows modified since the last analyze > analyze_ratio
+    VACUUM (ANALYZE)      dead tuples > vacuum_dead_ratio of live ones
+    REINDEX CONCURRENTLY  rows written since the build > reindex_churn_ratio of the rows then,
+                          index larger than bloat_ratio x its size at build (scaled by rows),
+                          or ivfflat lists off by lists_factor from rows/1000
+
+    python maintenance.py            # dry run: statistics and planned actions
+    python maintenance.py --apply    # run them
+
+ingest_worker.py and snapshot imports call after_bulk_ingest(), which only
+runs the ANALYZEs.
+"""
+
+import argparse
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+MAINTAINED_TABLES = (
+    "documents", "chunks", "chunk_embeddings", "document_texts", "document_centroids", "document_tags", "ingest_jobs",
+)
+VECTOR_METHODS = ("hnsw", "ivfflat")
+
+
+@dataclass
+class MaintenancePolicy:
+    analyze_ratio: float = 0.1
+    vacuum_dead_ratio: float = 0.2
+    reindex_churn_ratio: float = 0.5
+    bloat_ratio: float = 1.5
+    lists_factor: float = 2.0
+    min_rows: int = 10000  # smaller tables are never reindexed
+
+
+@dataclass
+class TableStats:
+    table: str
+    live_rows: int
+    dead_rows: int
+    modified_since_analyze: int
+    writes: int  # n_tup_ins + n_tup_upd + n_tup_del since the statistics were reset
+    size_bytes: int
+    last_analyze: Optional[str] = None
+    last_vacuum: Optional[str] = None
+
+    @property
+    def dead_ratio(self) -> float:
+        return self.dead_rows / max(1, self.live_rows)
+
+
+@dataclass
+class IndexStats:
+    index: str
+    table: str
+    method: str
+    size_bytes: int
+    scans: int
+    options: Dict[str, str] = field(default_factory=dict)
+    built_rows: Optional[int] = None  # None: no build record
+    built_bytes: Optional[int] = None
+    built_writes: Optional[int] = None
+
+
+@dataclass
+class Action:
+    kind: str  # analyze, vacuum, reindex or baseline
+    target: str
+    reason: str
+    statements: List[str] = field(default_factory=list)
+
+
+def _stats_sql(tables: Sequence[str]) -> Tuple[str, Dict]:
+    return (
+        "SELECT relname, n_live_tup, n_dead_tup, n_mod_since_analyze, n_tup_ins + n_tup_upd + n_tup_del,"
+        " pg_table_size(relid), greatest(last_analyze, last_autoanalyze)::text,"
+        " greatest(last_vacuum, last_autovacuum)::text"
+        " FROM pg_stat_user_tables WHERE relname = ANY(:tables)"
+        # Partitions of chunks (partitioning.py) carry their own statistics
+        " OR relid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass('chunks'))"
+        " ORDER BY relname",
+        {"tables": list(tables)},
+    )
+
+
+def table_stats(store, tables: Sequence[str] = MAINTAINED_TABLES) -> List[TableStats]:
+    from rag_store import sql_text
+
+    statement, params = _stats_sql(tables)
+    with store.engine.connect() as conn:
+        rows = conn.execute(sql_text(statement), params).all()
+    return [
+        TableStats(
+            table=name, live_rows=live, dead_rows=dead, modified_since_analyze=modified, writes=writes,
+            size_bytes=size, last_analyze=analyzed, last_vacuum=vacuumed,
+        )
+        for name, live, dead, modified, writes, size, analyzed, vacuumed in rows
+    ]
+
+
+def index_stats(store) -> List[IndexStats]:
+    from rag_store import IndexBuild, sql_text
+
+    with store.engine.connect() as conn:
+        rows = conn.execute(
+            sql_text(
+                "SELECT i.indexrelname, i.relname, am.amname, pg_relation_size(i.indexrelid), i.idx_scan, c.reloptions"
+                " FROM pg_stat_user_indexes i JOIN pg_class c ON c.oid = i.indexrelid JOIN pg_am am ON am.oid = c.relam"
+                " WHERE am.amname = ANY(:methods) ORDER BY i.indexrelname"
+            ),
+            {"methods": list(VECTOR_METHODS)},
+        ).all()
+    with store.SessionLocal() as session:
+        builds = {b.index_name: b for b in session.query(IndexBuild).all()}
+    indexes = []
+    for name, table, method, size, scans, options in rows:
+        build = builds.get(name)
+        indexes.append(
+            IndexStats(
+                index=name, table=table, method=method, size_bytes=size, scans=scans,
+                options=dict(option.split("=", 1) for option in options or []),
+                built_rows=build.rows if build else None,
+                built_bytes=build.bytes if build else None,
+                built_writes=build.writes if build else None,
+            )
+        )
+    return indexes
+
+
+def record_build(store, index_name: str, only_missing: bool = False) -> None:
+    """Remember the table's size and write counter as of index_name's (re)build."""
+    from rag_store import IndexBuild, sql_text
+
+    with store.SessionLocal() as session:
+        if only_missing and session.get(IndexBuild, index_name) is not None:
+            return
+        row = session.execute(
+            sql_text(
+                "SELECT s.relname, greatest(s.n_live_tup, c.reltuples::bigint), pg_relation_size(CAST(:index AS regclass)),"
+                " s.n_tup_ins + s.n_tup_upd + s.n_tup_del"
+                " FROM pg_index x JOIN pg_stat_user_tables s ON s.relid = x.indrelid JOIN pg_class c ON c.oid = x.indrelid"
+                " WHERE x.indexrelid = CAST(:index AS regclass)"
+            ),
+            {"index": index_name},
+        ).first()
+        if row is None:
+            return  # a partitioned parent: its per-partition indexes are tracked instead
+        session.merge(IndexBuild(index_name=index_name, table_name=row[0], rows=row[1], bytes=row[2], writes=row[3]))
+        session.commit()
+
+
+def _ivfflat_lists(rows: int) -> int:
+    """pgvector's guidance: rows/1000 up to 1M rows, sqrt(rows) beyond."""
+    return max(1, rows // 1000 if rows <= 1_000_000 else int(rows ** 0.5))
+
+
+def plan(tables: Sequence[TableStats], indexes: Sequence[IndexStats], policy: MaintenancePolicy = MaintenancePolicy()) -> List[Action]:
+    """The actions the statistics call for; pure, so it can be checked without a database."""
+    actions: List[Action] = []
+    by_table = {t.table: t for t in tables}
+    for t in tables:
+        if t.live_rows and t.dead_ratio > policy.vacuum_dead_ratio:
+            actions.append(
+                Action("vacuum", t.table, f"{t.dead_rows} dead rows ({t.dead_ratio:.0%} of live)", [f"VACUUM (ANALYZE) {t.table}"])
+            )
+        elif t.modified_since_analyze > policy.analyze_ratio * max(1, t.live_rows):
+            actions.append(
+                Action("analyze", t.table, f"{t.modified_since_analyze} rows modified since the last analyze", [f"ANALYZE {t.table}"])
+            )
+    for ix in indexes:
+        t = by_table.get(ix.table)
+        if ix.built_rows is None:
+            actions.append(Action("baseline", ix.index, "no build record; current size and write count become the baseline"))
+            continue
+        if t is None or max(t.live_rows, ix.built_rows) < policy.min_rows:
+            continue
+        reasons = []
+        # Statistics resets restart the counter; then count every write since the reset
+        written = t.writes - ix.built_writes if t.writes >= ix.built_writes else t.writes
+        if written > policy.reindex_churn_ratio * max(1, ix.built_rows):
+            reasons.append(f"{written} rows written since the build ({written / max(1, ix.built_rows):.0%} of {ix.built_rows})")
+        expected = ix.built_bytes * t.live_rows / max(1, ix.built_rows)
+        if expected and ix.size_bytes > policy.bloat_ratio * expected:
+            reasons.append(f"{ix.size_bytes / 2**20:.0f} MB vs ~{expected / 2**20:.0f} MB expected for {t.live_rows} rows")
+        statements = []
+        if ix.method == "ivfflat":
+            lists, wanted = int(ix.options.get("lists", 100)), _ivfflat_lists(t.live_rows)
+            if max(lists, wanted) > policy.lists_factor * min(lists, wanted):
+                reasons.append(f"lists = {lists} but {t.live_rows} rows want {wanted}")
+                statements.append(f"ALTER INDEX {ix.index} SET (lists = {wanted})")
+        if reasons:
+            statements.append(f"REINDEX INDEX CONCURRENTLY {ix.index}")
+            actions.append(Action("reindex", ix.index, "; ".join(reasons), statements))
+    return actions
+
+
+def apply_actions(store, actions: Sequence[Action], progress=print) -> None:
+    from rag_store import sql_text
+
+    for action in actions:
+        started = time.perf_counter()
+        # VACUUM and REINDEX CONCURRENTLY cannot run inside a transaction block
+        with store.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for statement in action.statements:
+                conn.execute(sql_text(statement))
+        if action.kind in ("reindex", "baseline"):
+            record_build(store, action.target)
+        if progress:
+            progress(f"{action.kind} {action.target}: {time.perf_counter() - started:.1f}s")
+
+
+def after_bulk_ingest(store, policy: MaintenancePolicy = MaintenancePolicy()) -> List[Action]:
+    """ANALYZE the tables a bulk ingest changed enough to mislead the planner; returns what ran."""
+    actions = [a for a in plan(table_stats(store), [], policy) if a.kind == "analyze"]
+    apply_actions(store, actions, progress=None)
+    return actions
+
+
+def format_report(tables: Sequence[TableStats], indexes: Sequence[IndexStats], actions: Sequence[Action]) -> str:
+    lines = [f"{'table':<18} {'live':>10} {'dead':>9} {'modified':>9} {'size MB':>8}  last analyze"]
+    for t in tables:
+        lines.append(
+            f"{t.table:<18} {t.live_rows:>10} {t.dead_rows:>9} {t.modified_since_analyze:>9} "
+            f"{t.size_bytes / 2**20:>8.1f}  {t.last_analyze or 'never'}"
+        )
+    lines.append("")
+    lines.append(f"{'vector index':<40} {'method':<8} {'size MB':>8} {'scans':>8} {'rows at build':>14}")
+    for ix in indexes:
+        built = str(ix.built_rows) if ix.built_rows is not None else "-"
+        lines.append(f"{ix.index:<40} {ix.method:<8} {ix.size_bytes / 2**20:>8.1f} {ix.scans:>8} {built:>14}")
+    lines.append("")
+    if not actions:
+        lines.append("Nothing to do.")
+    for action in actions:
+        lines.append(f"{action.kind.upper():<8} {action.target}: {action.reason}")
+        lines.extend(f"    {statement};" for statement in action.statements)
+    return "\n".join(lines)
+
+
+def run_maintenance(store, apply: bool = False, policy: MaintenancePolicy = MaintenancePolicy()) -> str:
+    tables, indexes = table_stats(store), index_stats(store)
+    actions = plan(tables, indexes, policy)
+    report = format_report(tables, indexes, actions)
+    if apply:
+        apply_actions(store, actions)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apply", action="store_true", help="Run the planned actions (default: report only).")
+    parser.add_argument("--churn", type=float, default=MaintenancePolicy.reindex_churn_ratio, help="Reindex churn ratio.")
+    parser.add_argument("--bloat", type=float, default=MaintenancePolicy.bloat_ratio, help="Reindex bloat ratio.")
+    args = parser.parse_args()
+
+    from rag_store import RagStore
+
+    store = RagStore()
+    store.ensure_schema()
+    print(run_maintenance(store, apply=args.apply, policy=MaintenancePolicy(reindex_churn_ratio=args.churn, bloat_ratio=args.bloat)))
+    if not args.apply:
+        print("\n(dry run; pass --apply to run these)")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,11 +2,12 @@ import os
 import sys
 import glob
 import argparse
-import requests
-from PyPDF2 import PdfReader
+from dataclasses import dataclass
+from typing import List, Optional
 
 OLLAMA_API_URL = "http://localhost:11434/api/generate"
 OLLAMA_EMBED_URL = "http://localhost:11434/api/embeddings"
+OLLAMA_EMBED_BATCH_URL = "http://localhost:11434/api/embed"  # accepts a list of inputs per request
 def set_public_key_env(public_key):
     env_path = os.path.join(os.path.dirname(__file__), '.env')
     key_line = f"OLLAMA_PUBLIC_KEY={public_key}\n"
@@ -24,17 +25,23 @@ def set_public_key_env(public_key):
 
 OLLAMA_MODEL = "phi3:latest"  # Change to your preferred model
 OLLAMA_EMBED_MODEL = os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
+# How long Ollama keeps the model (and its KV cache) resident after a request
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
 
 def read_pdf_text(pdf_path):
+    from pdf_extract import iter_pages
+
     text = []
     try:
-        reader = PdfReader(pdf_path)
-        for page in reader.pages:
-            text.append(page.extract_text() or "")
+        for page_text in iter_pages(pdf_path):
+            text.append(page_text)
     except Exception as e:
         print(f"Error reading {pdf_path}: {e}")
     return "\n".join(text)
 
+def list_folder_pdfs(folder):
+    return sorted(os.path.abspath(p) for p in glob.glob(os.path.join(folder, "*.pdf")))
+
 def collect_pdfs_text(folder):
     pdf_files = glob.glob(os.path.join(folder, "*.pdf"))
     all_text = []
@@ -43,7 +50,12 @@ def collect_pdfs_text(folder):
         all_text.append(read_pdf_text(pdf))
     return "\n".join(all_text)
 
-def ask_ollama(question, context=""):
+def ask_ollama(question, context="", path=None):
+    """Answer question from context; path tags the call in the performance ledger."""
+    import requests  # deferred so importing this module stays cheap
+    from ollama_pool import get_pool
+    from perf_ledger import record
+
     prompt = f"{context}\n\nQuestion: {question}\nAnswer:"
     payload = {
         "model": OLLAMA_MODEL,
@@ -51,9 +63,10 @@ def ask_ollama(question, context=""):
         "stream": False
     }
     try:
-        resp = requests.post(OLLAMA_API_URL, json=payload, timeout=120)
+        resp = get_pool().post("/api/generate", payload, timeout=120)
         resp.raise_for_status()
         data = resp.json()
+        record(data, OLLAMA_MODEL, path or ("context" if context else "direct"), len(prompt))
         return data.get("response", "").strip()
     except requests.exceptions.Timeout:
         return "Error: Request timed out after 120 seconds. The model may be processing a complex request."
@@ -63,17 +76,116 @@ def ask_ollama(question, context=""):
         return f"Error querying Ollama: {e}"
 
 
-def embed_texts(texts):
+def generate(prompt, model=OLLAMA_MODEL, context=None, keep_alive=OLLAMA_KEEP_ALIVE, options=None, timeout=120, path="generate"):
+    """Call /api/generate and return the full response payload.
+
+    Unlike ask_ollama this keeps Ollama's timing counters and the returned
+    `context` token list, so callers can continue a conversation from it.
+    The counters are also recorded in the performance ledger under path.
+    Raises requests exceptions to the caller.
+    """
+    from ollama_pool import get_pool
+    from perf_ledger import record
+
+    payload = {"model": model, "prompt": prompt, "stream": False}
+    if context:
+        payload["context"] = context
+    if keep_alive:
+        payload["keep_alive"] = keep_alive
+    if options:
+        payload["options"] = options
+    resp = get_pool().post("/api/generate", payload, timeout=timeout)
+    resp.raise_for_status()
+    data = resp.json()
+    record(data, model, path, len(prompt))
+    return data
+
+
+@dataclass
+class SessionTurn:
+    question: str
+    answer: str
+    prompt_eval_count: int
+    prompt_eval_ms: float
+    reused_tokens: int
+    saved_ms: float
+
+
+class DocumentSession:
+    """Follow-up questions over one document that reuse Ollama's KV context.
+
+    The document text is sent once as a stable prefix. Every later turn passes
+    the `context` returned by the previous turn, so Ollama only prompt-evaluates
+    the new question tokens. keep_alive pins the model so the cache survives
+    between turns.
+    """
+
+    def __init__(self, document_key, context_text, model=OLLAMA_MODEL, keep_alive=OLLAMA_KEEP_ALIVE, num_ctx=8192):
+        self.document_key = document_key
+        self.context_text = context_text
+        self.model = model
+        self.keep_alive = keep_alive
+        self.num_ctx = num_ctx
+        self.turns: List[SessionTurn] = []
+        self._context: Optional[List[int]] = None
+        self._ms_per_prompt_token: Optional[float] = None
+
+    def reset(self):
+        self.turns = []
+        self._context = None
+
+    def _prompt_for(self, question):
+        if self._context is None:
+            return f"Context:\n{self.context_text}\n\nQuestion: {question}\nAnswer based on this context:"
+        return f"\n\nQuestion: {question}\nAnswer based on this context:"
+
+    def ask(self, question) -> SessionTurn:
+        # Start over when the carried context would overflow the window; Ollama
+        # would otherwise silently drop the document prefix.
+        if self._context is not None and len(self._context) > self.num_ctx * 0.9:
+            self._context = None
+        reused_tokens = len(self._context) if self._context else 0
+        data = generate(
+            self._prompt_for(question),
+            model=self.model,
+            context=self._context,
+            keep_alive=self.keep_alive,
+            options={"num_ctx": self.num_ctx},
+            path="conversation",
+        )
+        prompt_eval_count = int(data.get("prompt_eval_count") or 0)
+        prompt_eval_ms = (data.get("prompt_eval_duration") or 0) / 1e6
+        if reused_tokens == 0 and prompt_eval_count:
+            self._ms_per_prompt_token = prompt_eval_ms / prompt_eval_count
+        saved_ms = reused_tokens * (self._ms_per_prompt_token or 0.0)
+        self._context = data.get("context") or None
+        turn = SessionTurn(
+            question=question,
+            answer=data.get("response", "").strip(),
+            prompt_eval_count=prompt_eval_count,
+            prompt_eval_ms=prompt_eval_ms,
+            reused_tokens=reused_tokens,
+            saved_ms=saved_ms,
+        )
+        self.turns.append(turn)
+        return turn
+
+
+def embed_texts(texts, model=None):
     """Return list of embeddings for the given texts using Ollama embeddings API.
+    model defaults to OLLAMA_EMBED_MODEL.
     Falls back to empty list on errors (caller should handle missing embeddings).
     """
+    import requests
+    from ollama_pool import get_pool
+
     if not texts:
         return []
     try:
         # Ollama embeddings API expects one text at a time; batch for simplicity
         embeddings = []
         for t in texts:
-            resp = requests.post(OLLAMA_EMBED_URL, json={"model": OLLAMA_EMBED_MODEL, "prompt": t}, timeout=120)
+            resp = get_pool().post("/api/embeddings", {"model": model or OLLAMA_EMBED_MODEL, "prompt": t}, timeout=120)
             resp.raise_for_status()
             data = resp.json()
             emb = data.get("embedding") or data.get("embeddings") or data.get("data", [{}])[0].get("embedding")
@@ -91,25 +203,172 @@ def embed_texts(texts):
         print(f"Error getting embeddings: {e}")
         return []
 
+def embed_batch(texts, batch_size=64, model=None):
+    """Embed texts with one /api/embed request per batch_size inputs (model defaults to OLLAMA_EMBED_MODEL).
+
+    With several Ollama hosts (OLLAMA_HOSTS), batches are sent concurrently so
+    they spread across the pool. Falls back to embed_texts (one request per
+    text) for Ollama versions without the batch endpoint. Returns [] on
+    errors, like embed_texts.
+    """
+    import requests
+    from ollama_pool import get_pool
+
+    if not texts:
+        return []
+    model = model or OLLAMA_EMBED_MODEL
+    pool = get_pool()
+    batches = [list(texts[start:start + batch_size]) for start in range(0, len(texts), batch_size)]
+
+    def embed_one(batch):
+        resp = pool.post("/api/embed", {"model": model, "input": batch}, timeout=120)
+        if resp.status_code == 404:
+            return None
+        resp.raise_for_status()
+        batch_embeddings = resp.json().get("embeddings") or []
+        if len(batch_embeddings) != len(batch):
+            raise ValueError(f"Expected {len(batch)} embeddings, got {len(batch_embeddings)}")
+        return batch_embeddings
+
+    try:
+        workers = min(len(batches), len(pool.available(model)))
+        if workers > 1:
+            from concurrent.futures import ThreadPoolExecutor
+
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(embed_one, batches))
+        else:
+            results = []
+            for batch in batches:
+                results.append(embed_one(batch))
+                if results[-1] is None:
+                    break
+        if any(result is None for result in results):
+            return embed_texts(texts, model=model)
+        return [embedding for result in results for embedding in result]
+    except requests.exceptions.ConnectionError:
+        print("Error: Cannot connect to Ollama for embeddings. Please ensure Ollama is running on localhost:11434.")
+        return []
+    except Exception as e:
+        print(f"Error getting batch embeddings: {e}")
+        return []
+
+def ensure_folder_indexed(store, folder, verify=False):
+    """Ingest PDFs in folder that are not in the index yet and return all their paths.
+
+    PDFs already in the index are not opened at all unless verify is set, in
+    which case their content hash is re-checked and changed files re-ingested.
+    """
+    from rag_store import CHUNK_BOUNDARIES, DedupStats
+
+    pdfs = list_folder_pdfs(folder)
+    known = set(store.indexed_paths(pdfs))
+    dedup = DedupStats()
+    for pdf in pdfs:
+        if pdf in known and not verify:
+            continue
+        added, changed = store.ingest_pdf(pdf, embedder=embed_texts, dedup_stats=dedup)
+        if changed:
+            print(f"Indexed: {pdf} ({added} chunks)")
+    if dedup.chunks:
+        print(f"Embedded {dedup.unique} of {dedup.chunks} new chunks (dedup ratio {dedup.ratio:.1%})")
+        if CHUNK_BOUNDARIES == "fixed":
+            print("Fixed chunk boundaries rarely dedupe: set CHUNK_BOUNDARIES=content and run ingest_worker.py --rechunk SIZE:OVERLAP:content")
+    return pdfs
+
+def retrieve_index_context(question, folder, k=6, verify=False):
+    """Build context from the pgvector index for the PDFs in folder."""
+    from rag_store import RagStore  # needs SQLAlchemy/pgvector, only for --index
+
+    store = RagStore()
+    store.ensure_schema()
+    pdfs = ensure_folder_indexed(store, folder, verify=verify)
+    query_embeddings = embed_texts([question])
+    if not query_embeddings:
+        return ""
+    from context_compress import compress_results, format_context
+
+    candidates = store.search(query_embeddings[0], document_paths=pdfs, k=k * 3, include_embeddings=True)
+    results, stats = compress_results(query_embeddings[0], candidates, k=k)
+    print(f"Compressed {stats.candidates} candidates to {stats.passages} passages (~{stats.tokens_saved} tokens saved).")
+    return format_context(results)
+
+def server_request(server_url, route, payload, timeout=300):
+    """POST payload to a running server.py and return its JSON reply (e.g. route "/ask" with "stream": False)."""
+    import requests
+
+    resp = requests.post(server_url.rstrip("/") + route, json=payload, timeout=timeout)
+    resp.raise_for_status()
+    return resp.json()
+
+def ask_server(server_url, question, document_paths=None, k=6):
+    """Ask a running server.py and print the answer as it streams; returns the full answer."""
+    import json
+    import requests
+
+    payload = {"question": question, "document_paths": document_paths or [], "k": k, "stream": True}
+    answer = []
+    with requests.post(server_url.rstrip("/") + "/ask", json=payload, stream=True, timeout=300) as resp:
+        resp.raise_for_status()
+        for line in resp.iter_lines():
+            if not line:
+                continue
+            part = json.loads(line)
+            if "sources" in part:
+                titles = sorted({s["document_title"] for s in part["sources"]})
+                print(f"Sources: {', '.join(titles) or 'none'}\n")
+            elif "response" in part:
+                answer.append(part["response"])
+                print(part["response"], end="", flush=True)
+    print()
+    return "".join(answer)
+
 def main():
     # Set public key in .env if not present
     public_key = "ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAIJaCNy155RCb0TpgmGjEyTdxOqiLT6kCQwI2JOhZEmFi"
     set_public_key_env(public_key)
     parser = argparse.ArgumentParser(description="Ask questions using Ollama and optionally read PDFs.")
-    parser.add_argument("question", help="The question to ask.")
+    parser.add_argument("question", nargs="?", help="The question to ask.")
     parser.add_argument("--pdf-folder", help="Folder containing PDFs to use as context.", default=None)
+    parser.add_argument("--index", action="store_true", help="Retrieve relevant chunks from the pgvector index instead of reading every PDF.")
+    parser.add_argument("--reindex", action="store_true", help="With --index, re-check already indexed PDFs for changes.")
+    parser.add_argument("-k", type=int, default=6, help="Number of chunks to retrieve with --index.")
+    parser.add_argument("--batch", help="JSONL or CSV file of questions to answer from the index (see batch_qa.py).")
+    parser.add_argument("--output", default="answers.jsonl", help="JSONL file batch results are appended to.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent generations in batch mode.")
+    parser.add_argument("--server", default=os.getenv("DM_SERVER_URL"), help="Ask a running server.py (e.g. http://127.0.0.1:8085) instead of working in this process; also used by --batch.")
     args = parser.parse_args()
 
+    if args.batch:
+        from batch_qa import run_batch
+        run_batch(
+            args.batch, args.output, pdf_folder=args.pdf_folder, k=args.k, concurrency=args.concurrency,
+            verify=args.reindex, server_url=args.server,
+        )
+        return
+    if not args.question:
+        parser.error("a question is required unless --batch is given")
+    if args.server:
+        document_paths = list_folder_pdfs(args.pdf_folder) if args.pdf_folder else None
+        ask_server(args.server, args.question, document_paths=document_paths, k=args.k)
+        return
+
     context = ""
-    if args.pdf_folder:
+    path = "direct"
+    if args.pdf_folder and args.index:
+        path = "rag"
+        context = retrieve_index_context(args.question, args.pdf_folder, k=args.k, verify=args.reindex)
+        print(f"Retrieved context from index ({len(context)} characters).")
+    elif args.pdf_folder:
         context = collect_pdfs_text(args.pdf_folder)
         max_context_length = 4000
         if len(context) > max_context_length:
             print(f"Context too long ({len(context)} characters), truncating to {max_context_length} characters.")
             context = context[:max_context_length]
         print(f"Collected context from PDFs ({len(context)} characters).")
+        path = "pdf-context"
 
-    answer = ask_ollama(args.question, context)
+    answer = ask_ollama(args.question, context, path=path)
     print("\nAnswer:\n", answer)
 
 if __name__ == "__main__":
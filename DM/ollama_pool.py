@@ -0,0 +1,300 @@
+"""
+Load-balanced pool of Ollama backends.
+
+OLLAMA_HOSTS lists the hosts, separated by ";" or whitespace, each optionally
+followed by "=" and the models it serves (default: whatever its /api/tags
+reports):
+
+    OLLAMA_HOSTS="http://gpu1:11434=phi3:latest,nomic-embed-text; http://gpu2:11434"
+
+Requests go to the healthy host serving the model with the fewest requests in
+flight. Connection errors, timeouts and 5xx responses fail over to the next
+host; a host that fails max_failures times in a row is ejected for
+eject_seconds. A background thread polls /api/tags on every host and
+re-admits hosts that answer. Without OLLAMA_HOSTS the pool has one host, the
+one in OLLAMA_API_URL.
+
+    response = get_pool().post("/api/generate", {"model": "phi3:latest", "prompt": "Hi", "stream": False})
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, FrozenSet, List, Optional, Sequence
+
+HEALTH_INTERVAL_SECONDS = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "10"))
+HEALTH_TIMEOUT_SECONDS = 5
+MAX_FAILURES = 2
+EJECT_SECONDS = 30.0
+
+
+def _model_key(name: str) -> str:
+    """Ollama treats "phi3" and "phi3:latest" as the same model."""
+    return name if ":" in name else f"{name}:latest"
+
+
+@dataclass
+class Backend:
+    url: str
+    models: Optional[FrozenSet[str]] = None  # configured; None serves whatever /api/tags lists
+    discovered: Optional[FrozenSet[str]] = None  # from the last successful health check
+    outstanding: int = 0
+    served: int = 0
+    failures: int = 0
+    healthy: bool = True
+    ejected_until: float = 0.0
+    last_error: Optional[str] = None
+    latencies_ms: List[float] = field(default_factory=list)
+
+    def serves(self, model: Optional[str]) -> bool:
+        if model is None:
+            return True
+        known = self.models if self.models is not None else self.discovered
+        return known is None or _model_key(model) in known
+
+
+def parse_hosts(spec: str) -> List[Backend]:
+    backends = []
+    for entry in spec.replace(";", " ").split():
+        url, _, models = entry.partition("=")
+        backends.append(
+            Backend(
+                url=url.rstrip("/"),
+                models=frozenset(_model_key(m) for m in models.split(",") if m) if models else None,
+            )
+        )
+    return backends
+
+
+class BackendPool:
+    def __init__(
+        self,
+        backends: Sequence[Backend],
+        max_failures: int = MAX_FAILURES,
+        eject_seconds: float = EJECT_SECONDS,
+        health_interval: float = HEALTH_INTERVAL_SECONDS,
+    ) -> None:
+        if not backends:
+            raise ValueError("A backend pool needs at least one host")
+        self.backends = list(backends)
+        self.max_failures = max_failures
+        self.eject_seconds = eject_seconds
+        self.health_interval = health_interval
+        self._lock = threading.Lock()
+        self._health_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @classmethod
+    def from_env(cls) -> "BackendPool":
+        spec = os.getenv("OLLAMA_HOSTS")
+        if not spec:
+            from ollama import OLLAMA_API_URL
+
+            spec = OLLAMA_API_URL.split("/api/", 1)[0]
+        return cls(parse_hosts(spec))
+
+    def available(self, model: Optional[str] = None) -> List[Backend]:
+        """Healthy hosts serving model, least outstanding requests first."""
+        now = time.monotonic()
+        with self._lock:
+            # No host lists the model: send it anyway and let Ollama report the error
+            serving = [b for b in self.backends if b.serves(model)] or list(self.backends)
+            healthy = [b for b in serving if b.healthy and b.ejected_until <= now]
+            # With every host ejected, still try them (earliest ejection first) rather than fail outright
+            ordered = sorted(healthy, key=lambda b: (b.outstanding, b.served)) or sorted(serving, key=lambda b: b.ejected_until)
+        return ordered
+
+    def _begin(self, backend: Backend) -> None:
+        with self._lock:
+            backend.outstanding += 1
+
+    def _end(self, backend: Backend, error: Optional[str], elapsed_ms: float, rejected: Optional[str] = None) -> None:
+        """Account a finished request: error counts towards ejection; a rejected (4xx) one is neither a
+        failure of the host nor a success, so it cannot re-admit a host or feed its latency."""
+        with self._lock:
+            backend.outstanding -= 1
+            if error is None and rejected is not None:
+                backend.last_error = rejected
+                return
+            if error is None:
+                backend.served += 1
+                backend.failures = 0
+                backend.healthy = True
+                backend.ejected_until = 0.0
+                backend.latencies_ms = (backend.latencies_ms + [elapsed_ms])[-100:]
+                return
+            backend.failures += 1
+            backend.last_error = error
+            if backend.failures >= self.max_failures:
+                backend.healthy = False
+                backend.ejected_until = time.monotonic() + self.eject_seconds
+
+    def post(self, path: str, payload: Dict, timeout: float = 120):
+        """POST payload to path on the best host for payload["model"], failing over on errors.
+
+        Returns the first response below 500 (callers handle 4xx as before);
+        re-raises the last error when every host failed.
+        """
+        import requests
+
+        self.ensure_health_checks()
+        last_error: Optional[Exception] = None
+        for backend in self.available(payload.get("model")):
+            self._begin(backend)
+            started = time.perf_counter()
+            error = rejected = None
+            try:
+                response = requests.post(backend.url + path, json=payload, timeout=timeout)
+                if response.status_code >= 500:
+                    error = f"HTTP {response.status_code}"
+                    last_error = requests.exceptions.HTTPError(f"{error} from {backend.url}", response=response)
+                    continue
+                if response.status_code >= 400:
+                    rejected = f"HTTP {response.status_code}"
+                return response
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = str(e)
+                last_error = e
+            except Exception as e:
+                # e.g. ChunkedEncodingError: the host failed, but the caller gets the error rather than a failover
+                error = str(e) or type(e).__name__
+                raise
+            finally:
+                self._end(backend, error, (time.perf_counter() - started) * 1000, rejected)
+        raise last_error
+
+    async def apost(self, http, path: str, payload: Dict, timeout: float = 120) -> Dict:
+        """Async post() over an aiohttp ClientSession; returns the decoded JSON body.
+
+        For /api/generate send "stream": False. Fails over like post(); raises
+        aiohttp.ClientResponseError for 4xx.
+        """
+        replies = self.astream(http, path, payload, timeout)
+        try:
+            async for body in replies:
+                return body
+        finally:
+            await replies.aclose()
+        raise RuntimeError(f"Empty response from Ollama for {path}")
+
+    async def astream(self, http, path: str, payload: Dict, timeout: float = 300) -> AsyncIterator[Dict]:
+        """POST payload and yield each JSON line of Ollama's streamed reply.
+
+        Fails over to the next host only until the first line arrives; after
+        that an error is raised to the caller.
+        """
+        import aiohttp
+
+        self.ensure_health_checks()
+        last_error: Optional[BaseException] = None
+        for backend in self.available(payload.get("model")):
+            self._begin(backend)
+            started = time.perf_counter()
+            error = rejected = None
+            streamed = False
+            try:
+                async with http.post(
+                    backend.url + path, json=payload, timeout=aiohttp.ClientTimeout(total=timeout)
+                ) as response:
+                    if response.status >= 500:
+                        error = f"HTTP {response.status}"
+                        last_error = RuntimeError(f"{error} from {backend.url}")
+                        continue
+                    if response.status >= 400:
+                        rejected = f"HTTP {response.status}"
+                    response.raise_for_status()
+                    async for line in response.content:
+                        if line.strip():
+                            streamed = True
+                            yield json.loads(line)
+                    return
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                error = str(e) or type(e).__name__
+                last_error = e
+                if streamed:
+                    raise
+            except Exception as e:
+                # ClientPayloadError, a malformed JSON line...; 4xx (raise_for_status) is only a rejection
+                if rejected is None:
+                    error = str(e) or type(e).__name__
+                raise
+            finally:
+                self._end(backend, error, (time.perf_counter() - started) * 1000, rejected)
+        raise last_error
+
+    def check_health(self) -> None:
+        """Poll /api/tags on every host; answering hosts are re-admitted and their model list refreshed."""
+        import requests
+
+        for backend in self.backends:
+            try:
+                response = requests.get(backend.url + "/api/tags", timeout=HEALTH_TIMEOUT_SECONDS)
+                response.raise_for_status()
+                models = frozenset(_model_key(m["name"]) for m in response.json().get("models", []))
+            except Exception as e:
+                with self._lock:
+                    backend.healthy = False
+                    backend.last_error = str(e)
+                continue
+            with self._lock:
+                backend.discovered = models
+                backend.healthy = True
+                backend.failures = 0
+                backend.ejected_until = 0.0
+
+    def ensure_health_checks(self) -> None:
+        if self._health_thread is not None or self.health_interval <= 0:
+            return
+        with self._lock:
+            if self._health_thread is not None:
+                return
+            self._health_thread = threading.Thread(target=self._health_loop, name="ollama-health", daemon=True)
+        self._health_thread.start()
+
+    def _health_loop(self) -> None:
+        while not self._stop.is_set():
+            self.check_health()
+            self._stop.wait(self.health_interval)
+
+    def close(self) -> None:
+        self._stop.set()
+
+    def status(self) -> List[Dict]:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "url": b.url,
+                    "healthy": b.healthy and b.ejected_until <= now,
+                    "outstanding": b.outstanding,
+                    "served": b.served,
+                    "models": sorted(b.models if b.models is not None else b.discovered or []),
+                    "p50_ms": sorted(b.latencies_ms)[len(b.latencies_ms) // 2] if b.latencies_ms else None,
+                    "last_error": b.last_error,
+                }
+                for b in self.backends
+            ]
+
+
+_pool: Optional[BackendPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> BackendPool:
+    """The process-wide pool, built from OLLAMA_HOSTS on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BackendPool.from_env()
+        return _pool
+
+
+if __name__ == "__main__":
+    pool = get_pool()
+    pool.check_health()
+    for entry in pool.status():
+        state = "up" if entry["healthy"] else f"down ({entry['last_error']})"
+        print(f"{entry['url']}: {state}; models: {', '.join(entry['models']) or 'unknown'}")
@@ -0,0 +1,89 @@
+"""
+Cached single-page previews for citations.
+
+render_page() rasterizes one PDF page to a small PNG with pypdfium2 and keeps
+it in an on-disk cache keyed by document version (content hash, or the file's
+size/mtime when no hash is known), page number and width. Each page is
+rendered once per version; cache hits refresh the file's mtime and the cache is
+trimmed least-recently-used first once it grows past PAGE_PREVIEW_CACHE_MB.
+"""
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Optional
+
+PAGE_PREVIEW_CACHE = Path(os.getenv("PAGE_PREVIEW_CACHE", str(Path(__file__).resolve().parent / ".page_cache")))
+PAGE_PREVIEW_CACHE_MB = int(os.getenv("PAGE_PREVIEW_CACHE_MB", "200"))
+DEFAULT_WIDTH = 480  # pixels; a text page at this width is a few tens of KB as a grayscale PNG
+
+
+def preview_available() -> bool:
+    try:
+        import pypdfium2  # noqa: F401
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _version_key(pdf_path: str, content_hash: Optional[str]) -> str:
+    if content_hash:
+        return content_hash[:16]
+    stat = os.stat(pdf_path)
+    return hashlib.sha256(f"{pdf_path}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:16]
+
+
+def _evict(cache_dir: Path, max_bytes: int) -> None:
+    entries = []
+    total = 0
+    for entry in os.scandir(cache_dir):
+        if entry.is_file() and entry.name.endswith(".png"):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+    if total <= max_bytes:
+        return
+    for _, size, path in sorted(entries):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue  # removed by a concurrent eviction
+        total -= size
+        if total <= max_bytes:
+            break
+
+
+def render_page(
+    pdf_path: str,
+    page_number: int,
+    content_hash: Optional[str] = None,
+    width: int = DEFAULT_WIDTH,
+    cache_dir: Path = PAGE_PREVIEW_CACHE,
+) -> Path:
+    """Return the path of a PNG preview of 1-based page_number, rendering it on a cache miss."""
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    target = cache_dir / f"{_version_key(pdf_path, content_hash)}_p{page_number}_w{width}.png"
+    if target.exists():
+        os.utime(target)  # mark as recently used for LRU eviction
+        return target
+
+    import pypdfium2 as pdfium
+
+    pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        page = pdf[page_number - 1]
+        try:
+            page_width, _ = page.get_size()
+            bitmap = page.render(scale=width / page_width, grayscale=True)
+            image = bitmap.to_pil()
+        finally:
+            page.close()
+    finally:
+        pdf.close()
+    # Write to a temporary name first so concurrent readers never see a partial file
+    temporary = target.with_suffix(f".{os.getpid()}.tmp")
+    image.save(temporary, format="PNG", optimize=True)
+    os.replace(temporary, target)
+    _evict(cache_dir, PAGE_PREVIEW_CACHE_MB * 1024 * 1024)
+    return target
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Opt-in LIST partitioning of chunks by framework.
+
+The framework is the top-level folder under it-management-and-audit-source-main
+(COBIT, ISO, ITIL, NIST, TOGAF), copied from documents onto each chunk. After
+`migrate`, chunks is a partitioned table with one partition per framework
+plus chunks_default for everything else. Indexes created on chunks, including
+the ANN index from RagStore.ensure_vector_index, are built per partition, so
+each framework has its own small vector index and statistics. A search
+filtered by framework is pruned to that partition (RagStore adds the
+partition-key predicate once it sees the table is partitioned). A whole
+collection can be dropped or reloaded with a TRUNCATE instead of deleting
+its rows one by one.
+
+    python partitioning.py migrate            # convert chunks (locks it while copying)
+    python partitioning.py status             # partitions, rows and sizes
+    python partitioning.py add FRAMEWORK      # move FRAMEWORK out of chunks_default
+    python partitioning.py drop FRAMEWORK     # remove the collection
+    python partitioning.py reload FRAMEWORK   # remove it and queue its PDFs for re-ingestion
+
+Postgres cannot keep chunk_embeddings' foreign key into a partitioned table
+whose key excludes the partition column, so `migrate` replaces the cascade
+with a delete trigger. Changing a chunk's framework moves it to another
+partition as a DELETE plus INSERT, which fires that trigger too; it keeps the
+embeddings of chunks whose id is still in the table.
+"""
+
+import argparse
+import re
+import time
+from typing import Dict, List, Optional
+
+FRAMEWORKS = ["COBIT", "ISO", "ITIL", "NIST", "TOGAF"]
+DEFAULT_PARTITION = "chunks_default"
+
+_DELETE_FUNCTION = """
+CREATE OR REPLACE FUNCTION chunks_delete_embeddings() RETURNS trigger AS $$
+BEGIN
+    -- A row moved to another partition is still there under the same id
+    DELETE FROM chunk_embeddings WHERE chunk_id = OLD.id AND NOT EXISTS (SELECT 1 FROM chunks WHERE id = OLD.id);
+    RETURN OLD;
+END
+$$ LANGUAGE plpgsql;
+"""
+_DELETE_TRIGGER = """
+DROP TRIGGER IF EXISTS chunks_delete_embeddings ON chunks;
+CREATE TRIGGER chunks_delete_embeddings AFTER DELETE ON chunks
+    FOR EACH ROW EXECUTE FUNCTION chunks_delete_embeddings();
+"""
+
+
+def partition_name(framework: str) -> str:
+    return "chunks_" + re.sub(r"\W+", "_", framework.lower()).strip("_")
+
+
+def _literal(value: str) -> str:
+    # Partition bounds are DDL and cannot be bound parameters
+    return "'" + value.replace("'", "''") + "'"
+
+
+def ensure_delete_function(conn) -> None:
+    """(Re)define the trigger's function; RagStore.ensure_schema calls this on partitioned stores (no table lock)."""
+    conn.exec_driver_sql(_DELETE_FUNCTION)
+
+
+def partitions(store) -> List[Dict]:
+    """Partitions of chunks with their bounds, estimated rows and total size (indexes included)."""
+    from rag_store import sql_text
+
+    with store.engine.connect() as conn:
+        rows = conn.execute(
+            sql_text(
+                "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint, pg_total_relation_size(c.oid)"
+                " FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid"
+                " WHERE i.inhparent = to_regclass('chunks') ORDER BY c.relname"
+            )
+        ).all()
+    return [{"partition": name, "bound": bound, "rows": max(0, rows), "bytes": size} for name, bound, rows, size in rows]
+
+
+def migrate(store, frameworks: Optional[List[str]] = None, progress=print) -> Dict[str, int]:
+    """Convert chunks into a framework-partitioned table and rebuild its indexes."""
+    from rag_store import sql_text
+
+    store.ensure_schema()
+    if store.partitioned:
+        raise RuntimeError("chunks is already partitioned")
+    frameworks = sorted(set(frameworks or FRAMEWORKS) | set(store.frameworks()))
+    dim = store.embedding_dim()
+    started = time.perf_counter()
+    with store.engine.begin() as conn:
+        conn.execute(sql_text("LOCK TABLE chunks IN ACCESS EXCLUSIVE MODE"))
+        conn.execute(
+            sql_text(
+                "UPDATE chunks c SET framework = d.framework FROM documents d"
+                " WHERE d.id = c.document_id AND c.framework IS DISTINCT FROM d.framework"
+            )
+        )
+        conn.execute(sql_text("ALTER TABLE chunk_embeddings DROP CONSTRAINT IF EXISTS chunk_embeddings_chunk_id_fkey"))
+        conn.execute(sql_text("ALTER TABLE chunks RENAME TO chunks_unpartitioned"))
+        # No primary key: on a partitioned table it would have to include framework; ids stay unique by sequence
+        conn.execute(sql_text("CREATE TABLE chunks (LIKE chunks_unpartitioned INCLUDING DEFAULTS) PARTITION BY LIST (framework)"))
+        conn.execute(
+            sql_text("ALTER TABLE chunks ADD FOREIGN KEY (document_id) REFERENCES documents (id) ON DELETE CASCADE")
+        )
+        for framework in frameworks:
+            conn.execute(
+                sql_text(f"CREATE TABLE {partition_name(framework)} PARTITION OF chunks FOR VALUES IN ({_literal(framework)})")
+            )
+        conn.execute(sql_text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF chunks DEFAULT"))
+        moved = conn.execute(sql_text("INSERT INTO chunks SELECT * FROM chunks_unpartitioned")).rowcount
+        conn.execute(sql_text("ALTER SEQUENCE chunks_id_seq OWNED BY chunks.id"))
+        conn.execute(sql_text("DROP TABLE chunks_unpartitioned"))
+        conn.execute(sql_text("CREATE INDEX ix_chunks_id ON chunks (id)"))
+        conn.execute(sql_text("CREATE INDEX ix_chunks_document_id ON chunks (document_id, chunk_index)"))
+        ensure_delete_function(conn)
+        conn.exec_driver_sql(_DELETE_TRIGGER)
+        conn.execute(sql_text("DELETE FROM index_builds WHERE to_regclass(index_name) IS NULL"))
+    store._partitioned = None
+    if progress:
+        progress(f"Moved {moved} chunks into {len(frameworks) + 1} partitions in {time.perf_counter() - started:.1f}s")
+    if dim:
+        started = time.perf_counter()
+        store.ensure_vector_index("hnsw", dim)
+        if progress:
+            progress(f"Built per-partition HNSW indexes in {time.perf_counter() - started:.1f}s")
+    with store.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(sql_text("ANALYZE chunks"))
+    return {"chunks": moved, "partitions": len(frameworks) + 1}
+
+
+def add_partition(store, framework: str) -> int:
+    """Give framework its own partition, moving its rows out of chunks_default; returns rows moved."""
+    from rag_store import sql_text
+
+    name = partition_name(framework)
+    with store.engine.begin() as conn:
+        conn.execute(sql_text(f"ALTER TABLE chunks DETACH PARTITION {DEFAULT_PARTITION}"))
+        # Moving rows must not fire the embeddings cleanup on the old copies
+        conn.execute(sql_text(f"ALTER TABLE {DEFAULT_PARTITION} DISABLE TRIGGER USER"))
+        conn.execute(sql_text(f"CREATE TABLE {name} PARTITION OF chunks FOR VALUES IN ({_literal(framework)})"))
+        moved = conn.execute(
+            sql_text(f"INSERT INTO chunks SELECT * FROM {DEFAULT_PARTITION} WHERE framework = :framework"),
+            {"framework": framework},
+        ).rowcount
+        conn.execute(sql_text(f"DELETE FROM {DEFAULT_PARTITION} WHERE framework = :framework"), {"framework": framework})
+        conn.execute(sql_text(f"ALTER TABLE {DEFAULT_PARTITION} ENABLE TRIGGER USER"))
+        conn.execute(sql_text(f"ALTER TABLE chunks ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+    return moved
+
+
+def drop_collection(store, framework: Optional[str]) -> int:
+    """Delete every document of framework with its chunks and embeddings; returns documents deleted."""
+    from rag_store import sql_text
+
+    own_partition = (
+        framework is not None
+        and store.partitioned
+        and any(p["partition"] == partition_name(framework) for p in partitions(store))
+    )
+    with store.engine.begin() as conn:
+        if own_partition:
+            name = partition_name(framework)
+            conn.execute(sql_text(f"DELETE FROM chunk_embeddings WHERE chunk_id IN (SELECT id FROM {name})"))
+            conn.execute(sql_text(f"TRUNCATE {name}"))
+        # With the partition emptied the cascade into chunks finds nothing to delete
+        return conn.execute(
+            sql_text("DELETE FROM documents WHERE framework IS NOT DISTINCT FROM :framework"), {"framework": framework}
+        ).rowcount
+
+
+def reload_collection(store, framework: Optional[str]) -> List[int]:
+    """drop_collection(framework), then queue its PDFs for ingest_worker.py; returns the job ids."""
+    import os
+
+    from rag_store import Document
+
+    with store.SessionLocal() as session:
+        paths = [
+            row[0]
+            for row in session.query(Document.file_path).filter(Document.framework.is_not_distinct_from(framework))
+        ]
+    drop_collection(store, framework)
+    return store.enqueue_ingest([path for path in paths if os.path.exists(path)])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["migrate", "status", "add", "drop", "reload"])
+    parser.add_argument("framework", nargs="?", help="Framework for add, drop and reload.")
+    args = parser.parse_args()
+    if args.command in ("add", "drop", "reload") and not args.framework:
+        parser.error(f"{args.command} needs a FRAMEWORK")
+
+    from rag_store import RagStore
+
+    store = RagStore()
+    if args.command == "migrate":
+        print(migrate(store))
+    elif args.command == "status":
+        if not store.partitioned:
+            print("chunks is not partitioned; run `python partitioning.py migrate`")
+        for p in partitions(store):
+            print(f"{p['partition']:<24} {p['bound']:<28} {p['rows']:>10} rows {p['bytes'] / 2**20:>9.1f} MB")
+    elif args.command == "add":
+        print(f"Moved {add_partition(store, args.framework)} chunks into {partition_name(args.framework)}")
+    elif args.command == "drop":
+        print(f"Deleted {drop_collection(store, args.framework)} {args.framework} documents")
+    else:
+        print(f"Queued {len(reload_collection(store, args.framework))} {args.framework} PDFs for re-ingestion")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+PDF text extraction backends.
+
+Every backend yields text page by page, so callers can stream large standards
+without holding all pages at once:
+
+    pypdfium2    - PDFium via pypdfium2 (C++, fastest when installed)
+    pypdf2-mmap  - PyPDF2 reading from a read-only mmap of the file
+    pypdf2       - PyPDF2 reading from a regular file handle (always available)
+    pdfminer     - pdfminer.six layout analysis (slowest, best reading order)
+
+get_extractor() honours PDF_EXTRACTOR, then the fastest backend measured by
+bench_extract.py (saved to BENCH_RESULTS_PATH) whose text matched the pypdf2
+reference to at least MIN_TEXT_EQUIVALENCE, then the static preference order
+above. A backend that extracts different words would change every chunk and
+its body hash, so speed alone never selects it.
+"""
+
+import json
+import mmap
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+BENCH_RESULTS_PATH = Path(__file__).resolve().parent / ".pdf_extract_bench.json"
+PREFERENCE_ORDER = ["pypdfium2", "pypdf2-mmap", "pypdf2", "pdfminer"]
+MIN_TEXT_EQUIVALENCE = float(os.getenv("PDF_MIN_TEXT_EQUIVALENCE", "0.98"))
+
+
+def _clean(text: Optional[str]) -> str:
+    return (text or "").replace("\x00", "")
+
+
+class PdfExtractor:
+    name = "base"
+
+    def available(self) -> bool:
+        raise NotImplementedError
+
+    def iter_pages(self, pdf_path: str) -> Iterator[str]:
+        raise NotImplementedError
+
+    def extract_pages(self, pdf_path: str) -> List[str]:
+        return list(self.iter_pages(pdf_path))
+
+    def extract_text(self, pdf_path: str) -> str:
+        return "\n".join(self.iter_pages(pdf_path))
+
+
+class PyPDF2Extractor(PdfExtractor):
+    name = "pypdf2"
+
+    def available(self) -> bool:
+        try:
+            import PyPDF2  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    @contextmanager
+    def _open(self, pdf_path: str):
+        with open(pdf_path, "rb") as handle:
+            yield handle
+
+    def iter_pages(self, pdf_path: str) -> Iterator[str]:
+        from PyPDF2 import PdfReader
+
+        with self._open(pdf_path) as stream:
+            reader = PdfReader(stream)
+            for page in reader.pages:
+                yield _clean(page.extract_text())
+
+
+class MmapPyPDF2Extractor(PyPDF2Extractor):
+    """PyPDF2 over a read-only mmap: pages are faulted in by the OS as PyPDF2 seeks to them."""
+
+    name = "pypdf2-mmap"
+
+    @contextmanager
+    def _open(self, pdf_path: str):
+        with open(pdf_path, "rb") as handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+
+class PdfiumExtractor(PdfExtractor):
+    name = "pypdfium2"
+
+    def available(self) -> bool:
+        try:
+            import pypdfium2  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def iter_pages(self, pdf_path: str) -> Iterator[str]:
+        import pypdfium2 as pdfium
+
+        pdf = pdfium.PdfDocument(pdf_path)
+        try:
+            for index in range(len(pdf)):
+                page = pdf[index]
+                textpage = page.get_textpage()
+                try:
+                    yield _clean(textpage.get_text_range())
+                finally:
+                    textpage.close()
+                    page.close()
+        finally:
+            pdf.close()
+
+
+class PdfminerExtractor(PdfExtractor):
+    name = "pdfminer"
+
+    def available(self) -> bool:
+        try:
+            import pdfminer  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def iter_pages(self, pdf_path: str) -> Iterator[str]:
+        from pdfminer.high_level import extract_pages
+        from pdfminer.layout import LTTextContainer
+
+        for layout in extract_pages(pdf_path):
+            yield _clean("".join(element.get_text() for element in layout if isinstance(element, LTTextContainer)))
+
+
+BACKENDS: Dict[str, PdfExtractor] = {
+    extractor.name: extractor
+    for extractor in (PdfiumExtractor(), MmapPyPDF2Extractor(), PyPDF2Extractor(), PdfminerExtractor())
+}
+
+
+def available_backends() -> List[str]:
+    return [name for name in PREFERENCE_ORDER if BACKENDS[name].available()]
+
+
+def _fastest_benchmarked(candidates: List[str]) -> Optional[str]:
+    try:
+        results = json.loads(BENCH_RESULTS_PATH.read_text())
+    except (OSError, ValueError):
+        return None
+    measured = [
+        r
+        for r in results.get("backends", [])
+        if r.get("name") in candidates
+        and r.get("pages_per_sec")
+        # Unmeasured equivalence (no reference run) is not good enough either
+        and (r.get("text_equivalence") or 0.0) >= MIN_TEXT_EQUIVALENCE
+    ]
+    if not measured:
+        return None
+    return max(measured, key=lambda r: r["pages_per_sec"])["name"]
+
+
+_SELECTED: Optional[PdfExtractor] = None
+
+
+def get_extractor(name: Optional[str] = None) -> PdfExtractor:
+    """Backend by name, or the automatic choice when name is None or "auto"."""
+    global _SELECTED
+    name = name or os.getenv("PDF_EXTRACTOR", "auto")
+    if name != "auto":
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown PDF extractor {name!r}; choose from {', '.join(BACKENDS)}")
+        return BACKENDS[name]
+    if _SELECTED is None:
+        candidates = available_backends()
+        if not candidates:
+            raise RuntimeError("No PDF extraction backend available; install PyPDF2 or pypdfium2")
+        _SELECTED = BACKENDS[_fastest_benchmarked(candidates) or candidates[0]]
+    return _SELECTED
+
+
+def iter_pages(pdf_path: str, backend: Optional[str] = None) -> Iterator[str]:
+    return get_extractor(backend).iter_pages(pdf_path)
+
+
+def extract_pages(pdf_path: str, backend: Optional[str] = None) -> List[str]:
+    return get_extractor(backend).extract_pages(pdf_path)
+
+
+def extract_text(pdf_path: str, backend: Optional[str] = None) -> str:
+    return get_extractor(backend).extract_text(pdf_path)
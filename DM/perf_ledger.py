@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Ledger of Ollama generate metrics.
+
+Every /api/generate reply carries prompt_eval_count/_duration,
+eval_count/_duration and load_duration. record() stores them in a local SQLite
+file, tagged with the model, the code path that made the call (direct, rag,
+map, reduce, ...) and the prompt size, so throughput can be compared across
+models, prompts and time. Recording never raises; a broken ledger must not
+break answering.
+
+    python perf_ledger.py            # per model/path summary and regression alerts
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+LEDGER_PATH = Path(os.getenv("DM_PERF_LEDGER", str(Path(__file__).resolve().parent / ".perf_ledger.sqlite")))
+RELOAD_THRESHOLD_MS = 500  # load_duration above this means the model was (re)loaded
+REGRESSION_WINDOW = 20  # recent calls compared against the ones before them
+REGRESSION_THRESHOLD = 0.2  # alert when tokens/s drops by more than this fraction
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS generate_calls (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    model TEXT NOT NULL,
+    path TEXT NOT NULL,
+    prompt_chars INTEGER NOT NULL,
+    prompt_eval_count INTEGER,
+    prompt_eval_ms REAL,
+    eval_count INTEGER,
+    eval_ms REAL,
+    load_ms REAL,
+    total_ms REAL
+);
+CREATE INDEX IF NOT EXISTS ix_generate_calls_path_model_ts ON generate_calls (path, model, ts);
+"""
+
+_local = threading.local()
+
+
+def _connect(path: Path = LEDGER_PATH) -> sqlite3.Connection:
+    connection = getattr(_local, "connection", None)
+    if connection is None or getattr(_local, "path", None) != path:
+        connection = sqlite3.connect(str(path), timeout=5)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(_SCHEMA)
+        _local.connection, _local.path = connection, path
+    return connection
+
+
+def _ms(nanoseconds) -> Optional[float]:
+    return nanoseconds / 1e6 if nanoseconds is not None else None
+
+
+def record(data: Dict, model: str, path: str, prompt_chars: int, ledger: Path = LEDGER_PATH) -> None:
+    """Store the metrics of one generate reply (the final chunk when streaming)."""
+    if not data or data.get("eval_count") is None:
+        return
+    try:
+        connection = _connect(ledger)
+        with connection:
+            connection.execute(
+                "INSERT INTO generate_calls (ts, model, path, prompt_chars, prompt_eval_count, prompt_eval_ms,"
+                " eval_count, eval_ms, load_ms, total_ms) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    time.time(),
+                    data.get("model") or model,
+                    path,
+                    prompt_chars,
+                    data.get("prompt_eval_count"),
+                    _ms(data.get("prompt_eval_duration")),
+                    data.get("eval_count"),
+                    _ms(data.get("eval_duration")),
+                    _ms(data.get("load_duration")),
+                    _ms(data.get("total_duration")),
+                ),
+            )
+    except Exception as e:
+        print(f"Performance ledger unavailable: {e}")
+
+
+@dataclass
+class PathSummary:
+    model: str
+    path: str
+    calls: int
+    tokens_per_second: Optional[float]  # generation
+    prompt_tokens_per_second: Optional[float]
+    reload_rate: float  # share of calls that loaded the model
+    prompt_eval_share: Optional[float]  # prompt evaluation's share of model time
+    median_prompt_chars: int
+
+
+def summarize(since: Optional[float] = None, ledger: Path = LEDGER_PATH) -> List[PathSummary]:
+    rows = _connect(ledger).execute(
+        "SELECT model, path, COUNT(*), SUM(eval_count), SUM(eval_ms), SUM(prompt_eval_count), SUM(prompt_eval_ms),"
+        " SUM(CASE WHEN load_ms > ? THEN 1 ELSE 0 END) FROM generate_calls WHERE ts >= ? GROUP BY model, path"
+        " ORDER BY model, path",
+        (RELOAD_THRESHOLD_MS, since or 0),
+    ).fetchall()
+    summaries = []
+    for model, path, calls, eval_count, eval_ms, prompt_count, prompt_ms, reloads in rows:
+        sizes = [
+            row[0]
+            for row in _connect(ledger).execute(
+                "SELECT prompt_chars FROM generate_calls WHERE model = ? AND path = ? AND ts >= ? ORDER BY prompt_chars",
+                (model, path, since or 0),
+            )
+        ]
+        model_ms = (eval_ms or 0) + (prompt_ms or 0)
+        summaries.append(
+            PathSummary(
+                model=model,
+                path=path,
+                calls=calls,
+                tokens_per_second=eval_count / eval_ms * 1000 if eval_ms else None,
+                prompt_tokens_per_second=prompt_count / prompt_ms * 1000 if prompt_ms else None,
+                reload_rate=reloads / calls,
+                prompt_eval_share=(prompt_ms or 0) / model_ms if model_ms else None,
+                median_prompt_chars=sizes[len(sizes) // 2] if sizes else 0,
+            )
+        )
+    return summaries
+
+
+def recent_calls(limit: int = 500, ledger: Path = LEDGER_PATH) -> List[Dict]:
+    cursor = _connect(ledger).execute("SELECT * FROM generate_calls ORDER BY id DESC LIMIT ?", (limit,))
+    columns = [c[0] for c in cursor.description]
+    return [dict(zip(columns, row)) for row in reversed(cursor.fetchall())]
+
+
+def _throughput(calls: List[Dict]) -> Optional[float]:
+    eval_ms = sum(c["eval_ms"] or 0 for c in calls)
+    return sum(c["eval_count"] or 0 for c in calls) / eval_ms * 1000 if eval_ms else None
+
+
+def regressions(
+    window: int = REGRESSION_WINDOW, threshold: float = REGRESSION_THRESHOLD, ledger: Path = LEDGER_PATH
+) -> List[str]:
+    """Alerts for code paths whose recent generation throughput fell below what came before.
+
+    For each path, the last window calls are compared with the window calls
+    before them. The message names a model switch or a prompt-size shift
+    between the two, the usual causes.
+    """
+    connection = _connect(ledger)
+    alerts = []
+    for (path,) in connection.execute("SELECT DISTINCT path FROM generate_calls ORDER BY path").fetchall():
+        cursor = connection.execute(
+            "SELECT model, prompt_chars, eval_count, eval_ms FROM generate_calls WHERE path = ? ORDER BY id DESC LIMIT ?",
+            (path, 2 * window),
+        )
+        calls = [dict(zip(("model", "prompt_chars", "eval_count", "eval_ms"), row)) for row in cursor.fetchall()]
+        if len(calls) < 2 * window:
+            continue
+        recent, before = calls[:window], calls[window:]
+        now, then = _throughput(recent), _throughput(before)
+        if not now or not then or now >= then * (1 - threshold):
+            continue
+        causes = []
+        recent_models = sorted({c["model"] for c in recent})
+        before_models = sorted({c["model"] for c in before})
+        if recent_models != before_models:
+            causes.append(f"model {', '.join(before_models)} -> {', '.join(recent_models)}")
+        size_now = sorted(c["prompt_chars"] for c in recent)[window // 2]
+        size_then = sorted(c["prompt_chars"] for c in before)[window // 2]
+        if size_then and abs(size_now - size_then) / size_then > threshold:
+            causes.append(f"median prompt {size_then} -> {size_now} chars")
+        cause = f" ({'; '.join(causes)})" if causes else ""
+        alerts.append(f"{path}: {then:.1f} -> {now:.1f} tokens/s over the last {window} calls{cause}")
+    return alerts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, default=None, help="Only summarize the last N hours.")
+    args = parser.parse_args()
+
+    since = time.time() - args.hours * 3600 if args.hours else None
+    print(f"{'model':<24} {'path':<16} {'calls':>6} {'tok/s':>7} {'prompt tok/s':>13} {'reloads':>8} {'prompt share':>13}")
+    for s in summarize(since):
+        tokens = f"{s.tokens_per_second:.1f}" if s.tokens_per_second else "-"
+        prompt = f"{s.prompt_tokens_per_second:.0f}" if s.prompt_tokens_per_second else "-"
+        share = f"{s.prompt_eval_share:.0%}" if s.prompt_eval_share is not None else "-"
+        print(f"{s.model:<24} {s.path:<16} {s.calls:>6} {tokens:>7} {prompt:>13} {s.reload_rate:>8.0%} {share:>13}")
+    for alert in regressions():
+        print(f"ALERT {alert}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,27 @@
+from __future__ import annotations
+
 import os
 import hashlib
-from dataclasses import dataclass
-from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+import bisect
+import itertools
+import re
+import socket
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import timedelta
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
 
 # Lazy import strategy to keep the main app runnable even if DB deps are missing
 try:
-    from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text, create_engine, func
+    from sqlalchemy import (
+        JSON, BigInteger, Boolean, Column, DateTime, ForeignKey, Index, Integer, LargeBinary, String, Text, cast, column,
+        create_engine, func, literal_column, select, true, values,
+    )
+    from sqlalchemy import text as sql_text
     from sqlalchemy.orm import Session, declarative_base, relationship, sessionmaker
     from pgvector.sqlalchemy import Vector
     SQLALCHEMY_AVAILABLE = True
@@ -24,19 +40,130 @@ if SQLALCHEMY_AVAILABLE:
         title = Column(String(512), nullable=False)
         file_path = Column(String(2048), unique=True, nullable=False)
         content_hash = Column(String(64), nullable=False)
+        framework = Column(String(64), index=True)  # top-level folder of the docs tree, e.g. "COBIT"
         created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
         chunks = relationship("Chunk", back_populates="document", cascade="all, delete-orphan")
+        tags = relationship("DocumentTag", back_populates="document", cascade="all, delete-orphan")
 
 
     class Chunk(Base):  # type: ignore[misc]
         __tablename__ = "chunks"
         id = Column(Integer, primary_key=True)
-        document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False)
+        document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False, index=True)
         chunk_index = Column(Integer, nullable=False)
-        text = Column(Text, nullable=False)
+        text = Column(Text)  # NULL: the slice [char_start, char_end) of the document's DocumentText
         token_count = Column(Integer, nullable=False, default=0)
         embedding = Column(Vector(), nullable=False)  # dim inferred from inserted vectors
+        framework = Column(String(64))  # copy of Document.framework; the partition key (see partitioning.py)
+        body_hash = Column(String(64), index=True)  # content address of the text, see body_hash()
+        # Position in the normalized document text and the 1-based pages it spans
+        char_start = Column(Integer)
+        char_end = Column(Integer)
+        page_start = Column(Integer)
+        page_end = Column(Integer)
         document = relationship("Document", back_populates="chunks")
+        extra_embeddings = relationship("ChunkEmbedding", cascade="all, delete-orphan", passive_deletes=True)
+
+
+    class ChunkEmbedding(Base):  # type: ignore[misc]
+        """Embedding of a chunk by an additional model; chunks.embedding holds OLLAMA_EMBED_MODEL's."""
+        __tablename__ = "chunk_embeddings"
+        chunk_id = Column(Integer, ForeignKey("chunks.id", ondelete="CASCADE"), primary_key=True)
+        model = Column(String(128), primary_key=True)
+        dim = Column(Integer, nullable=False)
+        embedding = Column(Vector(), nullable=False)
+        __table_args__ = (Index("ix_chunk_embeddings_model_chunk", "model", "chunk_id"),)
+
+
+    class DocumentText(Base):  # type: ignore[misc]
+        """A document's normalized text, stored once and zlib-compressed; offset-only chunks slice it."""
+        __tablename__ = "document_texts"
+        document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), primary_key=True)
+        content_hash = Column(String(64), nullable=False)  # of the source file, as Document.content_hash
+        chars = Column(Integer, nullable=False)
+        page_offsets = Column(JSON, nullable=False)  # start of each page in the text (see join_pages)
+        text_zlib = Column(LargeBinary, nullable=False)
+
+
+    class DocumentCentroid(Base):  # type: ignore[misc]
+        """Mean chunk embedding of a whole document (section 0) or of chunks [chunk_start, chunk_end) (section >= 1)."""
+        __tablename__ = "document_centroids"
+        document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), primary_key=True)
+        section = Column(Integer, primary_key=True)
+        chunk_start = Column(Integer, nullable=False)
+        chunk_end = Column(Integer, nullable=False)
+        embedding = Column(Vector(), nullable=False)
+
+
+    class DocumentTag(Base):  # type: ignore[misc]
+        """Workflow metadata for a document: kind is "phase", "focus" or "standards"."""
+        __tablename__ = "document_tags"
+        id = Column(Integer, primary_key=True)
+        document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False, index=True)
+        kind = Column(String(32), nullable=False)
+        value = Column(String(512), nullable=False)
+        document = relationship("Document", back_populates="tags")
+        __table_args__ = (Index("ix_document_tags_kind_value", "kind", "value"),)
+
+
+    class IngestJob(Base):  # type: ignore[misc]
+        """Background ingestion request, claimed by ingest_worker.py with FOR UPDATE SKIP LOCKED."""
+        __tablename__ = "ingest_jobs"
+        id = Column(Integer, primary_key=True)
+        file_path = Column(String(2048), nullable=False, index=True)
+        status = Column(String(16), nullable=False, default="queued")  # queued, running, done, failed
+        chunks_done = Column(Integer, nullable=False, default=0)
+        chunks_total = Column(Integer, nullable=False, default=0)
+        worker = Column(String(256))
+        error = Column(Text)
+        enqueued_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+        started_at = Column(DateTime(timezone=True))
+        heartbeat_at = Column(DateTime(timezone=True))
+        finished_at = Column(DateTime(timezone=True))
+        force = Column(Boolean, nullable=False, default=False, server_default="false")  # re-ingest even if unchanged
+        __table_args__ = (Index("ix_ingest_jobs_status_id", "status", "id"),)
+
+
+    class IndexBuild(Base):  # type: ignore[misc]
+        """Table size and write counters when a vector index was last built; see maintenance.py."""
+        __tablename__ = "index_builds"
+        index_name = Column(String(128), primary_key=True)
+        table_name = Column(String(128), nullable=False)
+        rows = Column(BigInteger, nullable=False)
+        bytes = Column(BigInteger, nullable=False)
+        writes = Column(BigInteger, nullable=False)  # n_tup_ins + n_tup_upd + n_tup_del of the table
+        built_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+# create_all() only creates missing tables; columns and indexes added to
+# existing tables are applied here, idempotently.
+_SCHEMA_UPGRADES = [
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS framework VARCHAR(64)",
+    "CREATE INDEX IF NOT EXISTS ix_documents_framework ON documents (framework)",
+    "CREATE INDEX IF NOT EXISTS ix_chunks_document_id ON chunks (document_id)",
+    "ALTER TABLE chunks ADD COLUMN IF NOT EXISTS char_start INTEGER",
+    "ALTER TABLE chunks ADD COLUMN IF NOT EXISTS char_end INTEGER",
+    "ALTER TABLE chunks ADD COLUMN IF NOT EXISTS page_start INTEGER",
+    "ALTER TABLE chunks ADD COLUMN IF NOT EXISTS page_end INTEGER",
+    "ALTER TABLE chunks ADD COLUMN IF NOT EXISTS framework VARCHAR(64)",
+    "ALTER TABLE chunks ALTER COLUMN text DROP NOT NULL",
+    "ALTER TABLE chunks ADD COLUMN IF NOT EXISTS body_hash VARCHAR(64)",
+    "CREATE INDEX IF NOT EXISTS ix_chunks_body_hash ON chunks (body_hash)",
+    "ALTER TABLE ingest_jobs ADD COLUMN IF NOT EXISTS force BOOLEAN NOT NULL DEFAULT FALSE",
+    # Already compressed: keep TOAST from trying again
+    "ALTER TABLE document_texts ALTER COLUMN text_zlib SET STORAGE EXTERNAL",
+]
+
+DOCS_ROOT_NAME = "it-management-and-audit-source-main"
+SECTION_CHUNKS = 16  # consecutive chunks averaged into one section centroid
+TEXT_CACHE_DOCUMENTS = 64  # decompressed document texts kept per RagStore
+ROUTE_DOCUMENTS = 8  # documents the centroid router passes to the chunk search
+DEDUP_FETCH_FACTOR = 2  # a deduplicating search first fetches k x this many chunks, doubling until k bodies remain
+# "fixed" windows or "content"-defined cuts. Shared passages only yield identical (deduplicated)
+# chunks with "content"; existing stores need ingest_worker.py --rechunk SIZE:OVERLAP:content first
+CHUNK_BOUNDARIES = os.getenv("CHUNK_BOUNDARIES", "fixed")
+CDC_WINDOW = 16  # characters before a candidate cut that decide whether it is one
+AVG_WORD_CHARS = 6
 
 
 @dataclass
@@ -45,6 +172,99 @@ class SearchResult:
     document_title: str
     file_path: str
     distance: float
+    document_id: Optional[int] = None
+    chunk_index: Optional[int] = None
+    embedding: Optional[List[float]] = None  # only populated when include_embeddings=True
+    page_start: Optional[int] = None
+    page_end: Optional[int] = None
+    content_hash: Optional[str] = None
+    framework: Optional[str] = None
+    char_start: Optional[int] = None
+    char_end: Optional[int] = None
+    body_hash: Optional[str] = None
+    also_in: List[str] = field(default_factory=list)  # titles of other documents with the same passage
+
+
+@dataclass
+class JobStatus:
+    id: int
+    file_path: str
+    status: str
+    chunks_done: int
+    chunks_total: int
+    worker: Optional[str]
+    error: Optional[str]
+    elapsed_seconds: Optional[float]
+    force: bool = False
+
+    @property
+    def progress(self) -> float:
+        return self.chunks_done / self.chunks_total if self.chunks_total else 0.0
+
+    @property
+    def chunks_per_second(self) -> Optional[float]:
+        if not self.elapsed_seconds:
+            return None
+        return self.chunks_done / self.elapsed_seconds
+
+
+@dataclass
+class CascadeStats:
+    """Per-stage timings of RagStore.search_cascade."""
+    fast_stage: str
+    strong_stage: str
+    candidates: int
+    fast_ms: float
+    strong_ms: float
+    recall: Optional[float] = None  # overlap of the final top-k with a strong-model-only search
+    reference_ms: Optional[float] = None  # latency of that single-stage search
+
+    @property
+    def total_ms(self) -> float:
+        return self.fast_ms + self.strong_ms
+
+
+@dataclass
+class RouterStats:
+    """Timings of RagStore.search_routed and, when measured, how it compares with the flat search."""
+    level: str
+    document_paths: List[str]  # the routed documents
+    route_ms: float
+    search_ms: float
+    flat_ms: Optional[float] = None
+    recall: Optional[float] = None  # overlap of the routed top-k with the flat top-k
+    missed: Optional[bool] = None  # the flat search's best chunk lies outside the routed documents
+    uncovered: List[int] = field(default_factory=list)  # ids of documents without centroids, searched as well
+
+    @property
+    def total_ms(self) -> float:
+        return self.route_ms + self.search_ms
+
+
+@dataclass
+class DedupStats:
+    """Chunks ingested and the distinct bodies among them that had to be embedded; the rest reused a
+    stored vector. For RagStore.dedup_stats, all chunks and all distinct bodies."""
+    chunks: int = 0
+    unique: int = 0
+
+    @property
+    def reused(self) -> int:
+        return self.chunks - self.unique
+
+    @property
+    def ratio(self) -> float:
+        """Share of chunks that needed no embedding of their own."""
+        return self.reused / self.chunks if self.chunks else 0.0
+
+
+@dataclass
+class ChunkSpan:
+    text: str
+    char_start: int
+    char_end: int
+    page_start: int
+    page_end: int
 
 
 def _require_sqlalchemy() -> None:
@@ -60,47 +280,311 @@ def compute_file_hash(file_path: str) -> str:
     return hasher.hexdigest()
 
 
-def simple_overlap_chunk(text: str, chunk_size: int = 800, overlap: int = 120) -> List[str]:
-    if not text:
-        return []
-    # Clean text: remove NUL bytes and other problematic characters
-    text = text.replace('\x00', '').replace('\x01', '').replace('\x02', '').replace('\x03', '').replace('\x04', '').replace('\x05', '').replace('\x06', '').replace('\x07', '').replace('\x08', '').replace('\x0b', '').replace('\x0c', '').replace('\x0e', '').replace('\x0f', '').replace('\x10', '').replace('\x11', '').replace('\x12', '').replace('\x13', '').replace('\x14', '').replace('\x15', '').replace('\x16', '').replace('\x17', '').replace('\x18', '').replace('\x19', '').replace('\x1a', '').replace('\x1b', '').replace('\x1c', '').replace('\x1d', '').replace('\x1e', '').replace('\x1f', '')
+def framework_for_path(file_path: str) -> Optional[str]:
+    """Top-level folder under the docs tree (COBIT, ISO, ITIL, NIST, TOGAF), if any."""
+    parts = Path(file_path).parts
+    if DOCS_ROOT_NAME in parts:
+        index = parts.index(DOCS_ROOT_NAME)
+        if index + 2 < len(parts):  # a folder, not a file directly under the root
+            return parts[index + 1]
+    return None
+
+
+_CONTROL_CHARS = {code: None for code in range(0x20) if chr(code) not in "\t\n\r"}
+
+
+def normalize_text(text: str) -> str:
+    # Clean text: remove NUL bytes and other problematic control characters
+    text = text.translate(_CONTROL_CHARS)
     # Also remove other common problematic characters
     text = text.replace('\r', '\n').replace('\t', ' ')
     # Normalize whitespace
-    text = ' '.join(text.split())
-    chunks: List[str] = []
+    return ' '.join(text.split())
+
+
+def _window_bounds(length: int, chunk_size: int, overlap: int) -> Iterable[Tuple[int, int]]:
     start = 0
-    length = len(text)
     while start < length:
         end = min(start + chunk_size, length)
-        chunk = text[start:end]
-        chunks.append(chunk)
+        yield start, end
         if end == length:
             break
         start = end - overlap
         if start < 0:
             start = 0
-    return chunks
+
+
+_SPACE = re.compile(" ")
+
+
+def _content_bounds(text: str, chunk_size: int, overlap: int) -> Iterable[Tuple[int, int]]:
+    """Windows cut at spaces chosen by a hash of the CDC_WINDOW characters before them.
+
+    A cut depends only on nearby text, so a passage shared by two documents
+    is cut at the same places in both once the first cut inside it is
+    reached, whatever precedes it; fixed windows shift with every character
+    added or removed upstream. Cuts are at least a quarter and at most all of
+    chunk_size - overlap apart, and each window reaches overlap characters
+    back past the previous cut.
+    """
+    max_gap = max(1, chunk_size - overlap)
+    min_gap = max_gap // 4
+    mask = (1 << (max(1, (max_gap - min_gap) // AVG_WORD_CHARS).bit_length() - 1)) - 1
+    cuts: List[int] = []
+    last = 0
+    for match in _SPACE.finditer(text):
+        position = match.start()
+        while position - last > max_gap:
+            last += max_gap
+            cuts.append(last)
+        if position - last >= min_gap and not zlib.crc32(text[max(0, position - CDC_WINDOW):position].encode("utf-8")) & mask:
+            cuts.append(position)
+            last = position
+    while len(text) - last > max_gap:
+        last += max_gap
+        cuts.append(last)
+    if last < len(text):
+        cuts.append(len(text))
+    start = 0
+    for cut in cuts:
+        yield max(0, start - overlap), cut
+        start = cut
+
+
+def body_hash(text: str) -> str:
+    """Content address of a chunk: sha256 of its whitespace-normalized, case-folded text."""
+    return hashlib.sha256(" ".join(text.split()).casefold().encode("utf-8")).hexdigest()
+
+
+def dedup_results(results: Sequence[SearchResult], k: Optional[int] = None) -> List[SearchResult]:
+    """The first (closest) result of each chunk body, up to k; the titles of other documents
+    holding the same body are added to its also_in. Results without a body_hash are kept."""
+    kept: List[SearchResult] = []
+    first: Dict[str, SearchResult] = {}
+    for result in results:
+        seen = first.get(result.body_hash) if result.body_hash else None
+        if seen is None:
+            if result.body_hash:
+                first[result.body_hash] = result
+            kept.append(result)
+        elif result.document_title != seen.document_title and result.document_title not in seen.also_in:
+            seen.also_in.append(result.document_title)
+    return kept[:k] if k is not None else kept
+
+
+def simple_overlap_chunk(text: str, chunk_size: int = 800, overlap: int = 120) -> List[str]:
+    if not text:
+        return []
+    text = normalize_text(text)
+    return [text[start:end] for start, end in _window_bounds(len(text), chunk_size, overlap)]
+
+
+def join_pages(pages: Sequence[str]) -> Tuple[str, List[int]]:
+    """Normalized document text and the offset at which each page starts in it."""
+    parts: List[str] = []
+    page_offsets: List[Optional[int]] = []
+    position = 0
+    for page in pages:
+        normalized = normalize_text(page)
+        if not normalized:
+            page_offsets.append(None)  # empty page, owns no characters
+            continue
+        if parts:
+            parts.append(" ")
+            position += 1
+        page_offsets.append(position)
+        parts.append(normalized)
+        position += len(normalized)
+    # Empty pages start where the next non-empty page starts, so bisect skips them
+    next_offset = position
+    for index in range(len(page_offsets) - 1, -1, -1):
+        if page_offsets[index] is None:
+            page_offsets[index] = next_offset
+        next_offset = page_offsets[index]
+    return "".join(parts), page_offsets
+
+
+def chunk_pages(
+    pages: Sequence[str], chunk_size: int = 800, overlap: int = 120, boundaries: str = "fixed"
+) -> List[ChunkSpan]:
+    """Like simple_overlap_chunk over the whole document, keeping character offsets and 1-based page ranges.
+
+    boundaries="content" cuts where the text says (see _content_bounds)
+    instead of every chunk_size - overlap characters, so passages repeated
+    across documents become identical chunks.
+    """
+    text, page_offsets = join_pages(pages)
+    return chunk_text(text, page_offsets, chunk_size, overlap, boundaries)
+
+
+def chunk_text(
+    text: str, page_offsets: Sequence[int], chunk_size: int = 800, overlap: int = 120, boundaries: str = "fixed"
+) -> List[ChunkSpan]:
+    """chunk_pages over an already joined document text (from join_pages or DocumentText)."""
+    if boundaries not in ("fixed", "content"):
+        raise ValueError(f"boundaries must be 'fixed' or 'content', not {boundaries!r}")
+    bounds = _window_bounds(len(text), chunk_size, overlap) if boundaries == "fixed" else _content_bounds(text, chunk_size, overlap)
+    spans: List[ChunkSpan] = []
+    for start, end in bounds:
+        spans.append(
+            ChunkSpan(
+                text=text[start:end],
+                char_start=start,
+                char_end=end,
+                page_start=bisect.bisect_right(page_offsets, start),
+                page_end=bisect.bisect_right(page_offsets, end - 1),
+            )
+        )
+    return spans
+
+
+def rebuild_text(spans: Iterable[Tuple[str, int, int, Optional[int]]]) -> Tuple[str, List[int]]:
+    """Document text and approximate page offsets from (text, char_start, char_end, page_start) of its
+    overlapping chunks, ordered by char_start; each page starts at its first chunk's offset."""
+    parts: List[str] = []
+    length = 0
+    page_offsets: List[int] = []
+    for text, start, end, page in spans:
+        if end > length:
+            parts.append(text[max(0, length - start):])
+            length = end
+        while page and len(page_offsets) < page:
+            page_offsets.append(start)
+    return "".join(parts), page_offsets
+
+
+def _embedding_expr(model: Optional[str], dim: int, truncate: Optional[int] = None):
+    """Vector expression for model's embeddings (None: chunks.embedding), optionally truncated to
+    the first truncate components. The columns have no fixed dimension, which vector indexes
+    need, so vectors are cast to dim; the expressions match the indexes built by
+    RagStore.ensure_vector_index and ensure_cascade_index."""
+    column = Chunk.embedding if model is None else ChunkEmbedding.embedding
+    if truncate:
+        # Literal bounds: bound parameters would keep the planner from matching the index expression
+        return cast(func.subvector(column, literal_column("1"), literal_column(str(int(truncate)))), Vector(int(truncate)))
+    return cast(column, Vector(int(dim)))
+
+
+def _cascade_index_name(model: Optional[str], dims: Optional[int]) -> str:
+    label = re.sub(r"[^a-z0-9]+", "_", (model or "primary").lower()).strip("_")
+    return f"ix_cascade_{label}_{dims or 'full'}"[:63]
 
 
 class RagStore:
-    def __init__(self, database_url: Optional[str] = None) -> None:
+    """Chunk store on Postgres/pgvector.
+
+    Ingestion, upserts and schema work use the primary (database_url).
+    Searches and catalog reads go to the replicas in replica_urls (default
+    DATABASE_REPLICA_URLS, comma-separated), picked round-robin or by fewest
+    connections in use (read_policy, default DATABASE_READ_POLICY); without
+    replicas they use the primary too. Replicas lag behind the primary, so
+    reads take read_your_writes=True to see a write made just before.
+    """
+
+    def __init__(
+        self,
+        database_url: Optional[str] = None,
+        replica_urls: Optional[Sequence[str]] = None,
+        read_policy: Optional[str] = None,
+    ) -> None:
         _require_sqlalchemy()
         self.database_url = database_url or os.getenv("DATABASE_URL", "postgresql+psycopg://postgres@localhost:5432/dm")
         self.engine = create_engine(self.database_url, pool_pre_ping=True, future=True)
         self.SessionLocal = sessionmaker(bind=self.engine, autoflush=False, expire_on_commit=False, future=True)
+        if replica_urls is None:
+            replica_urls = os.getenv("DATABASE_REPLICA_URLS", "").split(",")
+        self.replica_urls = [url.strip() for url in replica_urls if url.strip()]
+        self.read_policy = read_policy or os.getenv("DATABASE_READ_POLICY", "round_robin")
+        if self.read_policy not in ("round_robin", "least_loaded"):
+            raise ValueError(f"read_policy must be 'round_robin' or 'least_loaded', not {self.read_policy!r}")
+        self.read_engines = [create_engine(url, pool_pre_ping=True, future=True) for url in self.replica_urls]
+        self._read_sessions = [
+            sessionmaker(bind=engine, autoflush=False, expire_on_commit=False, future=True) for engine in self.read_engines
+        ]
+        self._next_reader = itertools.count()
+        self._partitioned: Optional[bool] = None
+        self._texts: "OrderedDict[int, Tuple[str, str]]" = OrderedDict()  # document id -> (content hash, text)
+        self._texts_lock = threading.Lock()
+
+    def read_session(self, read_your_writes: bool = False) -> Session:
+        """A session for queries: on a replica, or on the primary with read_your_writes or without replicas."""
+        if read_your_writes or not self._read_sessions:
+            return self.SessionLocal()
+        turn = next(self._next_reader)
+        if self.read_policy == "least_loaded":
+            # Ties (always, for a single-threaded caller) go round-robin rather than to the first replica
+            count = len(self.read_engines)
+            index = min(
+                ((turn + offset) % count for offset in range(count)), key=lambda i: self.read_engines[i].pool.checkedout()
+            )
+        else:
+            index = turn % len(self._read_sessions)
+        return self._read_sessions[index]()
+
+    def replica_status(self) -> List[Dict]:
+        """Replay lag of each replica in seconds (None when it has replayed nothing or is unreachable)."""
+        status = []
+        for url, engine in zip(self.replica_urls, self.read_engines):
+            entry = {"url": engine.url.render_as_string(hide_password=True), "lag_seconds": None, "in_use": engine.pool.checkedout()}
+            try:
+                with engine.connect() as conn:
+                    entry["lag_seconds"] = conn.execute(
+                        sql_text("SELECT extract(epoch FROM now() - pg_last_xact_replay_timestamp())")
+                    ).scalar()
+            except Exception as e:
+                entry["error"] = str(e).splitlines()[0]
+            status.append(entry)
+        return status
 
     def ensure_schema(self) -> None:
         Base.metadata.create_all(self.engine)
+        with self.engine.begin() as conn:
+            for statement in _SCHEMA_UPGRADES:
+                conn.execute(sql_text(statement))
+        self._partitioned = None
+        if self.partitioned:
+            from partitioning import ensure_delete_function
+
+            with self.engine.begin() as conn:
+                ensure_delete_function(conn)  # stores migrated before it kept moved rows' embeddings
+
+    @property
+    def partitioned(self) -> bool:
+        """Whether chunks is partitioned by framework (partitioning.py migrate)."""
+        if self._partitioned is None:
+            with self.engine.connect() as conn:
+                self._partitioned = bool(
+                    conn.execute(
+                        sql_text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('chunks'))")
+                    ).scalar()
+                )
+        return self._partitioned
+
+    def _partition_filter(self, frameworks: Optional[Sequence[str]]) -> list:
+        """A literal predicate on the partition key, so the planner prunes other frameworks' partitions."""
+        if frameworks and self.partitioned:
+            return [Chunk.framework.in_(list(frameworks))]
+        return []
 
     def get_document_by_path(self, session: Session, file_path: str):
         return session.query(Document).filter_by(file_path=file_path).one_or_none()
 
+    def indexed_paths(self, file_paths: Sequence[str], read_your_writes: bool = False) -> List[str]:
+        """Return the subset of file_paths that already have chunks in the store."""
+        if not file_paths:
+            return []
+        with self.read_session(read_your_writes) as session:
+            rows = (
+                session.query(Document.file_path)
+                .filter(Document.file_path.in_(list(file_paths)), Document.chunks.any())
+                .all()
+            )
+            return [row[0] for row in rows]
+
     def upsert_document(self, session: Session, title: str, file_path: str, content_hash: str):
         doc = self.get_document_by_path(session, file_path)
         if doc is None:
-            doc = Document(title=title, file_path=file_path, content_hash=content_hash)
+            doc = Document(title=title, file_path=file_path, content_hash=content_hash, framework=framework_for_path(file_path))
             session.add(doc)
             session.flush()
             return doc, True
@@ -114,82 +598,1171 @@ class RagStore:
             return doc, True
         return doc, False
 
+    def export_snapshot(self, out_dir: str) -> Dict:
+        """Write documents, chunks and embeddings to a portable snapshot (see snapshot.py)."""
+        from snapshot import export_snapshot
+
+        return export_snapshot(self, out_dir)
+
+    def import_snapshot(self, in_dir: str, replace: bool = False) -> Dict[str, int]:
+        """Bulk-load a snapshot written by export_snapshot without re-embedding anything."""
+        from snapshot import import_snapshot
+
+        return import_snapshot(self, in_dir, replace=replace)
+
+    def maintenance_report(self, apply: bool = False) -> str:
+        """Table/index health and the ANALYZE, VACUUM and REINDEX it calls for (see maintenance.py)."""
+        from maintenance import run_maintenance
+
+        return run_maintenance(self, apply=apply)
+
+    def drop_collection(self, framework: Optional[str]) -> int:
+        """Remove every document of framework; truncates its partition when partitioned. Returns documents removed."""
+        from partitioning import drop_collection
+
+        return drop_collection(self, framework)
+
+    def reload_collection(self, framework: Optional[str]) -> List[int]:
+        """drop_collection(framework), then queue its files for re-ingestion; returns the job ids."""
+        from partitioning import reload_collection
+
+        return reload_collection(self, framework)
+
+    def list_document_paths(self, read_your_writes: bool = False) -> List[str]:
+        with self.read_session(read_your_writes) as session:
+            return [row[0] for row in session.query(Document.file_path).order_by(Document.file_path).all()]
+
+    def set_document_tags(self, tags_by_path: Dict[str, Dict[str, List[str]]]) -> int:
+        """Replace the tags of each document (by file path) with {kind: [values]}; returns documents updated.
+
+        Also refreshes Document.framework from the path, for rows created before it existed.
+        """
+        updated = 0
+        with self.SessionLocal() as session:
+            for file_path, tags in tags_by_path.items():
+                doc = self.get_document_by_path(session, file_path)
+                if doc is None:
+                    continue
+                framework = framework_for_path(file_path)
+                if framework != doc.framework:
+                    doc.framework = framework
+                    # Moves the chunks to the matching partition when partitioned
+                    session.query(Chunk).filter(Chunk.document_id == doc.id).update(
+                        {Chunk.framework: framework}, synchronize_session=False
+                    )
+                doc.tags = [
+                    DocumentTag(kind=kind, value=value[:512])
+                    for kind, values in tags.items()
+                    for value in values
+                ]
+                updated += 1
+            session.commit()
+        return updated
+
+    def tag_values(self, kind: str, read_your_writes: bool = False) -> List[str]:
+        with self.read_session(read_your_writes) as session:
+            rows = session.query(DocumentTag.value).filter(DocumentTag.kind == kind).distinct().all()
+            return sorted(row[0] for row in rows)
+
+    def frameworks(self, read_your_writes: bool = False) -> List[str]:
+        with self.read_session(read_your_writes) as session:
+            rows = session.query(Document.framework).filter(Document.framework.isnot(None)).distinct().all()
+            return sorted(row[0] for row in rows)
+
     def ingest_text_chunks(
         self,
         session: Session,
         document_id: int,
         chunks: Sequence[str],
         embedder: Callable[[Sequence[str]], List[List[float]]],
+        spans: Optional[Sequence[ChunkSpan]] = None,
+        batch_size: Optional[int] = None,
+        progress: Optional[Callable[[int, int], None]] = None,
+        framework: Optional[str] = None,
+        offsets_only: bool = False,
+        reuse_embeddings: bool = True,
+        dedup_stats: Optional[DedupStats] = None,
     ) -> int:
-        embeddings = embedder(chunks)
+        """Embed and add chunks; with batch_size, embeds in batches and reports progress(done, total).
+
+        framework must be the document's (Document.framework). With
+        offsets_only the chunk texts are not stored; spans must then locate
+        them in the document's DocumentText.
+
+        Chunks are content-addressed by body_hash: each distinct body is
+        embedded once, and with reuse_embeddings a body already stored for
+        any document takes that chunk's vector instead (so embedder must be
+        the model behind chunks.embedding). dedup_stats, if given, is
+        incremented with the chunks added and the bodies embedded.
+        """
+        if offsets_only and not spans:
+            raise ValueError("offsets_only needs the chunk spans")
+        hashes = [body_hash(text) for text in chunks]
+        vectors = self._stored_embeddings(session, hashes) if reuse_embeddings else {}
+        bodies: Dict[str, str] = {}
+        for text, digest in zip(chunks, hashes):
+            if digest not in vectors:
+                bodies.setdefault(digest, text)
+        pending = list(bodies)
+        step = batch_size or len(pending) or 1
+        for start in range(0, len(pending), step):
+            batch = pending[start:start + step]
+            batch_embeddings = embedder([bodies[digest] for digest in batch])
+            if len(batch_embeddings) != len(batch):
+                raise RuntimeError(f"Embedder returned {len(batch_embeddings)} embeddings for {len(batch)} chunks")
+            vectors.update(zip(batch, batch_embeddings))
+            if progress:
+                progress(sum(1 for digest in hashes if digest in vectors), len(chunks))
+        if dedup_stats is not None:
+            dedup_stats.chunks += len(chunks)
+            dedup_stats.unique += len(pending)
         count = 0
-        for idx, (text, emb) in enumerate(zip(chunks, embeddings)):
+        for idx, (text, digest) in enumerate(zip(chunks, hashes)):
+            span = spans[idx] if spans else None
             session.add(
                 Chunk(
                     document_id=document_id,
                     chunk_index=idx,
-                    text=text,
+                    text=None if offsets_only else text,
                     token_count=len(text),
-                    embedding=emb,
+                    embedding=vectors[digest],
+                    body_hash=digest,
+                    char_start=span.char_start if span else None,
+                    char_end=span.char_end if span else None,
+                    page_start=span.page_start if span else None,
+                    page_end=span.page_end if span else None,
+                    framework=framework,
                 )
             )
             count += 1
         return count
 
+    def _stored_embeddings(self, session: Session, hashes: Sequence[str]) -> Dict[str, List[float]]:
+        """The stored vector of each of hashes that some chunk already has, by body hash."""
+        found: Dict[str, List[float]] = {}
+        unique = sorted(set(hashes))
+        for start in range(0, len(unique), 1000):
+            rows = (
+                session.query(Chunk.body_hash, Chunk.embedding)
+                .filter(Chunk.body_hash.in_(unique[start:start + 1000]))
+                .distinct(Chunk.body_hash)
+            )
+            found.update((digest, embedding) for digest, embedding in rows)
+        return found
+
     def ingest_pdf(
         self,
         pdf_path: str,
         embedder: Callable[[Sequence[str]], List[List[float]]],
         chunk_size: int = 800,
         overlap: int = 120,
+        embed_batch_size: Optional[int] = None,
+        progress: Optional[Callable[[int, int], None]] = None,
+        boundaries: Optional[str] = None,
+        dedup_stats: Optional[DedupStats] = None,
+        force: bool = False,
     ) -> Tuple[int, bool]:
-        from PyPDF2 import PdfReader  # local import to keep base app light
+        """Chunk, embed and store a PDF unless it is unchanged (or force); returns (chunks, changed).
+
+        boundaries defaults to CHUNK_BOUNDARIES; dedup_stats is passed on to
+        ingest_text_chunks. force replaces the chunks of an unchanged PDF, e.g.
+        to pick up new chunking settings.
+        """
+        from fingerprint import file_hash
+        from pdf_extract import iter_pages  # local import to keep base app light
 
         title = os.path.basename(pdf_path)
-        content_hash = compute_file_hash(pdf_path)
+        content_hash = file_hash(pdf_path)  # re-reads the file only when its size/mtime/inode changed
 
         with self.SessionLocal() as session:
             doc, changed = self.upsert_document(session, title=title, file_path=pdf_path, content_hash=content_hash)
             if not changed and doc.chunks:
-                session.commit()
-                return len(doc.chunks), False
+                if not force:
+                    session.commit()
+                    return len(doc.chunks), False
+                for ch in list(doc.chunks):
+                    session.delete(ch)
+                session.flush()
 
-            # (Re)create chunks
-            reader = PdfReader(pdf_path)
-            full_text = "".join((page.extract_text() or "").replace('\x00', '') for page in reader.pages)
-            chunks = simple_overlap_chunk(full_text, chunk_size=chunk_size, overlap=overlap)
-            added = self.ingest_text_chunks(session, document_id=doc.id, chunks=chunks, embedder=embedder)
+            # (Re)create chunks as offsets into the document text, stored once
+            text, page_offsets = join_pages(list(iter_pages(pdf_path)))
+            spans = chunk_text(text, page_offsets, chunk_size, overlap, boundaries or CHUNK_BOUNDARIES)
+            self._store_document_text(session, doc.id, content_hash, text, page_offsets)
+            added = self.ingest_text_chunks(
+                session,
+                document_id=doc.id,
+                chunks=[span.text for span in spans],
+                embedder=embedder,
+                spans=spans,
+                batch_size=embed_batch_size,
+                progress=progress,
+                framework=doc.framework,
+                offsets_only=True,
+                dedup_stats=dedup_stats,
+            )
+            session.flush()
+            self._refresh_centroids(session, [doc.id])
             session.commit()
             return added, True
 
+    # ---- document texts and offset-only chunks ----
+
+    def _store_document_text(
+        self, session: Session, document_id: int, content_hash: str, text: str, page_offsets: Sequence[int]
+    ) -> None:
+        session.merge(
+            DocumentText(
+                document_id=document_id,
+                content_hash=content_hash,
+                chars=len(text),
+                page_offsets=list(page_offsets),
+                text_zlib=zlib.compress(text.encode("utf-8"), 6),
+            )
+        )
+
+    def _document_texts(self, session: Session, document_ids: Iterable[int]) -> Dict[int, str]:
+        """Decompressed texts of the given documents (those that have one), through a small LRU cache."""
+        ids = sorted(set(document_ids))
+        if not ids:
+            return {}
+        hashes = dict(
+            session.query(DocumentText.document_id, DocumentText.content_hash).filter(DocumentText.document_id.in_(ids))
+        )
+        texts: Dict[int, str] = {}
+        with self._texts_lock:
+            for document_id, content_hash in hashes.items():
+                cached = self._texts.get(document_id)
+                if cached is not None and cached[0] == content_hash:
+                    self._texts.move_to_end(document_id)
+                    texts[document_id] = cached[1]
+        stale = [document_id for document_id in hashes if document_id not in texts]
+        if stale:
+            rows = session.query(DocumentText.document_id, DocumentText.content_hash, DocumentText.text_zlib).filter(
+                DocumentText.document_id.in_(stale)
+            )
+            for document_id, content_hash, blob in rows:
+                texts[document_id] = zlib.decompress(blob).decode("utf-8")
+                with self._texts_lock:
+                    self._texts[document_id] = (content_hash, texts[document_id])
+                    while len(self._texts) > TEXT_CACHE_DOCUMENTS:
+                        self._texts.popitem(last=False)
+        return texts
+
+    def _materialize(self, session: Session, rows: Sequence[Tuple[int, Optional[str], Optional[int], Optional[int]]]) -> List[str]:
+        """Chunk texts from (document id, stored text, char_start, char_end) rows; offset-only rows are sliced."""
+        texts = self._document_texts(session, (row[0] for row in rows if row[1] is None))
+        return [
+            row[1] if row[1] is not None else texts.get(row[0], "")[row[2]:row[3]]
+            for row in rows
+        ]
+
+    def _fill_texts(self, session: Session, results: List[SearchResult]) -> List[SearchResult]:
+        if any(r.text is None for r in results):
+            texts = self._materialize(session, [(r.document_id, r.text, r.char_start, r.char_end) for r in results])
+            for result, text in zip(results, texts):
+                result.text = text
+        return results
+
+    def iter_document_texts(self, document_ids: Optional[Sequence[int]] = None) -> Iterable[Tuple[int, str, str, List[int]]]:
+        """(document id, file path, normalized text, page offsets) of every stored document text."""
+        with self.SessionLocal() as session:
+            q = session.query(DocumentText.document_id, Document.file_path).join(Document, Document.id == DocumentText.document_id)
+            if document_ids is not None:
+                q = q.filter(DocumentText.document_id.in_(list(document_ids)))
+            for document_id, file_path in q.order_by(Document.file_path).all():
+                row = session.get(DocumentText, document_id)
+                yield document_id, file_path, zlib.decompress(row.text_zlib).decode("utf-8"), list(row.page_offsets)
+                session.expunge(row)
+
+    def rechunk(
+        self,
+        embedder: Callable[[Sequence[str]], List[List[float]]],
+        chunk_size: int = 800,
+        overlap: int = 120,
+        document_ids: Optional[Sequence[int]] = None,
+        embed_batch_size: Optional[int] = None,
+        progress: Optional[Callable[[str, int], None]] = None,
+        boundaries: Optional[str] = None,
+        dedup_stats: Optional[DedupStats] = None,
+    ) -> int:
+        """Re-chunk documents from their stored text with new window settings; returns chunks written.
+
+        Recomputes the offsets and embeds the new windows, without touching
+        the PDFs. Documents without a DocumentText (see compact_texts) are
+        skipped.
+        """
+        written = 0
+        for document_id, file_path, text, page_offsets in self.iter_document_texts(document_ids):
+            spans = chunk_text(text, page_offsets, chunk_size, overlap, boundaries or CHUNK_BOUNDARIES)
+            with self.SessionLocal() as session:
+                framework = session.get(Document, document_id).framework
+                session.query(Chunk).filter(Chunk.document_id == document_id).delete(synchronize_session=False)
+                written += self.ingest_text_chunks(
+                    session,
+                    document_id=document_id,
+                    chunks=[span.text for span in spans],
+                    embedder=embedder,
+                    spans=spans,
+                    batch_size=embed_batch_size,
+                    framework=framework,
+                    offsets_only=True,
+                    dedup_stats=dedup_stats,
+                )
+                session.flush()
+                self._refresh_centroids(session, [document_id])
+                session.commit()
+            if progress:
+                progress(file_path, len(spans))
+        return written
+
+    def compact_texts(self, progress: Optional[Callable[[str, int], None]] = None) -> int:
+        """Convert documents whose chunks still store their text to one DocumentText plus offset-only chunks.
+
+        The text is rebuilt from the chunks' offsets, so no PDF is re-read.
+        Page offsets are approximated by the first chunk starting on each
+        page. Returns the number of documents converted.
+        """
+        converted = 0
+        with self.SessionLocal() as session:
+            pending = [
+                row[0]
+                for row in session.query(Chunk.document_id)
+                .filter(Chunk.text.isnot(None), Chunk.char_start.isnot(None))
+                .filter(~select(DocumentText.document_id).where(DocumentText.document_id == Chunk.document_id).exists())
+                .distinct()
+            ]
+        for document_id in pending:
+            with self.SessionLocal() as session:
+                doc = session.get(Document, document_id)
+                rows = (
+                    session.query(Chunk.text, Chunk.char_start, Chunk.char_end, Chunk.page_start)
+                    .filter(Chunk.document_id == document_id)
+                    .order_by(Chunk.char_start)
+                    .all()
+                )
+                text, page_offsets = rebuild_text(rows)
+                self._store_document_text(session, document_id, doc.content_hash, text, page_offsets)
+                session.query(Chunk).filter(Chunk.document_id == document_id).update(
+                    {Chunk.text: None}, synchronize_session=False
+                )
+                session.commit()
+            converted += 1
+            if progress:
+                progress(doc.file_path, len(rows))
+        return converted
+
+    def hash_bodies(self, document_ids: Optional[Sequence[int]] = None, progress: Optional[Callable[[int, int], None]] = None) -> int:
+        """Set body_hash on chunks stored without one (ingested before it existed, or bulk-loaded);
+        returns the chunks hashed. Until then they are never deduplicated."""
+        hashed = 0
+        with self.SessionLocal() as session:
+            q = session.query(Chunk.document_id).filter(Chunk.body_hash.is_(None))
+            if document_ids is not None:
+                q = q.filter(Chunk.document_id.in_(list(document_ids)))
+            pending = [row[0] for row in q.distinct()]
+        for document_id in pending:
+            with self.SessionLocal() as session:
+                rows = (
+                    session.query(Chunk.id, Chunk.document_id, Chunk.text, Chunk.char_start, Chunk.char_end)
+                    .filter(Chunk.document_id == document_id, Chunk.body_hash.is_(None))
+                    .all()
+                )
+                texts = self._materialize(session, [row[1:] for row in rows])
+                session.execute(
+                    sql_text("UPDATE chunks SET body_hash = :hash WHERE id = :id"),
+                    [{"id": row[0], "hash": body_hash(text)} for row, text in zip(rows, texts)],
+                )
+                session.commit()
+            hashed += len(rows)
+            if progress:
+                progress(document_id, len(rows))
+        return hashed
+
+    def dedup_stats(self, read_your_writes: bool = False) -> DedupStats:
+        """Chunks in the store and their distinct bodies (chunks without a body_hash count as distinct)."""
+        with self.read_session(read_your_writes) as session:
+            chunks, unique, unhashed = session.query(
+                func.count(), func.count(Chunk.body_hash.distinct()), func.count().filter(Chunk.body_hash.is_(None))
+            ).one()
+        return DedupStats(chunks=chunks, unique=unique + unhashed)
+
+    # ---- background ingestion jobs ----
+
+    def enqueue_ingest(self, file_paths: Sequence[str], force: bool = False) -> List[int]:
+        """Queue ingestion of file_paths, reusing any queued or running job for the same file.
+
+        With force the worker re-ingests files even if unchanged (see
+        ingest_pdf); a reused queued job is upgraded to force.
+        """
+        job_ids: List[int] = []
+        with self.SessionLocal() as session:
+            active = dict(
+                session.query(IngestJob.file_path, IngestJob.id)
+                .filter(IngestJob.file_path.in_(list(file_paths)), IngestJob.status.in_(["queued", "running"]))
+                .all()
+            )
+            if force and active:
+                session.query(IngestJob).filter(IngestJob.id.in_(list(active.values())), IngestJob.status == "queued").update(
+                    {"force": True}, synchronize_session=False
+                )
+            for file_path in file_paths:
+                if file_path in active:
+                    job_ids.append(active[file_path])
+                    continue
+                job = IngestJob(file_path=file_path, status="queued", force=force)
+                session.add(job)
+                session.flush()
+                active[file_path] = job.id
+                job_ids.append(job.id)
+            session.commit()
+        return job_ids
+
+    def claim_ingest_job(self, worker: Optional[str] = None, stale_after_seconds: int = 600) -> Optional[JobStatus]:
+        """Atomically take the oldest queued job (or one whose worker stopped heartbeating).
+
+        SKIP LOCKED lets any number of workers, on any host, poll the same table
+        without blocking on each other or claiming the same job twice.
+        """
+        worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+        stale_before = func.now() - timedelta(seconds=stale_after_seconds)
+        with self.SessionLocal() as session:
+            job = (
+                session.query(IngestJob)
+                .filter(
+                    (IngestJob.status == "queued")
+                    | ((IngestJob.status == "running") & (IngestJob.heartbeat_at < stale_before))
+                )
+                .order_by(IngestJob.id)
+                .with_for_update(skip_locked=True)
+                .limit(1)
+                .one_or_none()
+            )
+            if job is None:
+                session.commit()
+                return None
+            job.status = "running"
+            job.worker = worker
+            job.chunks_done = 0
+            job.error = None
+            job.started_at = func.now()
+            job.heartbeat_at = func.now()
+            session.commit()
+            return JobStatus(job.id, job.file_path, job.status, 0, job.chunks_total, worker, None, 0.0, job.force)
+
+    def update_ingest_job(self, job_id: int, chunks_done: int, chunks_total: int) -> None:
+        with self.SessionLocal() as session:
+            session.query(IngestJob).filter(IngestJob.id == job_id).update(
+                {"chunks_done": chunks_done, "chunks_total": chunks_total, "heartbeat_at": func.now()},
+                synchronize_session=False,
+            )
+            session.commit()
+
+    def heartbeat_ingest_job(self, job_id: int) -> None:
+        """Mark a running job alive so claim_ingest_job does not hand it to another worker."""
+        with self.SessionLocal() as session:
+            session.query(IngestJob).filter(IngestJob.id == job_id).update(
+                {"heartbeat_at": func.now()}, synchronize_session=False
+            )
+            session.commit()
+
+    def finish_ingest_job(self, job_id: int, error: Optional[str] = None) -> None:
+        with self.SessionLocal() as session:
+            session.query(IngestJob).filter(IngestJob.id == job_id).update(
+                {"status": "failed" if error else "done", "error": error, "finished_at": func.now()},
+                synchronize_session=False,
+            )
+            session.commit()
+
+    def ingest_job_status(self, file_paths: Optional[Sequence[str]] = None, limit: int = 20) -> List[JobStatus]:
+        """Most recent jobs, optionally only those for file_paths; newest first."""
+        elapsed = func.extract("epoch", func.coalesce(IngestJob.finished_at, func.now()) - IngestJob.started_at)
+        with self.SessionLocal() as session:
+            q = session.query(
+                IngestJob.id,
+                IngestJob.file_path,
+                IngestJob.status,
+                IngestJob.chunks_done,
+                IngestJob.chunks_total,
+                IngestJob.worker,
+                IngestJob.error,
+                elapsed,
+            )
+            if file_paths:
+                q = q.filter(IngestJob.file_path.in_(list(file_paths)))
+            rows = q.order_by(IngestJob.id.desc()).limit(limit).all()
+            return [
+                JobStatus(row[0], row[1], row[2], row[3], row[4], row[5], row[6], float(row[7]) if row[7] is not None else None)
+                for row in rows
+            ]
+
+    def _scoped_document_ids(self, phases: Optional[Sequence[str]], frameworks: Optional[Sequence[str]]):
+        scope = select(Document.id)
+        if frameworks:
+            scope = scope.where(Document.framework.in_(list(frameworks)))
+        if phases:
+            tagged = select(DocumentTag.document_id).where(
+                DocumentTag.kind == "phase", DocumentTag.value.in_(list(phases))
+            )
+            scope = scope.where(Document.id.in_(tagged))
+        return scope
+
+    def _search_statement(
+        self,
+        distance_expr,
+        document_paths: Optional[Sequence[str]],
+        include_embeddings: bool,
+        phases: Optional[Sequence[str]],
+        frameworks: Optional[Sequence[str]],
+        document_ids: Optional[Sequence[int]],
+    ):
+        """Chunks in scope with the columns _search_results reads, not yet ordered or limited."""
+        columns = [
+            Chunk.text,
+            Document.title,
+            Document.file_path,
+            distance_expr,
+            Chunk.document_id,
+            Chunk.chunk_index,
+            Chunk.page_start,
+            Chunk.page_end,
+            Document.content_hash,
+            Chunk.char_start,
+            Chunk.char_end,
+            Chunk.body_hash,
+        ]
+        if include_embeddings:
+            columns.append(Chunk.embedding)
+        statement = select(*columns).join(Document, Chunk.document_id == Document.id)
+        if document_paths:
+            statement = statement.where(Document.file_path.in_(list(document_paths)))
+        if document_ids is not None:
+            statement = statement.where(Chunk.document_id.in_(list(document_ids)))
+        if phases or frameworks:
+            # Resolve the scope to document ids through the indexed metadata first,
+            # so the vector scan only touches chunks of those documents.
+            statement = statement.where(
+                Chunk.document_id.in_(self._scoped_document_ids(phases, frameworks)), *self._partition_filter(frameworks)
+            )
+        return statement
+
+    def _search_in_session(
+        self,
+        session: Session,
+        query_embedding: List[float],
+        document_paths: Optional[Sequence[str]],
+        k: int,
+        include_embeddings: bool = False,
+        phases: Optional[Sequence[str]] = None,
+        frameworks: Optional[Sequence[str]] = None,
+        document_ids: Optional[Sequence[int]] = None,
+        dedup: bool = True,
+    ) -> List[SearchResult]:
+        # Cast to the query's dimension so an index from ensure_vector_index can serve the ORDER BY
+        distance_expr = _embedding_expr(None, len(query_embedding)).cosine_distance(query_embedding).label("distance")
+        statement = self._search_statement(
+            distance_expr, document_paths, include_embeddings, phases, frameworks, document_ids
+        ).order_by(distance_expr)
+        # The same passage in several documents would otherwise take several of the k slots;
+        # fetch more until k distinct bodies remain or the candidates run out
+        limit = k * DEDUP_FETCH_FACTOR if dedup else k
+        while True:
+            rows = session.execute(statement.limit(limit)).all()
+            results = self._search_results(rows, include_embeddings)
+            if not dedup:
+                return self._fill_texts(session, results)
+            kept = dedup_results(results, k)
+            if len(kept) >= k or len(rows) < limit:
+                return self._fill_texts(session, kept)
+            limit *= 2
+
+    @staticmethod
+    def _search_results(rows, include_embeddings: bool) -> List[SearchResult]:
+        return [
+            SearchResult(
+                text=row[0],
+                document_title=row[1],
+                file_path=row[2],
+                distance=float(row[3]) if row[3] is not None else 0.0,
+                document_id=row[4],
+                chunk_index=row[5],
+                page_start=row[6],
+                page_end=row[7],
+                content_hash=row[8],
+                char_start=row[9],
+                char_end=row[10],
+                body_hash=row[11],
+                embedding=row[12] if include_embeddings else None,
+            )
+            for row in rows
+        ]
+
     def search(
         self,
         query_embedding: List[float],
         document_paths: Optional[Sequence[str]] = None,
         k: int = 6,
+        include_embeddings: bool = False,
+        phases: Optional[Sequence[str]] = None,
+        frameworks: Optional[Sequence[str]] = None,
+        read_your_writes: bool = False,
     ) -> List[SearchResult]:
-        # cosine_distance is available as a method on Vector columns
+        """Top-k chunks by cosine distance, one per distinct chunk body (see dedup_results).
+
+        phases (e.g. "Phase 3: Data and Information Management") and frameworks
+        (e.g. "NIST") restrict the search to matching documents; both must match
+        when given together.
+        """
+        with self.read_session(read_your_writes) as session:
+            return self._search_in_session(
+                session, query_embedding, document_paths, k, include_embeddings, phases, frameworks
+            )
+
+    def search_many(
+        self,
+        query_embeddings: Sequence[List[float]],
+        document_paths: Optional[Sequence[str]] = None,
+        k: int = 6,
+        include_embeddings: bool = False,
+        phases: Optional[Sequence[str]] = None,
+        frameworks: Optional[Sequence[str]] = None,
+        read_your_writes: bool = False,
+    ) -> List[List[SearchResult]]:
+        """Top-k chunks for each of several query embeddings, in input order.
+
+        One statement: the queries are a VALUES list joined to a LATERAL
+        subquery that runs the search ordered by distance to each of them.
+        A query whose candidates dedupe to fewer than k bodies is searched
+        again on its own with a larger fetch (see search).
+        """
+        if not query_embeddings:
+            return []
+        dim = len(query_embeddings[0])
+        queries = values(column("query_index", Integer), column("query_embedding", Vector(dim)), name="queries").data(
+            list(enumerate(query_embeddings))
+        )
+        distance = _embedding_expr(None, dim).cosine_distance(cast(queries.c.query_embedding, Vector(dim))).label("distance")
+        limit = k * DEDUP_FETCH_FACTOR
+        top = (
+            self._search_statement(distance, document_paths, include_embeddings, phases, frameworks, None)
+            .order_by(distance)
+            .limit(limit)
+            .lateral("top")
+        )
+        statement = (
+            select(queries.c.query_index, top)
+            .select_from(queries.join(top, true()))
+            .order_by(queries.c.query_index, top.c.distance)
+        )
+        with self.read_session(read_your_writes) as session:
+            rows_by_query: List[list] = [[] for _ in query_embeddings]
+            for row in session.execute(statement):
+                rows_by_query[row[0]].append(row[1:])
+            found: List[List[SearchResult]] = []
+            for emb, rows in zip(query_embeddings, rows_by_query):
+                kept = dedup_results(self._search_results(rows, include_embeddings), k)
+                if len(kept) < k and len(rows) == limit:
+                    kept = self._search_in_session(session, emb, document_paths, k, include_embeddings, phases, frameworks)
+                found.append(kept)
+            self._fill_texts(session, [result for results in found for result in results])
+            return found
+
+    def document_ids(self, file_paths: Sequence[str], read_your_writes: bool = False) -> Dict[str, int]:
+        """Ids of the indexed documents (those with chunks) among file_paths, keyed by path."""
+        if not file_paths:
+            return {}
+        with self.read_session(read_your_writes) as session:
+            rows = (
+                session.query(Document.file_path, Document.id)
+                .filter(Document.file_path.in_(list(file_paths)), Document.chunks.any())
+                .all()
+            )
+            return {row[0]: row[1] for row in rows}
+
+    def _search_grouped_in_session(
+        self,
+        session: Session,
+        query_embedding: List[float],
+        document_ids: Optional[Sequence[int]],
+        k_per_group: int,
+        group_by: str,
+        phases: Optional[Sequence[str]],
+        frameworks: Optional[Sequence[str]],
+    ) -> Dict[str, List[SearchResult]]:
+        if group_by not in ("document", "framework"):
+            raise ValueError(f"group_by must be 'document' or 'framework', not {group_by!r}")
+        scope = self._scoped_document_ids(phases, frameworks)
+        if document_ids is not None:
+            scope = scope.where(Document.id.in_(list(document_ids)))
+        distance = _embedding_expr(None, len(query_embedding)).cosine_distance(query_embedding).label("distance")
+        top = select(
+            Chunk.text,
+            distance,
+            Chunk.document_id,
+            Chunk.chunk_index,
+            Chunk.page_start,
+            Chunk.page_end,
+            Document.title,
+            Document.file_path,
+            Document.content_hash,
+            Document.framework,
+            Chunk.char_start,
+            Chunk.char_end,
+        ).join(Document, Chunk.document_id == Document.id).where(*self._partition_filter(frameworks))
+        if group_by == "document":
+            groups = select(Document.id.label("document_id"), Document.file_path.label("group_key"))
+            groups = groups.where(Document.id.in_(scope)).subquery("groups")
+            top = top.where(Chunk.document_id == groups.c.document_id)
+        else:
+            groups = select(Document.framework.label("group_key")).where(Document.id.in_(scope)).distinct().subquery("groups")
+            top = top.where(Document.framework.is_not_distinct_from(groups.c.group_key), Chunk.document_id.in_(scope))
+        top = top.order_by(distance).limit(k_per_group).lateral("top")
+        statement = (
+            select(groups.c.group_key, top)
+            .select_from(groups.join(top, true()))
+            .order_by(groups.c.group_key, top.c.distance)
+        )
+        grouped: Dict[str, List[SearchResult]] = {}
+        for row in session.execute(statement):
+            grouped.setdefault(row.group_key or "", []).append(
+                SearchResult(
+                    text=row.text,
+                    document_title=row.title,
+                    file_path=row.file_path,
+                    distance=float(row.distance),
+                    document_id=row.document_id,
+                    chunk_index=row.chunk_index,
+                    page_start=row.page_start,
+                    page_end=row.page_end,
+                    content_hash=row.content_hash,
+                    framework=row.framework,
+                    char_start=row.char_start,
+                    char_end=row.char_end,
+                )
+            )
+        # One materialization for all groups, so the round trips do not grow with the selection
+        self._fill_texts(session, [result for results in grouped.values() for result in results])
+        return grouped
+
+    def search_grouped(
+        self,
+        query_embedding: List[float],
+        document_ids: Optional[Sequence[int]] = None,
+        k_per_group: int = 3,
+        group_by: str = "document",
+        phases: Optional[Sequence[str]] = None,
+        frameworks: Optional[Sequence[str]] = None,
+        read_your_writes: bool = False,
+    ) -> Dict[str, List[SearchResult]]:
+        """Top k_per_group chunks of every document (group_by="document") or framework
+        (group_by="framework"), keyed by file path or framework name ("" for none).
+
+        One statement: a LATERAL subquery per group, each ordered by distance
+        over that group's chunks only (found through ix_chunks_document_id), so
+        a large document cannot crowd the others out of the results.
+        """
+        with self.read_session(read_your_writes) as session:
+            return self._search_grouped_in_session(
+                session, query_embedding, document_ids, k_per_group, group_by, phases, frameworks
+            )
+
+    # ---- document-centroid routing ----
+
+    def _refresh_centroids(self, session: Session, document_ids: Optional[Sequence[int]] = None) -> None:
+        where = "TRUE"
+        params: Dict = {}
+        if document_ids is not None:
+            where = "document_id = ANY(:ids)"
+            params["ids"] = list(document_ids)
+        session.execute(sql_text(f"DELETE FROM document_centroids WHERE {where}"), params)
+        session.execute(
+            sql_text(
+                "INSERT INTO document_centroids (document_id, section, chunk_start, chunk_end, embedding)"
+                f" SELECT document_id, 0, min(chunk_index), max(chunk_index) + 1, avg(embedding) FROM chunks WHERE {where}"
+                " GROUP BY document_id"
+                f" UNION ALL SELECT document_id, chunk_index / {SECTION_CHUNKS} + 1, min(chunk_index), max(chunk_index) + 1,"
+                f" avg(embedding) FROM chunks WHERE {where} GROUP BY document_id, chunk_index / {SECTION_CHUNKS}"
+            ),
+            params,
+        )
+
+    def refresh_centroids(self, document_ids: Optional[Sequence[int]] = None, missing_only: bool = False) -> int:
+        """Recompute document and section centroids (default: of every document); returns centroid rows.
+
+        ingest_pdf keeps them current; run this after bulk loads that bypass it
+        and once for documents ingested before centroids existed (missing_only,
+        which only reads the chunks of documents without one).
+        """
         with self.SessionLocal() as session:
-            q = session.query(Chunk, Document).join(Document, Chunk.document_id == Document.id)
-            if document_paths:
-                q = q.filter(Document.file_path.in_(list(document_paths)))
-            distance_expr = Chunk.embedding.cosine_distance(query_embedding)
-            q = q.order_by(distance_expr).limit(k)
-            rows = q.all()
-            results: List[SearchResult] = []
-            # Build results with distance values
-            for chunk, doc in rows:
-                # Calculate distance directly for this chunk
-                dist_query = session.query(Chunk.embedding.cosine_distance(query_embedding)).filter(Chunk.id == chunk.id)
-                dist_val = dist_query.scalar()
-                results.append(
-                    SearchResult(
-                        text=chunk.text,
-                        document_title=doc.title,
-                        file_path=doc.file_path,
-                        distance=float(dist_val) if dist_val is not None else 0.0,
-                    )
+            if missing_only:
+                wanted = None if document_ids is None else set(document_ids)
+                uncovered = [i for i in self._uncovered_documents(session, None, None) if wanted is None or i in wanted]
+                if uncovered:
+                    self._refresh_centroids(session, uncovered)
+            else:
+                self._refresh_centroids(session, document_ids)
+            session.commit()
+            return session.query(func.count()).select_from(DocumentCentroid).scalar()
+
+    def _route_documents(
+        self,
+        session: Session,
+        query_embedding: List[float],
+        documents: int,
+        level: str,
+        phases: Optional[Sequence[str]],
+        frameworks: Optional[Sequence[str]],
+    ) -> List[Tuple[int, str]]:
+        """(id, file path) of the documents whose centroids (level "document") or best section
+        centroid (level "section") are nearest to the query."""
+        if level not in ("document", "section"):
+            raise ValueError(f"level must be 'document' or 'section', not {level!r}")
+        distance = cast(DocumentCentroid.embedding, Vector(len(query_embedding))).cosine_distance(query_embedding)
+        ranked = select(DocumentCentroid.document_id, func.min(distance).label("distance"))
+        ranked = ranked.where(DocumentCentroid.section == 0 if level == "document" else DocumentCentroid.section > 0)
+        if phases or frameworks:
+            ranked = ranked.where(DocumentCentroid.document_id.in_(self._scoped_document_ids(phases, frameworks)))
+        ranked = ranked.group_by(DocumentCentroid.document_id).order_by("distance").limit(documents).subquery()
+        rows = session.execute(
+            select(ranked.c.document_id, Document.file_path)
+            .join(Document, Document.id == ranked.c.document_id)
+            .order_by(ranked.c.distance)
+        )
+        return [(row[0], row[1]) for row in rows]
+
+    def _uncovered_documents(
+        self, session: Session, phases: Optional[Sequence[str]], frameworks: Optional[Sequence[str]]
+    ) -> List[int]:
+        """Ids of scoped documents that have chunks but no centroid yet (ingested before centroids, or bulk-loaded)."""
+        covered = select(DocumentCentroid.document_id).where(
+            DocumentCentroid.document_id == Document.id, DocumentCentroid.section == 0
+        )
+        q = session.query(Document.id).filter(~covered.exists(), Document.chunks.any())
+        if phases or frameworks:
+            q = q.filter(Document.id.in_(self._scoped_document_ids(phases, frameworks)))
+        return [row[0] for row in q]
+
+    def _search_routed_in_session(
+        self,
+        session: Session,
+        query_embedding: List[float],
+        k: int,
+        documents: int = ROUTE_DOCUMENTS,
+        level: str = "document",
+        include_embeddings: bool = False,
+        phases: Optional[Sequence[str]] = None,
+        frameworks: Optional[Sequence[str]] = None,
+    ) -> Tuple[List[SearchResult], RouterStats]:
+        started = time.perf_counter()
+        routed = self._route_documents(session, query_embedding, documents, level, phases, frameworks)
+        # Documents the router cannot rank are always searched, so none silently drops out of the corpus
+        uncovered = self._uncovered_documents(session, phases, frameworks) if routed else []
+        routed_at = time.perf_counter()
+        # No centroids yet (refresh_centroids not run): fall back to the flat search
+        document_ids = [document_id for document_id, _ in routed] + uncovered if routed else None
+        results = self._search_in_session(
+            session, query_embedding, None, k, include_embeddings, phases, frameworks, document_ids=document_ids
+        )
+        stats = RouterStats(
+            level=level,
+            document_paths=[path for _, path in routed],
+            route_ms=(routed_at - started) * 1000,
+            search_ms=(time.perf_counter() - routed_at) * 1000,
+            uncovered=uncovered,
+        )
+        return results, stats
+
+    def search_routed(
+        self,
+        query_embedding: List[float],
+        k: int = 6,
+        documents: int = ROUTE_DOCUMENTS,
+        level: str = "document",
+        include_embeddings: bool = False,
+        phases: Optional[Sequence[str]] = None,
+        frameworks: Optional[Sequence[str]] = None,
+        measure: bool = False,
+        read_your_writes: bool = False,
+    ) -> Tuple[List[SearchResult], RouterStats]:
+        """Two-level search: the nearest documents by centroid, then the top-k chunks within them.
+
+        The router scans one row per document (or per SECTION_CHUNKS chunks)
+        instead of every chunk. Documents without centroids are searched
+        as well (stats.uncovered); refresh_centroids(missing_only=True)
+        brings them under the router. With measure, also runs the flat search and
+        reports its latency, the overlap of the two top-k lists and whether
+        the flat search's best chunk came from a document the router skipped.
+        """
+        with self.read_session(read_your_writes) as session:
+            results, stats = self._search_routed_in_session(
+                session, query_embedding, k, documents, level, include_embeddings, phases, frameworks
+            )
+            if measure:
+                started = time.perf_counter()
+                flat = self._search_in_session(session, query_embedding, None, k, False, phases, frameworks)
+                stats.flat_ms = (time.perf_counter() - started) * 1000
+                expected = {(r.document_id, r.chunk_index) for r in flat}
+                found = {(r.document_id, r.chunk_index) for r in results}
+                stats.recall = len(expected & found) / len(expected) if expected else 1.0
+                stats.missed = (
+                    bool(flat) and bool(stats.document_paths)
+                    and flat[0].file_path not in stats.document_paths and flat[0].document_id not in stats.uncovered
                 )
-            return results
+            return results, stats
 
+    # ---- additional embedding models and cascade search ----
 
+    def embedding_models(self) -> Dict[str, int]:
+        """Chunks embedded so far by each model in chunk_embeddings."""
+        with self.SessionLocal() as session:
+            rows = (
+                session.query(ChunkEmbedding.model, func.count())
+                .group_by(ChunkEmbedding.model)
+                .order_by(ChunkEmbedding.model)
+                .all()
+            )
+            return {row[0]: int(row[1]) for row in rows}
+
+    def backfill_embeddings(
+        self,
+        model: str,
+        embedder: Callable[[Sequence[str]], List[List[float]]],
+        batch_size: int = 64,
+        limit: Optional[int] = None,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> int:
+        """Embed chunks that have no model embedding yet, batch by batch; returns the number added.
+
+        Each batch locks its chunks with FOR UPDATE SKIP LOCKED, so several
+        backfill workers can run side by side without embedding a chunk twice.
+        """
+        def missing(session: Session):
+            embedded = select(ChunkEmbedding.chunk_id).where(
+                ChunkEmbedding.model == model, ChunkEmbedding.chunk_id == Chunk.id
+            )
+            return session.query(Chunk.id, Chunk.text, Chunk.document_id, Chunk.char_start, Chunk.char_end).filter(
+                ~embedded.exists()
+            )
+
+        with self.SessionLocal() as session:
+            total = missing(session).count()
+        if limit is not None:
+            total = min(total, limit)
+        done = 0
+        while done < total:
+            with self.SessionLocal() as session:
+                rows = (
+                    missing(session)
+                    .order_by(Chunk.id)
+                    .limit(min(batch_size, total - done))
+                    .with_for_update(skip_locked=True, of=Chunk)
+                    .all()
+                )
+                if not rows:
+                    break
+                embeddings = embedder(self._materialize(session, [(row[2], row[1], row[3], row[4]) for row in rows]))
+                if len(embeddings) != len(rows):
+                    raise RuntimeError(f"Embedder returned {len(embeddings)} embeddings for {len(rows)} chunks")
+                session.add_all(
+                    ChunkEmbedding(chunk_id=row[0], model=model, dim=len(emb), embedding=emb)
+                    for row, emb in zip(rows, embeddings)
+                )
+                session.commit()
+            done += len(rows)
+            if progress:
+                progress(done, total)
+        return done
+
+    def embedding_dim(self) -> Optional[int]:
+        """Dimension of the stored chunk embeddings; None while there are none."""
+        with self.engine.connect() as conn:
+            return conn.execute(sql_text("SELECT vector_dims(embedding) FROM chunks LIMIT 1")).scalar()
+
+    def ensure_vector_index(
+        self,
+        method: str = "hnsw",
+        dim: Optional[int] = None,
+        m: int = 16,
+        ef_construction: int = 64,
+        lists: Optional[int] = None,
+        concurrently: bool = False,
+        timeout_s: Optional[int] = None,
+    ) -> Optional[str]:
+        """ANN index (hnsw or ivfflat) on chunks.embedding for search(); returns its name.
+
+        dim defaults to that of the stored embeddings (nothing is built while
+        there are none). ivfflat lists default to rows/1000, as pgvector
+        suggests, so build it after loading data. timeout_s abandons a build
+        that runs longer (the database raises).
+        """
+        if method not in ("hnsw", "ivfflat"):
+            raise ValueError(f"method must be 'hnsw' or 'ivfflat', not {method!r}")
+        dim = dim or self.embedding_dim()
+        if not dim:
+            return None
+        name = f"ix_chunks_embedding_{method}"
+        if method == "hnsw":
+            params = f"m = {int(m)}, ef_construction = {int(ef_construction)}"
+        else:
+            if lists is None:
+                with self.engine.connect() as conn:
+                    rows = conn.execute(sql_text("SELECT reltuples FROM pg_class WHERE relname = 'chunks'")).scalar() or 0
+                lists = max(1, int(rows) // 1000)
+            params = f"lists = {int(lists)}"
+        concurrently = concurrently and not self.partitioned  # not supported on partitioned tables
+        statement = (
+            f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {name} ON chunks "
+            f"USING {method} ((embedding::vector({int(dim)})) vector_cosine_ops) WITH ({params})"
+        )
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            if timeout_s:
+                conn.execute(sql_text(f"SET statement_timeout = '{int(timeout_s)}s'"))
+            try:
+                conn.execute(sql_text(statement))
+            finally:
+                if timeout_s:
+                    conn.execute(sql_text("RESET statement_timeout"))
+        from maintenance import record_build
+
+        record_build(self, name, only_missing=True)  # IF NOT EXISTS may have kept an older index
+        return name
+
+    def ensure_cascade_index(self, model: Optional[str], dim: int, truncate: Optional[int] = None) -> str:
+        """HNSW index on the vectors a cascade stage scans (model None: chunks.embedding).
+
+        Without it every stage is an exact scan and the fast stage is only
+        cheaper by the smaller vectors it compares. Returns the index name.
+        """
+        if model is None and not truncate:
+            return self.ensure_vector_index("hnsw", dim)
+        name = _cascade_index_name(model, truncate)
+        if model is None:
+            target, where = "chunks", ""
+        else:
+            target, where = "chunk_embeddings", " WHERE model = '" + model.replace("'", "''") + "'"
+        column = f"(embedding::vector({int(dim)}))"
+        if truncate:
+            column = f"(subvector(embedding, 1, {int(truncate)})::vector({int(truncate)}))"
+        with self.engine.begin() as conn:
+            conn.execute(
+                sql_text(
+                    f"CREATE INDEX IF NOT EXISTS {name} ON {target} USING hnsw ({column} vector_cosine_ops){where}"
+                )
+            )
+        return name
+
+    def _rank_chunks(
+        self,
+        session: Session,
+        query_embedding: Sequence[float],
+        model: Optional[str],
+        k: int,
+        truncate: Optional[int] = None,
+        chunk_ids: Optional[Sequence[int]] = None,
+        document_paths: Optional[Sequence[str]] = None,
+        phases: Optional[Sequence[str]] = None,
+        frameworks: Optional[Sequence[str]] = None,
+    ) -> List[Tuple[int, float]]:
+        """(chunk id, cosine distance) of the k nearest chunks by model's embeddings."""
+        vector = list(query_embedding[:truncate] if truncate else query_embedding)
+        distance = _embedding_expr(model, len(vector), truncate).cosine_distance(vector).label("distance")
+        if model is None:
+            q = session.query(Chunk.id, distance)
+        else:
+            q = session.query(ChunkEmbedding.chunk_id, distance).filter(ChunkEmbedding.model == model)
+        id_column = Chunk.id if model is None else ChunkEmbedding.chunk_id
+        if chunk_ids is not None:
+            q = q.filter(id_column.in_(list(chunk_ids)))
+        if document_paths or phases or frameworks:
+            scope = self._scoped_document_ids(phases, frameworks)
+            if document_paths:
+                scope = scope.where(Document.file_path.in_(list(document_paths)))
+            if model is not None:
+                q = q.join(Chunk, Chunk.id == ChunkEmbedding.chunk_id)
+            q = q.filter(Chunk.document_id.in_(scope), *self._partition_filter(frameworks))
+        return [(row[0], float(row[1])) for row in q.order_by(distance).limit(k).all()]
+
+    def _results_for(self, session: Session, ranked: Sequence[Tuple[int, float]]) -> List[SearchResult]:
+        rows = (
+            session.query(
+                Chunk.id, Chunk.text, Document.title, Document.file_path, Chunk.document_id,
+                Chunk.chunk_index, Chunk.page_start, Chunk.page_end, Document.content_hash,
+                Chunk.char_start, Chunk.char_end,
+            )
+            .join(Document, Chunk.document_id == Document.id)
+            .filter(Chunk.id.in_([chunk_id for chunk_id, _ in ranked]))
+            .all()
+        )
+        by_id = {row[0]: row for row in rows}
+        return self._fill_texts(session, [
+            SearchResult(
+                text=row[1],
+                document_title=row[2],
+                file_path=row[3],
+                distance=distance,
+                document_id=row[4],
+                chunk_index=row[5],
+                page_start=row[6],
+                page_end=row[7],
+                content_hash=row[8],
+                char_start=row[9],
+                char_end=row[10],
+            )
+            for row, distance in ((by_id.get(chunk_id), distance) for chunk_id, distance in ranked)
+            if row is not None
+        ])
+
+    def search_cascade(
+        self,
+        strong_query_embedding: List[float],
+        fast_query_embedding: Optional[List[float]] = None,
+        fast_model: Optional[str] = None,
+        strong_model: Optional[str] = None,
+        truncate: Optional[int] = None,
+        candidates: int = 100,
+        k: int = 6,
+        document_paths: Optional[Sequence[str]] = None,
+        phases: Optional[Sequence[str]] = None,
+        frameworks: Optional[Sequence[str]] = None,
+        measure_recall: bool = False,
+        read_your_writes: bool = False,
+    ) -> Tuple[List[SearchResult], CascadeStats]:
+        """Two-stage search: a cheap stage picks candidates, a stronger one re-scores only those.
+
+        Models are chunk_embeddings model names; None means chunks.embedding
+        (OLLAMA_EMBED_MODEL). The fast stage uses fast_model's embeddings,
+        truncated to their first truncate components when given (for
+        Matryoshka-trained models; needs pgvector 0.7 for subvector).
+        fast_query_embedding must come from the fast model and defaults to
+        strong_query_embedding for a truncation-only cascade on one model.
+        With measure_recall, also runs a single-stage strong-model search and
+        reports the overlap of the two top-k lists.
+        """
+        if fast_model == strong_model and not truncate:
+            raise ValueError("The fast stage needs a different model or a truncated dimension")
+        fast_query = fast_query_embedding if fast_query_embedding is not None else strong_query_embedding
+        scope = {"document_paths": document_paths, "phases": phases, "frameworks": frameworks}
+        with self.read_session(read_your_writes) as session:
+            started = time.perf_counter()
+            pool = self._rank_chunks(session, fast_query, fast_model, candidates, truncate=truncate, **scope)
+            fast_ms = (time.perf_counter() - started) * 1000
+            started = time.perf_counter()
+            ranked = self._rank_chunks(
+                session, strong_query_embedding, strong_model, k, chunk_ids=[chunk_id for chunk_id, _ in pool]
+            ) if pool else []
+            strong_ms = (time.perf_counter() - started) * 1000
+            stats = CascadeStats(
+                fast_stage=(fast_model or "primary") + (f"[:{truncate}]" if truncate else ""),
+                strong_stage=strong_model or "primary",
+                candidates=len(pool),
+                fast_ms=fast_ms,
+                strong_ms=strong_ms,
+            )
+            if measure_recall:
+                started = time.perf_counter()
+                reference = self._rank_chunks(session, strong_query_embedding, strong_model, k, **scope)
+                stats.reference_ms = (time.perf_counter() - started) * 1000
+                expected = {chunk_id for chunk_id, _ in reference}
+                found = {chunk_id for chunk_id, _ in ranked}
+                stats.recall = len(expected & found) / len(expected) if expected else 1.0
+            return self._results_for(session, ranked), stats
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Headless query server: one warm process shared by the app, the CLI and batch jobs.
+
+Keeps the database pool, the Ollama backend pool and a query-embedding cache
+hot, and does all database and Ollama I/O asynchronously, so many light front
+ends can share it.
+
+    python server.py [--host 127.0.0.1] [--port 8085]
+
+Point the clients at it with DM_SERVER_URL=http://127.0.0.1:8085: the
+Streamlit app's RAG path, `ollama.py` questions and `ollama.py --batch`
+(batch_qa.py) then send their questions here instead of opening their own
+database and Ollama pools.
+
+    POST /search  {"question": ..., "document_paths": [...], "phases": [...], "frameworks": [...],
+                   "k": 6, "group_by": null | "document" | "framework", "read_your_writes": false}
+    POST /ask     same fields plus "stream" (default true): NDJSON lines, first
+                  {"sources": [...]}, then {"response": "..."} tokens, then {"done": true, ...}
+    POST /ingest  {"paths": [...]}  queue PDFs for ingest_worker.py
+    GET  /ingest  recent ingestion jobs
+    GET  /health  Ollama host and database replica status
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import ClientSession, TCPConnector, web
+
+from context_compress import compress_results, format_context
+from ollama import OLLAMA_EMBED_MODEL, OLLAMA_KEEP_ALIVE, OLLAMA_MODEL
+from ollama_pool import get_pool
+from perf_ledger import record
+from rag_store import Document, RagStore, SearchResult
+
+SEARCH_CANDIDATES = 18  # chunks fetched for MMR, as in the app
+DISTANCE_MARGIN = 0.25
+PER_GROUP_K = 3
+ROUTE_DOCUMENTS = 8  # unscoped searches: documents picked by centroid first (0 = flat search)
+EMBED_CACHE_SIZE = 1024
+DB_POOL_SIZE = int(os.getenv("SERVER_DB_POOL_SIZE", "10"))
+GENERATE_CONCURRENCY = int(os.getenv("SERVER_GENERATE_CONCURRENCY", "4"))  # generations in flight at once
+
+
+@dataclass
+class QueryRequest:
+    question: str
+    document_paths: List[str] = field(default_factory=list)
+    phases: List[str] = field(default_factory=list)
+    frameworks: List[str] = field(default_factory=list)
+    k: int = 6
+    group_by: Optional[str] = None
+    stream: bool = True
+    read_your_writes: bool = False  # search the primary instead of a replica
+
+    @classmethod
+    def parse(cls, body: Dict) -> "QueryRequest":
+        try:
+            request = cls(**{name: body[name] for name in cls.__dataclass_fields__ if name in body})
+        except TypeError as e:
+            raise web.HTTPBadRequest(text=str(e))
+        if not isinstance(request.question, str) or not request.question.strip():
+            raise web.HTTPBadRequest(text="question is required")
+        if request.group_by not in (None, "document", "framework"):
+            raise web.HTTPBadRequest(text="group_by must be null, 'document' or 'framework'")
+        return request
+
+
+def _source(result: SearchResult) -> Dict:
+    return {
+        "document_title": result.document_title,
+        "file_path": result.file_path,
+        "page_start": result.page_start,
+        "page_end": result.page_end,
+        "distance": round(result.distance, 4),
+        "text": result.text,
+        "also_in": result.also_in,
+    }
+
+
+class QueryService:
+    def __init__(self, store: RagStore):
+        self.store = store
+        self.pool = get_pool()
+        self.http: Optional[ClientSession] = None
+        self.engines = []
+        self.Session = None
+        self.read_sessions = []
+        self._next_reader = 0
+        self.generate_slots = asyncio.Semaphore(GENERATE_CONCURRENCY)
+        self._embeddings: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    async def start(self, app: web.Application) -> None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        self.http = ClientSession(connector=TCPConnector(limit=0))
+        # The primary first, then the store's replicas (DATABASE_REPLICA_URLS)
+        for url in [self.store.database_url, *self.store.replica_urls]:
+            self.engines.append(create_async_engine(url, pool_size=DB_POOL_SIZE, pool_pre_ping=True))
+        sessions = [async_sessionmaker(engine, expire_on_commit=False) for engine in self.engines]
+        self.Session, self.read_sessions = sessions[0], sessions[1:]
+
+    async def stop(self, app: web.Application) -> None:
+        await self.http.close()
+        for engine in self.engines:
+            await engine.dispose()
+        self.pool.close()
+
+    def read_session(self, read_your_writes: bool = False):
+        """Like RagStore.read_session: replicas round-robin, the primary with read_your_writes."""
+        if read_your_writes or not self.read_sessions:
+            return self.Session()
+        self._next_reader = (self._next_reader + 1) % len(self.read_sessions)
+        return self.read_sessions[self._next_reader]()
+
+    async def embed(self, text: str) -> List[float]:
+        cached = self._embeddings.get(text)
+        if cached is not None:
+            self._embeddings.move_to_end(text)
+            return cached
+        body = await self.pool.apost(self.http, "/api/embed", {"model": OLLAMA_EMBED_MODEL, "input": [text]})
+        embedding = body["embeddings"][0]
+        self._embeddings[text] = embedding
+        if len(self._embeddings) > EMBED_CACHE_SIZE:
+            self._embeddings.popitem(last=False)
+        return embedding
+
+    async def retrieve(self, request: QueryRequest) -> Tuple[List[SearchResult], Dict]:
+        started = time.perf_counter()
+        query_embedding = await self.embed(request.question)
+        embedded = time.perf_counter()
+
+        def search(session) -> List[SearchResult]:
+            # RagStore's query code, run on the async connection
+            if request.group_by:
+                document_ids = None
+                if request.document_paths:
+                    rows = session.query(Document.id).filter(Document.file_path.in_(request.document_paths))
+                    document_ids = [row[0] for row in rows]
+                grouped = self.store._search_grouped_in_session(
+                    session, query_embedding, document_ids, PER_GROUP_K, request.group_by,
+                    request.phases, request.frameworks,
+                )
+                return [result for group in grouped.values() for result in group]
+            k = max(SEARCH_CANDIDATES, 3 * request.k)
+            if not request.document_paths and ROUTE_DOCUMENTS:
+                return self.store._search_routed_in_session(
+                    session, query_embedding, k, ROUTE_DOCUMENTS, "document", True, request.phases, request.frameworks,
+                )[0]
+            return self.store._search_in_session(
+                session, query_embedding, request.document_paths, k, True, request.phases, request.frameworks,
+            )
+
+        async with self.read_session(request.read_your_writes) as session:
+            results = await session.run_sync(search)
+        searched = time.perf_counter()
+        stats: Dict = {"embed_ms": (embedded - started) * 1000, "search_ms": (searched - embedded) * 1000}
+        if not request.group_by:
+            results, compression = compress_results(
+                query_embedding, results, k=request.k, distance_margin=DISTANCE_MARGIN
+            )
+            stats.update(asdict(compression), tokens_saved=compression.tokens_saved)
+        return results, stats
+
+    # ---- handlers ----
+
+    async def handle_search(self, http_request: web.Request) -> web.Response:
+        request = QueryRequest.parse(await http_request.json())
+        results, stats = await self.retrieve(request)
+        return web.json_response({"results": [_source(r) for r in results], "stats": stats})
+
+    async def handle_ask(self, http_request: web.Request) -> web.StreamResponse:
+        request = QueryRequest.parse(await http_request.json())
+        results, stats = await self.retrieve(request)
+        payload = {
+            "model": OLLAMA_MODEL,
+            "prompt": f"{format_context(results)}\n\nQuestion: {request.question}\nAnswer:",
+            "stream": request.stream,
+            "keep_alive": OLLAMA_KEEP_ALIVE,
+        }
+        sources = [_source(r) for r in results]
+        async with self.generate_slots:
+            if not request.stream:
+                body = await self.pool.apost(self.http, "/api/generate", payload)
+                record(body, OLLAMA_MODEL, "server-rag", len(payload["prompt"]))
+                return web.json_response({"answer": body.get("response", "").strip(), "sources": sources, "stats": stats})
+            response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+            await response.prepare(http_request)
+            await response.write(json.dumps({"sources": sources, "stats": stats}).encode() + b"\n")
+            async for part in self.pool.astream(self.http, "/api/generate", payload):
+                if part.get("done"):
+                    record(part, OLLAMA_MODEL, "server-rag", len(payload["prompt"]))
+                    metrics = {key: part.get(key) for key in ("eval_count", "eval_duration", "prompt_eval_count", "prompt_eval_duration")}
+                    await response.write(json.dumps({"done": True, **metrics}).encode() + b"\n")
+                else:
+                    await response.write(json.dumps({"response": part.get("response", "")}).encode() + b"\n")
+            await response.write_eof()
+            return response
+
+    async def handle_enqueue(self, http_request: web.Request) -> web.Response:
+        paths = (await http_request.json()).get("paths") or []
+        if not isinstance(paths, list) or not all(isinstance(p, str) for p in paths):
+            raise web.HTTPBadRequest(text="paths must be a list of file paths")
+        job_ids = await asyncio.to_thread(self.store.enqueue_ingest, paths)
+        return web.json_response({"job_ids": job_ids})
+
+    async def handle_jobs(self, http_request: web.Request) -> web.Response:
+        limit = int(http_request.query.get("limit", "20"))
+        jobs = await asyncio.to_thread(self.store.ingest_job_status, None, limit)
+        return web.json_response({"jobs": [{**asdict(job), "progress": job.progress} for job in jobs]})
+
+    async def handle_health(self, http_request: web.Request) -> web.Response:
+        replicas = await asyncio.to_thread(self.store.replica_status)
+        return web.json_response(
+            {"ok": True, "ollama": self.pool.status(), "replicas": replicas, "cached_embeddings": len(self._embeddings)}
+        )
+
+
+def build_app(store: Optional[RagStore] = None) -> web.Application:
+    store = store or RagStore()
+    store.ensure_schema()
+    service = QueryService(store)
+    app = web.Application()
+    app.on_startup.append(service.start)
+    app.on_cleanup.append(service.stop)
+    app.add_routes(
+        [
+            web.post("/search", service.handle_search),
+            web.post("/ask", service.handle_ask),
+            web.post("/ingest", service.handle_enqueue),
+            web.get("/ingest", service.handle_jobs),
+            web.get("/health", service.handle_health),
+        ]
+    )
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("DM_SERVER_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("DM_SERVER_PORT", "8085")))
+    args = parser.parse_args()
+    web.run_app(build_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Portable RagStore snapshots.
+
+A snapshot is a directory of compressed columnar .npz files plus a manifest:
+
+    manifest.json    format version, embedding model and dimension, row counts,
+                     SHA-256 of every data file
+    documents.npz    one array per documents column
+    tags.npz         document_tags (document index, kind, value)
+    chunks.npz       chunk columns; stored texts as one UTF-8 blob plus offsets
+                     (empty for offset-only chunks, which slice their document text)
+    document_texts.npz  document_texts rows; the zlib texts as one blob plus offsets
+    embeddings.npz   float32 matrix, one row per chunk
+    chunk_embeddings.npz  embeddings by additional models (search_cascade), flattened
+
+Import verifies the checksums and the embedding model/dimension (against
+the environment and any chunks already stored), then streams
+chunks into Postgres with COPY in batches, so a new environment becomes
+query-ready without calling the embedding model.
+
+    python snapshot.py export snapshots/2026-10-18
+    python snapshot.py import snapshots/2026-10-18 [--replace]
+"""
+
+import argparse
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+
+FORMAT_VERSION = 2  # 2: document_texts.npz, chunk_embeddings.npz and offset-only chunks
+READABLE_VERSIONS = (1, 2)
+COPY_BATCH_ROWS = 5000
+
+
+class SnapshotError(RuntimeError):
+    pass
+
+
+def _sha256(path: Path) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(1024 * 1024), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def _pack_texts(texts) -> Dict[str, np.ndarray]:
+    return _pack_bytes(t.encode("utf-8") for t in texts)
+
+
+def _pack_bytes(items) -> Dict[str, np.ndarray]:
+    encoded = list(items)
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return {"blob": np.frombuffer(b"".join(encoded), dtype=np.uint8), "offsets": offsets}
+
+
+def _unpack_text(blob: np.ndarray, offsets: np.ndarray, i: int) -> str:
+    return _unpack_bytes(blob, offsets, i).decode("utf-8")
+
+
+def _unpack_bytes(blob: np.ndarray, offsets: np.ndarray, i: int) -> bytes:
+    return blob[offsets[i]:offsets[i + 1]].tobytes()
+
+
+def _int_column(values) -> np.ndarray:
+    """Nullable integers as int64 with -1 for NULL."""
+    return np.asarray([-1 if v is None else v for v in values], dtype=np.int64)
+
+
+def _nullable(value: int) -> Optional[int]:
+    return None if value < 0 else int(value)
+
+
+def export_snapshot(store, out_dir: str, embed_model: Optional[str] = None) -> Dict:
+    """Write every document, tag, chunk and embedding in store to out_dir; returns the manifest.
+
+    Offset-only chunks stay offset-only: their document texts are exported
+    compressed as stored, so a snapshot can be re-chunked after import.
+    """
+    from rag_store import Chunk, ChunkEmbedding, Document, DocumentTag, DocumentText
+
+    if embed_model is None:
+        from ollama import OLLAMA_EMBED_MODEL as embed_model
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    with store.SessionLocal() as session:
+        documents = session.query(Document).order_by(Document.id).all()
+        position = {doc.id: i for i, doc in enumerate(documents)}
+        np.savez_compressed(
+            out / "documents.npz",
+            title=np.asarray([d.title for d in documents]),
+            file_path=np.asarray([d.file_path for d in documents]),
+            content_hash=np.asarray([d.content_hash for d in documents]),
+            framework=np.asarray([d.framework or "" for d in documents]),
+        )
+        tags = session.query(DocumentTag.document_id, DocumentTag.kind, DocumentTag.value).order_by(DocumentTag.id).all()
+        np.savez_compressed(
+            out / "tags.npz",
+            document=np.asarray([position[t[0]] for t in tags], dtype=np.int64),
+            kind=np.asarray([t[1] for t in tags]),
+            value=np.asarray([t[2] for t in tags]),
+        )
+        rows = (
+            session.query(
+                Chunk.document_id, Chunk.chunk_index, Chunk.text, Chunk.token_count, Chunk.embedding,
+                Chunk.char_start, Chunk.char_end, Chunk.page_start, Chunk.page_end, Chunk.id,
+            )
+            .order_by(Chunk.document_id, Chunk.chunk_index)
+            .all()
+        )
+        chunk_position = {row[9]: i for i, row in enumerate(rows)}
+        extra = (
+            session.query(ChunkEmbedding.chunk_id, ChunkEmbedding.model, ChunkEmbedding.dim, ChunkEmbedding.embedding)
+            .order_by(ChunkEmbedding.model, ChunkEmbedding.chunk_id)
+            .all()
+        )
+        np.savez_compressed(
+            out / "chunk_embeddings.npz",
+            chunk=np.asarray([chunk_position[e[0]] for e in extra], dtype=np.int64),
+            model=np.asarray([e[1] for e in extra]),
+            dim=np.asarray([e[2] for e in extra], dtype=np.int64),
+            values=np.asarray([x for e in extra for x in e[3]], dtype=np.float32),
+        )
+        document_texts = session.query(DocumentText).order_by(DocumentText.document_id).all()
+        zipped = _pack_bytes(t.text_zlib for t in document_texts)
+        np.savez_compressed(
+            out / "document_texts.npz",
+            document=np.asarray([position[t.document_id] for t in document_texts], dtype=np.int64),
+            content_hash=np.asarray([t.content_hash for t in document_texts]),
+            chars=np.asarray([t.chars for t in document_texts], dtype=np.int64),
+            page_counts=np.asarray([len(t.page_offsets) for t in document_texts], dtype=np.int64),
+            page_offsets=np.asarray([o for t in document_texts for o in t.page_offsets], dtype=np.int64),
+            zlib_blob=zipped["blob"],
+            zlib_offsets=zipped["offsets"],
+        )
+    embeddings = np.asarray([row[4] for row in rows], dtype=np.float32)
+    dim = int(embeddings.shape[1]) if len(rows) else 0
+    texts = _pack_texts(row[2] or "" for row in rows)
+    np.savez_compressed(
+        out / "chunks.npz",
+        document=np.asarray([position[row[0]] for row in rows], dtype=np.int64),
+        chunk_index=np.asarray([row[1] for row in rows], dtype=np.int64),
+        token_count=np.asarray([row[3] for row in rows], dtype=np.int64),
+        char_start=_int_column(row[5] for row in rows),
+        char_end=_int_column(row[6] for row in rows),
+        page_start=_int_column(row[7] for row in rows),
+        page_end=_int_column(row[8] for row in rows),
+        has_text=np.asarray([row[2] is not None for row in rows], dtype=bool),
+        text_blob=texts["blob"],
+        text_offsets=texts["offsets"],
+    )
+    np.savez_compressed(out / "embeddings.npz", embeddings=embeddings)
+
+    files = ["documents.npz", "tags.npz", "chunks.npz", "document_texts.npz", "embeddings.npz", "chunk_embeddings.npz"]
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "embed_model": embed_model,
+        "embedding_dim": dim,
+        "cascade_models": dict(sorted({e[1]: e[2] for e in extra}.items())),
+        "counts": {
+            "documents": len(documents), "tags": len(tags), "chunks": len(rows), "document_texts": len(document_texts),
+            "chunk_embeddings": len(extra),
+        },
+        "files": {name: _sha256(out / name) for name in files},
+    }
+    (out / "manifest.json").write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+def read_manifest(in_dir: str, verify: bool = True) -> Dict:
+    path = Path(in_dir)
+    manifest = json.loads((path / "manifest.json").read_text())
+    if manifest.get("format_version") not in READABLE_VERSIONS:
+        raise SnapshotError(f"Unsupported snapshot format {manifest.get('format_version')}, expected {FORMAT_VERSION}")
+    if verify:
+        for name, expected in manifest["files"].items():
+            if _sha256(path / name) != expected:
+                raise SnapshotError(f"Checksum mismatch for {name}; the snapshot is corrupt or incomplete")
+    return manifest
+
+
+def import_snapshot(
+    store,
+    in_dir: str,
+    embed_model: Optional[str] = None,
+    replace: bool = False,
+    progress=print,
+) -> Dict[str, int]:
+    """Load a snapshot into store.
+
+    Documents already present with the same content hash are kept as they are
+    unless replace is set; documents with a different hash are replaced.
+    Raises SnapshotError when checksums or the embedding model do not match,
+    or when the store already holds embeddings of another dimension.
+    Version 1 snapshots, which have no document texts, load with every chunk
+    text stored.
+    """
+    from rag_store import Document, DocumentTag, DocumentText
+
+    if embed_model is None:
+        from ollama import OLLAMA_EMBED_MODEL as embed_model
+    manifest = read_manifest(in_dir)
+    if manifest["embed_model"] != embed_model:
+        raise SnapshotError(
+            f"Snapshot embeddings come from {manifest['embed_model']!r} but this environment embeds queries "
+            f"with {embed_model!r}; set OLLAMA_EMBED_MODEL to match"
+        )
+    path = Path(in_dir)
+    # Materialize the columns once; indexing an NpzFile re-reads the member every time
+    documents = dict(np.load(path / "documents.npz"))
+    tags = dict(np.load(path / "tags.npz"))
+    chunks = dict(np.load(path / "chunks.npz"))
+    if "has_text" not in chunks:
+        chunks["has_text"] = np.ones(len(chunks["document"]), dtype=bool)
+    texts_path = path / "document_texts.npz"
+    document_texts = dict(np.load(texts_path)) if texts_path.exists() else {"document": np.zeros(0, dtype=np.int64)}
+    embeddings = np.load(path / "embeddings.npz")["embeddings"]
+    extra_path = path / "chunk_embeddings.npz"
+    extra = dict(np.load(extra_path)) if extra_path.exists() else {"chunk": np.zeros(0, dtype=np.int64)}
+    store.ensure_schema()
+    stored_dim = store.embedding_dim()
+    if stored_dim is not None and manifest["embedding_dim"] and stored_dim != manifest["embedding_dim"]:
+        raise SnapshotError(
+            f"Snapshot embeddings have {manifest['embedding_dim']} dimensions but the store's chunks have {stored_dim}; "
+            "import into an empty database or one embedded with the same model"
+        )
+
+    # Documents first, so chunks can be mapped to their new ids
+    new_ids: Dict[int, int] = {}
+    with store.SessionLocal() as session:
+        for i, file_path in enumerate(documents["file_path"]):
+            file_path = str(file_path)
+            content_hash = str(documents["content_hash"][i])
+            doc = store.get_document_by_path(session, file_path)
+            if doc is not None:
+                if doc.content_hash == content_hash and not replace:
+                    continue
+                session.delete(doc)
+                session.flush()
+            doc = Document(
+                title=str(documents["title"][i]),
+                file_path=file_path,
+                content_hash=content_hash,
+                framework=str(documents["framework"][i]) or None,
+            )
+            session.add(doc)
+            session.flush()
+            new_ids[i] = doc.id
+        for document, kind, value in zip(tags["document"], tags["kind"], tags["value"]):
+            if int(document) in new_ids:
+                session.add(DocumentTag(document_id=new_ids[int(document)], kind=str(kind), value=str(value)))
+        page_ends = np.cumsum(document_texts.get("page_counts", np.zeros(0, dtype=np.int64)))
+        for i, document in enumerate(document_texts["document"]):
+            if int(document) not in new_ids:
+                continue
+            session.add(
+                DocumentText(
+                    document_id=new_ids[int(document)],
+                    content_hash=str(document_texts["content_hash"][i]),
+                    chars=int(document_texts["chars"][i]),
+                    page_offsets=[
+                        int(o) for o in document_texts["page_offsets"][page_ends[i] - document_texts["page_counts"][i]:page_ends[i]]
+                    ],
+                    text_zlib=_unpack_bytes(document_texts["zlib_blob"], document_texts["zlib_offsets"], i),
+                )
+            )
+        session.commit()
+
+    columns = "document_id, chunk_index, text, token_count, embedding, char_start, char_end, page_start, page_end, framework"
+    loaded = 0
+    started = time.perf_counter()
+    raw = store.engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        wanted = np.flatnonzero(np.isin(chunks["document"], list(new_ids)))
+        for start in range(0, len(wanted), COPY_BATCH_ROWS):
+            with cursor.copy(f"COPY chunks ({columns}) FROM STDIN") as copy:
+                for i in wanted[start:start + COPY_BATCH_ROWS]:
+                    copy.write_row(
+                        (
+                            new_ids[int(chunks["document"][i])],
+                            int(chunks["chunk_index"][i]),
+                            _unpack_text(chunks["text_blob"], chunks["text_offsets"], i) if chunks["has_text"][i] else None,
+                            int(chunks["token_count"][i]),
+                            "[" + ",".join(repr(float(x)) for x in embeddings[i]) + "]",
+                            _nullable(chunks["char_start"][i]),
+                            _nullable(chunks["char_end"][i]),
+                            _nullable(chunks["page_start"][i]),
+                            _nullable(chunks["page_end"][i]),
+                            str(documents["framework"][int(chunks["document"][i])]) or None,
+                        )
+                    )
+            raw.commit()
+            loaded += len(wanted[start:start + COPY_BATCH_ROWS])
+            if progress:
+                elapsed = time.perf_counter() - started
+                progress(f"Loaded {loaded}/{len(wanted)} chunks ({loaded / elapsed:.0f} rows/s)")
+        extra_loaded = _copy_chunk_embeddings(raw, cursor, extra, chunks, new_ids)
+    finally:
+        raw.close()
+    from maintenance import after_bulk_ingest
+
+    store.refresh_centroids(list(new_ids.values()))
+    store.hash_bodies(list(new_ids.values()))
+    after_bulk_ingest(store)
+    return {
+        "documents": len(new_ids),
+        "chunks": loaded,
+        "chunk_embeddings": extra_loaded,
+        "skipped_documents": len(documents["file_path"]) - len(new_ids),
+    }
+
+
+def _copy_chunk_embeddings(raw, cursor, extra: Dict[str, np.ndarray], chunks: Dict[str, np.ndarray], new_ids: Dict[int, int]) -> int:
+    """COPY the additional-model embeddings of the imported chunks, found by (document, chunk index)."""
+    if not len(extra["chunk"]) or not new_ids:
+        return 0
+    cursor.execute("SELECT document_id, chunk_index, id FROM chunks WHERE document_id = ANY(%s)", (list(new_ids.values()),))
+    chunk_ids = {(row[0], row[1]): row[2] for row in cursor.fetchall()}
+    ends = np.cumsum(extra["dim"])
+    loaded = 0
+    with cursor.copy("COPY chunk_embeddings (chunk_id, model, dim, embedding) FROM STDIN") as copy:
+        for i, position in enumerate(extra["chunk"]):
+            document = int(chunks["document"][position])
+            if document not in new_ids:
+                continue
+            dim = int(extra["dim"][i])
+            vector = extra["values"][ends[i] - dim:ends[i]]
+            copy.write_row(
+                (
+                    chunk_ids[(new_ids[document], int(chunks["chunk_index"][position]))],
+                    str(extra["model"][i]),
+                    dim,
+                    "[" + ",".join(repr(float(x)) for x in vector) + "]",
+                )
+            )
+            loaded += 1
+    raw.commit()
+    return loaded
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["export", "import", "verify"])
+    parser.add_argument("path", help="Snapshot directory.")
+    parser.add_argument("--replace", action="store_true", help="On import, replace documents that already exist.")
+    args = parser.parse_args()
+
+    if args.command == "verify":
+        manifest = read_manifest(args.path)
+        cascade = "".join(f", {model} ({dim} dims)" for model, dim in manifest.get("cascade_models", {}).items())
+        print(f"OK: {manifest['counts']} embedded with {manifest['embed_model']} ({manifest['embedding_dim']} dims){cascade}")
+        return
+
+    from rag_store import RagStore
+
+    store = RagStore()
+    if args.command == "export":
+        store.ensure_schema()
+        manifest = export_snapshot(store, args.path)
+        print(f"Exported {manifest['counts']} to {args.path}")
+    else:
+        started = time.perf_counter()
+        counts = import_snapshot(store, args.path, replace=args.replace)
+        print(f"Imported {counts} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
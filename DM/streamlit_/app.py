@@ -1,25 +1,41 @@
 import glob
+import importlib.util
 import streamlit as st
 import os
-import requests
 import base64
 import math
 from pathlib import Path
 from typing import List
-import re
 
+# Helper modules are optional: without them the app falls back to a plain PDF list and no workflow metadata
 try:
-    from rag_store import RagStore
-    from ollama import embed_texts
-    RAG_AVAILABLE = True
+    from catalog import catalog_signature, load_catalog
+    CATALOG_AVAILABLE = True
+except Exception:
+    CATALOG_AVAILABLE = False
+try:
+    from workflow_meta import get_workflow_usage_for, load_workflow
+    WORKFLOW_AVAILABLE = True
 except Exception:
-    RAG_AVAILABLE = False
+    WORKFLOW_AVAILABLE = False
+
+# DB, PDF and HTTP dependencies are imported on first use, so the first paint
+# only pays for streamlit itself. Check availability without importing.
+RAG_AVAILABLE = all(importlib.util.find_spec(name) is not None for name in ("sqlalchemy", "pgvector", "requests"))
+# With a running server.py, RAG questions are answered there (warm pools and caches shared with the CLI and batch jobs)
+SERVER_URL = os.getenv("DM_SERVER_URL")
 
-OLLAMA_API_URL = "http://localhost:11434/api/generate"
 OLLAMA_MODEL = "phi3:latest"
 MAX_CHUNK_SIZE = 20000  # Increased for Phi-3's context window
 MAX_TOTAL_CHUNKS = 5    # Allow more chunks
 TOKEN_ESTIMATE_RATIO = 4 # Rough estimate of characters per token
+RAG_TOP_K = 6  # Chunks kept for the prompt after compression
+RAG_CANDIDATES = 18  # Chunks fetched for MMR to choose from
+RAG_DISTANCE_MARGIN = 0.25  # Drop candidates this much further than the best hit (adaptive k)
+RAG_PER_GROUP_K = 3  # Chunks per document or framework in multi-document search
+RAG_ROUTE_DOCUMENTS = 8  # Corpus-wide search: documents picked by centroid before the chunk search (0 = flat)
+SESSION_NUM_CTX = 8192  # Context window requested for conversation mode
+SESSION_CONTEXT_CHARS = 24000  # Stable document prefix, leaves room for follow-ups within SESSION_NUM_CTX
 
 def chunk_text(text, chunk_size=MAX_CHUNK_SIZE):
     """Split text into larger chunks, respecting Phi-3's context window."""
@@ -58,112 +74,14 @@ def chunk_text(text, chunk_size=MAX_CHUNK_SIZE):
     chunk_size = math.ceil(len(chunks) / MAX_TOTAL_CHUNKS)
     return [''.join(chunks[i:i + chunk_size]) for i in range(0, len(chunks), chunk_size)]
 
-def list_files(startpath): #Files can be changed 
-    tree = ""
-    for root, dirs, files in os.walk(startpath):
-        level = root.replace(startpath, '').count(os.sep)
-        indent = ' ' * 4 * level
-        tree += f"{indent}📁 {os.path.basename(root)}/\n"
-        subindent = ' ' * 4 * (level + 1)
-        for f in files:
-            tree += f"{subindent}📄 {f}\n"
-    return tree
-
-def list_pdfs(startpath):
-    pdfs = []
-    for root, dirs, files in os.walk(startpath):
-        for f in files:
-            if f.lower().endswith('.pdf'):
-                pdfs.append(os.path.abspath(os.path.join(root, f)))
-    return pdfs
-
 def get_pdf_text(pdf_path):
-    from PyPDF2 import PdfReader
-    reader = PdfReader(pdf_path)
-    text = ""
-    for page in reader.pages:
-        text += page.extract_text() or ""
-    return text
-
-# -------- Workflow usage helpers (reads workflow.md without modifying it) --------
-_WORKFLOW_USAGE_CACHE = None
-
-def _sanitize(name: str) -> str:
-    return re.sub(r"[^a-z0-9]+", "", name.lower())
+    from pdf_extract import extract_text
+    return extract_text(pdf_path)
 
-def _load_workflow_usage(repo_root: Path):
-    global _WORKFLOW_USAGE_CACHE
-    if _WORKFLOW_USAGE_CACHE is not None:
-        return _WORKFLOW_USAGE_CACHE
-    # The file in repo is named with a trailing space: "workflow.md "
-    workflow_path = repo_root / "workflow.md "
-    usage_map = {}
-    doc_to_phases = {}
-    if workflow_path.exists():
-        text = workflow_path.read_text(encoding="utf-8", errors="ignore")
-        lines = text.splitlines()
-        current_doc = None
-        current_info = {}
-        # First pass: document sections
-        for line in lines:
-            m = re.match(r"^###\s+\d+\.\s+(.*\.pdf)\s*$", line)
-            if m:
-                if current_doc and current_info:
-                    usage_map[_sanitize(current_doc)] = current_info
-                current_doc = m.group(1).strip()
-                current_info = {"focus": None, "key_areas": None, "standards": None}
-                continue
-            if current_doc:
-                if line.strip().lower().startswith("- **focus**:"):
-                    current_info["focus"] = line.split(":", 1)[1].strip()
-                elif line.strip().lower().startswith("- **key areas**:"):
-                    current_info["key_areas"] = line.split(":", 1)[1].strip()
-                elif line.strip().lower().startswith("- **standards covered**:"):
-                    current_info["standards"] = line.split(":", 1)[1].strip()
-        if current_doc and current_info:
-            usage_map[_sanitize(current_doc)] = current_info
-        # Second pass: phases -> primary documents
-        phase = None
-        for i, line in enumerate(lines):
-            if line.startswith("### Phase "):
-                phase = line.replace("### ", "").strip()
-            if "**Primary Documents**" in line and phase:
-                # Extract comma-separated list after the colon
-                raw = line.split(":", 1)[1]
-                docs = [d.strip() for d in re.split(r",|;", raw) if d.strip()]
-                for d in docs:
-                    key = _sanitize(d)
-                    doc_to_phases.setdefault(key, set()).add(phase)
-    _WORKFLOW_USAGE_CACHE = (usage_map, doc_to_phases)
-    return _WORKFLOW_USAGE_CACHE
-
-def get_workflow_usage_for(repo_root: Path, file_path: str):
-    usage_map, doc_to_phases = _load_workflow_usage(repo_root)
-    base = os.path.basename(file_path)
-    s = _sanitize(base)
-    # find best match by substring
-    best_key = None
-    for key in usage_map.keys():
-        if key in s or s in key:
-            best_key = key
-            break
-    if not best_key:
-        # Try fuzzy by dropping years/spaces
-        tokens = re.findall(r"[a-z0-9]+", s)
-        for key in usage_map.keys():
-            if all(tok in key for tok in tokens[:3]):
-                best_key = key
-                break
-    if not best_key:
-        return None
-    info = usage_map.get(best_key, {})
-    phases = sorted(doc_to_phases.get(best_key, []))
-    return {"focus": info.get("focus"), "key_areas": info.get("key_areas"), "standards": info.get("standards"), "phases": phases}
-
-# ----------------------------------------------------------------------------
 
 def ask_ollama(question, context=""):
     """Process Ollama requests with improved error handling."""
+    from ollama import generate  # records each call in the performance ledger
     if not context:
         return process_single_request(question)
 
@@ -176,16 +94,12 @@ def ask_ollama(question, context=""):
     for i, chunk in enumerate(chunks):
         st.info(f"Processing chunk {i+1}/{total_chunks}, length: {len(chunk)}")
         try:
-            response = requests.post(
-                OLLAMA_API_URL,
-                json={
-                    "prompt": f"Context:\n{chunk}\n\nQuestion: {question}\nAnswer based on this context:",
-                    "stream": False
-                },
-                timeout=120
+            data = generate(
+                f"Context:\n{chunk}\n\nQuestion: {question}\nAnswer based on this context:",
+                model=OLLAMA_MODEL,
+                path="rag",
             )
-            response.raise_for_status()
-            chunk_response = response.json().get("response", "").strip()
+            chunk_response = data.get("response", "").strip()
             if chunk_response:
                 responses.append(chunk_response)
                 st.info(f"Successfully processed chunk {i+1}/{total_chunks}")
@@ -203,34 +117,33 @@ def ask_ollama(question, context=""):
                 f"\n\nProvide a concise answer to the question: {question}"
             )
             
-            final_response = requests.post(
-                OLLAMA_API_URL,
-                json={
-                    "prompt": summary_prompt,
-                    "stream": False
-                }
-            )
-            final_response.raise_for_status()
-            return final_response.json().get("response", "").strip()
+            data = generate(summary_prompt, model=OLLAMA_MODEL, path="rag-combine")
+            return data.get("response", "").strip()
         except Exception as e:
             return f"Error in final summary: {str(e)}"
     else:
         return "Could not process context. Please try a shorter document or rephrase your question."
 
+def answer_from_summaries(pdf_path, question):
+    """Answer from the PDF's map-reduce summary tree; nodes cached by earlier questions are reused."""
+    from summarize import answer_from_tree, build_summary_tree
+    try:
+        with st.spinner("Summarizing document (cached after the first question)..."):
+            tree = build_summary_tree(pdf_path, model=OLLAMA_MODEL, progress=st.info)
+        st.info(
+            f"Summary tree: {len(tree.levels)} levels, {tree.cached_nodes} nodes from cache, "
+            f"{tree.computed_nodes} computed (num_ctx {tree.num_ctx})"
+        )
+        return answer_from_tree(question, tree)
+    except Exception as e:
+        return f"Error querying Ollama: {e}"
+
 def process_single_request(question):
     """Process a single question without context."""
+    from ollama import generate
     try:
-        response = requests.post(
-            OLLAMA_API_URL,
-            json={
-                "model": OLLAMA_MODEL,
-                "prompt": f"Question: {question}\nAnswer:",
-                "stream": False
-            },
-            timeout=120
-        )
-        response.raise_for_status()
-        return response.json()["response"].strip()
+        data = generate(f"Question: {question}\nAnswer:", model=OLLAMA_MODEL, path="direct")
+        return data["response"].strip()
     except Exception as e:
         return f"Error querying Ollama: {e}"
 
@@ -240,9 +153,16 @@ st.title("The Data Management Assistant")
 REPO_ROOT = Path(__file__).resolve().parents[1]
 BASE_DOCS_DIR = REPO_ROOT / "it-management-and-audit-source-main"
 
-if BASE_DOCS_DIR.exists():
-    tree_str = list_files(str(BASE_DOCS_DIR))
-    pdf_files = list_pdfs(str(BASE_DOCS_DIR))
+@st.cache_data
+def get_catalog(docs_dir: str, signature: tuple):
+    # signature is only part of the cache key: a changed docs tree misses the cache
+    return load_catalog(docs_dir)
+
+if BASE_DOCS_DIR.exists() and CATALOG_AVAILABLE:
+    tree_str, pdf_files = get_catalog(str(BASE_DOCS_DIR), tuple(catalog_signature(str(BASE_DOCS_DIR))))
+elif BASE_DOCS_DIR.exists():
+    pdf_files = sorted(glob.glob(os.path.join(str(BASE_DOCS_DIR), "**", "*.pdf"), recursive=True))
+    tree_str = "\n".join(os.path.relpath(path, BASE_DOCS_DIR) for path in pdf_files) + "\n"
 else:
     tree_str = f"Directory not found: {BASE_DOCS_DIR}"
     pdf_files = []
@@ -258,7 +178,7 @@ if selected_pdf and selected_pdf != "None":
         pdf_display = f'<iframe src="data:application/pdf;base64,{base64_pdf}" width="700" height="900" type="application/pdf"></iframe>'
         st.markdown(pdf_display, unsafe_allow_html=True)
     with col_info:
-        usage = get_workflow_usage_for(REPO_ROOT, selected_pdf)
+        usage = get_workflow_usage_for(selected_pdf) if WORKFLOW_AVAILABLE else None
         st.subheader("Workflow usage")
         if usage:
             if usage.get("focus"):
@@ -275,51 +195,255 @@ if selected_pdf and selected_pdf != "None":
 question = st.text_input("Enter your question for Ollama:")
 
 use_rag = st.checkbox("Use pgvector retrieval (RAG)", value=False, help="Requires Postgres + pgvector and an Ollama embedding model.")
+phase_filter: List[str] = []
+framework_filter: List[str] = []
+compare_pdfs: List[str] = []
+group_by = None
+if use_rag:
+    compare_pdfs = st.multiselect(
+        "Search across documents",
+        pdf_files,
+        format_func=os.path.basename,
+        help="Retrieves the best passages from each selected document, so one large document cannot crowd out the others.",
+    )
+    group_by = st.radio(
+        "Top passages per",
+        ["overall", "document", "framework"],
+        horizontal=True,
+        help="'document' and 'framework' return the best passages of every document or framework in one search.",
+    )
+    if group_by == "overall":
+        group_by = "document" if compare_pdfs else None
+    col_phase, col_framework = st.columns(2)
+    with col_phase:
+        phases = sorted(load_workflow()[1].keys()) if WORKFLOW_AVAILABLE else []
+        phase_filter = st.multiselect("Limit retrieval to workflow phases", phases)
+    with col_framework:
+        framework_options = sorted(p.name for p in BASE_DOCS_DIR.iterdir() if p.is_dir()) if BASE_DOCS_DIR.exists() else []
+        framework_filter = st.multiselect("Limit retrieval to frameworks", framework_options)
+
+conversation_mode = st.checkbox(
+    "Conversation mode (reuse document context between follow-ups)",
+    value=False,
+    help="Sends the selected PDF once and keeps Ollama's KV context, so follow-up questions only evaluate the new tokens.",
+)
+
+@st.cache_resource
+def get_store():
+    """One RagStore (and connection pool) per server process."""
+    from rag_store import RagStore
+    store = RagStore()
+    store.ensure_schema()
+    return store
+
+def show_citations(results):
+    """List retrieved passages with a small image of the page each one starts on."""
+    if not results:
+        return
+    from page_preview import preview_available, render_page
+    with st.expander(f"Sources ({len(results)})"):
+        can_preview = preview_available()
+        for r in results:
+            pages = ""
+            if r.page_start:
+                pages = f", p. {r.page_start}" if r.page_end in (None, r.page_start) else f", pp. {r.page_start}-{r.page_end}"
+            st.markdown(f"**{r.document_title}**{pages} (distance {r.distance:.3f})")
+            if can_preview and r.page_start:
+                try:
+                    st.image(str(render_page(r.file_path, r.page_start, content_hash=r.content_hash)))
+                except Exception as e:
+                    st.caption(f"Preview unavailable: {e}")
+            st.caption(r.text[:300])
+
+def get_document_session(pdf_path):
+    """Return the conversation session for pdf_path, starting a new one when the selection changes."""
+    from ollama import DocumentSession
+    session = st.session_state.get("document_session")
+    if session is None or session.document_key != pdf_path:
+        context_text = get_pdf_text(pdf_path)[:SESSION_CONTEXT_CHARS]
+        session = DocumentSession(pdf_path, context_text, model=OLLAMA_MODEL, num_ctx=SESSION_NUM_CTX)
+        st.session_state["document_session"] = session
+    return session
 
 if st.button("Ask Ollama"):
     if not question.strip():
         st.warning("Please enter a question.")
+    elif conversation_mode and selected_pdf != "None":
+        try:
+            session = get_document_session(selected_pdf)
+            turn = session.ask(question)
+            st.success(turn.answer)
+            if turn.reused_tokens:
+                st.info(
+                    f"Reused {turn.reused_tokens} context tokens, evaluated {turn.prompt_eval_count} new "
+                    f"({turn.prompt_eval_ms:.0f} ms); prompt-eval time saved ≈ {turn.saved_ms:.0f} ms"
+                )
+            else:
+                st.info(f"Primed document context: {turn.prompt_eval_count} tokens in {turn.prompt_eval_ms:.0f} ms")
+        except Exception as e:
+            st.error(f"Error querying Ollama: {e}")
     else:
         context = ""
-        if use_rag and RAG_AVAILABLE:
+        results = []
+        summary_pdf = None  # answer from the cached summary tree of this PDF instead of context
+        answer = None  # set when server.py answered
+        if use_rag and SERVER_URL:
+            try:
+                st.info(f"🔄 Asking the query server at {SERVER_URL}...")
+                from ollama import server_request
+                from rag_store import SearchResult
+                selected_paths = list(compare_pdfs)
+                if selected_pdf != "None" and selected_pdf not in selected_paths:
+                    selected_paths.append(selected_pdf)
+                body = server_request(
+                    SERVER_URL,
+                    "/ask",
+                    {
+                        "question": question,
+                        "document_paths": selected_paths,
+                        "phases": phase_filter,
+                        "frameworks": framework_filter,
+                        "k": RAG_TOP_K,
+                        "group_by": group_by,
+                        "stream": False,
+                    },
+                )
+                answer = body.get("answer", "")
+                results = [SearchResult(**source) for source in body.get("sources", [])]
+                stats = body.get("stats") or {}
+                st.caption(f"Server: embed {stats.get('embed_ms', 0):.0f} ms, search {stats.get('search_ms', 0):.0f} ms")
+            except Exception as e:
+                st.error(f"Query server failed, falling back to direct PDF context: {e}")
+                summary_pdf = selected_pdf if selected_pdf != "None" else None
+        elif use_rag and RAG_AVAILABLE:
             try:
                 st.info("🔄 Using RAG (pgvector) path for context retrieval...")
-                store = RagStore()
-                store.ensure_schema()
-                # Ingest selected document if needed
-                selected_paths: List[str] = []
-                if selected_pdf != "None":
-                    selected_paths = [selected_pdf]
-                    with st.spinner("Indexing selected PDF if needed..."):
-                        from ollama import embed_texts as _emb
-                        added, changed, skipped = store.ingest_pdf(selected_pdf, embedder=_emb)
-                        st.info(f"Index ready: {added} chunks ({'updated' if changed else 'cached'}), skipped {skipped}")
-                # Embed query and search
-                q_emb = embed_texts([question])[0]
-                results = store.search(q_emb, document_paths=selected_paths, k=6)
-                # Build context
-                context = "\n\n".join(f"[From {r.document_title}]\n{r.text}" for r in results)
-                st.info(f"✅ RAG context built: {len(results)} relevant chunks found, first 100 chars: {context[:100]}")
+                store = get_store()
+                selected_paths: List[str] = list(compare_pdfs)
+                if selected_pdf != "None" and selected_pdf not in selected_paths:
+                    selected_paths.append(selected_pdf)
+                document_ids = store.document_ids(selected_paths) if selected_paths else {}
+                unindexed = [p for p in selected_paths if p not in document_ids]
+                pending_index = bool(unindexed) and not document_ids
+                if unindexed:
+                    # Indexing runs in ingest_worker.py; meanwhile answer from what is indexed, or the PDF text
+                    store.enqueue_ingest(unindexed)
+                    st.warning(
+                        f"{len(unindexed)} selected PDF(s) not indexed yet and queued for background indexing."
+                        + (" Answering from the PDF text for now." if pending_index else "")
+                    )
+                if pending_index:
+                    summary_pdf = selected_pdf if selected_pdf != "None" else None
+                else:
+                    # Keep the workflow phase tags used by the retrieval filters in sync
+                    tagged = st.session_state.setdefault("workflow_tagged_paths", set())
+                    if WORKFLOW_AVAILABLE and (not tagged or not tagged.issuperset(document_ids)):
+                        from workflow_meta import sync_workflow_tags
+                        sync_workflow_tags(store)
+                        tagged.update(store.list_document_paths())
+                    from context_compress import compress_results, format_context
+                    from ollama import embed_texts
+                    q_emb = embed_texts([question])[0]
+                    if group_by:
+                        # Best passages of every selected document (or framework) from a single query
+                        grouped = store.search_grouped(
+                            q_emb,
+                            document_ids=list(document_ids.values()) if document_ids else None,
+                            k_per_group=RAG_PER_GROUP_K,
+                            group_by=group_by,
+                            phases=phase_filter,
+                            frameworks=framework_filter,
+                        )
+                        results = [r for group in grouped.values() for r in group]
+                        context = format_context(results)
+                        st.info(f"✅ RAG context built: top {RAG_PER_GROUP_K} passages from each of {len(grouped)} {group_by}s")
+                    else:
+                        # Embed query, over-fetch candidates and compress them before prompting
+                        if not document_ids and RAG_ROUTE_DOCUMENTS:
+                            # No PDF selected: rank documents by centroid, then search chunks of the best ones
+                            candidates, route = store.search_routed(
+                                q_emb,
+                                k=RAG_CANDIDATES,
+                                documents=RAG_ROUTE_DOCUMENTS,
+                                include_embeddings=True,
+                                phases=phase_filter,
+                                frameworks=framework_filter,
+                            )
+                            st.caption(f"Searched {len(route.document_paths)} routed documents in {route.total_ms:.0f} ms")
+                        else:
+                            candidates = store.search(
+                                q_emb,
+                                document_paths=list(document_ids),
+                                k=RAG_CANDIDATES,
+                                include_embeddings=True,
+                                phases=phase_filter,
+                                frameworks=framework_filter,
+                            )
+                        results, stats = compress_results(q_emb, candidates, k=RAG_TOP_K, distance_margin=RAG_DISTANCE_MARGIN)
+                        # Build context
+                        context = format_context(results)
+                        st.info(
+                            f"✅ RAG context built: {stats.selected} of {stats.candidates} chunks in {stats.passages} passages, "
+                            f"~{stats.tokens_saved} prompt tokens saved, first 100 chars: {context[:100]}"
+                        )
             except Exception as e:
                 st.error(f"RAG path failed, falling back to direct PDF context: {e}")
-                context = get_pdf_text(selected_pdf) if selected_pdf != "None" else ""
+                summary_pdf = selected_pdf if selected_pdf != "None" else None
         else:
-            st.info("📄 Using direct PDF text extraction path...")
+            st.info("📄 Using direct PDF path (cached hierarchical summaries)...")
             if selected_pdf != "None":
-                context = get_pdf_text(selected_pdf)
-                if context:
-                    st.info(f"Successfully loaded PDF content ({len(context)} characters)")
+                summary_pdf = selected_pdf
 
         # Send to Ollama
-        answer = ask_ollama(question, context)
+        if answer is None:
+            answer = answer_from_summaries(summary_pdf, question) if summary_pdf else ask_ollama(question, context)
         if answer.startswith("Error") or answer.startswith("Could not process"):
             st.error(answer)
         else:
             st.success(answer)
+            show_citations(results)
+
+if conversation_mode and st.session_state.get("document_session") is not None:
+    session = st.session_state["document_session"]
+    if session.turns:
+        st.subheader(f"Conversation: {os.path.basename(session.document_key)}")
+        for turn in session.turns:
+            st.markdown(f"**Q:** {turn.question}")
+            st.markdown(f"**A:** {turn.answer}")
+        st.caption(f"Total prompt-eval time saved: {sum(t.saved_ms for t in session.turns) / 1000:.1f} s")
+        if st.button("Reset conversation"):
+            session.reset()
 
 
 with st.sidebar:
     st.subheader("Source Folder Tree / Knowledge for the agents") 
     st.code(tree_str, language="text")
+    from ollama_pool import get_pool
+    ollama_hosts = get_pool().status()
+    if len(ollama_hosts) > 1:
+        st.subheader("Ollama hosts")
+        for host in ollama_hosts:
+            latency = f", p50 {host['p50_ms']:.0f} ms" if host["p50_ms"] is not None else ""
+            state = "🟢" if host["healthy"] else f"🔴 {(host['last_error'] or '')[:80]}"
+            st.caption(f"{state} {host['url']}: {host['outstanding']} in flight, {host['served']} served{latency}")
+    if use_rag and RAG_AVAILABLE:
+        st.subheader("Indexing jobs")
+        try:
+            jobs = get_store().ingest_job_status(limit=10)
+            if st.button("Queue full corpus reindex", help="Workers started with `python ingest_worker.py` pick these up."):
+                get_store().enqueue_ingest(pdf_files, force=True)
+                st.rerun()
+            for job in jobs:
+                rate = f", {job.chunks_per_second:.1f} chunks/s" if job.chunks_per_second else ""
+                st.caption(f"{os.path.basename(job.file_path)}: {job.status} {job.chunks_done}/{job.chunks_total}{rate}")
+                if job.status == "running":
+                    st.progress(job.progress)
+                elif job.status == "failed" and job.error:
+                    st.caption(f"⚠️ {job.error[:200]}")
+            if not jobs:
+                st.caption("No indexing jobs yet.")
+            st.button("Refresh job status")
+        except Exception as e:
+            st.caption(f"Job status unavailable: {e}")
 
 st.write("The data doctor")
\ No newline at end of file
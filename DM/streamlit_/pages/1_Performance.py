@@ -0,0 +1,51 @@
+import time
+from dataclasses import asdict
+
+import pandas as pd
+import streamlit as st
+
+from perf_ledger import RELOAD_THRESHOLD_MS, recent_calls, regressions, summarize
+
+st.title("Model performance")
+st.caption("Metrics Ollama returns with every generate call, recorded by the app, the CLI, batch jobs and server.py.")
+
+hours = st.slider("Summary window (hours)", 1, 24 * 14, 24)
+for alert in regressions():
+    st.warning(f"Throughput regression: {alert}")
+
+summaries = summarize(since=time.time() - hours * 3600)
+if not summaries:
+    st.info("No generate calls recorded in this window yet.")
+    st.stop()
+
+table = pd.DataFrame([asdict(s) for s in summaries]).rename(
+    columns={
+        "tokens_per_second": "tokens/s",
+        "prompt_tokens_per_second": "prompt tokens/s",
+        "reload_rate": "model reloads",
+        "prompt_eval_share": "prompt-eval share",
+        "median_prompt_chars": "median prompt chars",
+    }
+)
+st.dataframe(
+    table.style.format(
+        {"tokens/s": "{:.1f}", "prompt tokens/s": "{:.0f}", "model reloads": "{:.0%}", "prompt-eval share": "{:.0%}"},
+        na_rep="-",
+    ),
+    use_container_width=True,
+)
+
+calls = pd.DataFrame(recent_calls(limit=2000))
+calls["time"] = pd.to_datetime(calls["ts"], unit="s")
+calls["tokens/s"] = calls["eval_count"] / calls["eval_ms"] * 1000
+
+st.subheader("Generation throughput per call")
+st.line_chart(calls.pivot_table(index="time", columns="path", values="tokens/s"))
+
+st.subheader("Model reloads per hour")
+reloads = calls[calls["load_ms"] > RELOAD_THRESHOLD_MS].set_index("time").resample("1h")["id"].count()
+st.bar_chart(reloads.rename("reloads"))
+
+st.subheader("Prompt evaluation vs generation time")
+shares = calls.groupby("path")[["prompt_eval_ms", "eval_ms"]].sum()
+st.bar_chart(shares.rename(columns={"prompt_eval_ms": "prompt eval (ms)", "eval_ms": "generation (ms)"}))
@@ -0,0 +1,252 @@
+"""
+Hierarchical, cached map-reduce summarization for answering from a whole PDF.
+
+Leaves are sized to the context window actually requested from Ollama
+(num_ctx, bounded by the model's trained context length), so nothing is
+silently truncated. Each level is summarized in parallel and consecutive
+summaries are grouped into the next level until one node remains. Every
+node is stored on disk under the document's content hash, the model and the
+leaf size, next to a manifest of the finished tree (leaf size and node count
+per level). Later questions on the same PDF load the tree from the manifest
+and only pay for the final answer; the PDF is extracted again only when
+nodes are missing.
+
+    tree = build_summary_tree("TOGAF 9.2.pdf")
+    answer = answer_from_tree("What is the ADM?", tree)
+"""
+
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from ollama import OLLAMA_MODEL, generate
+
+SUMMARY_CACHE_DIR = Path(os.getenv("SUMMARY_CACHE_DIR", str(Path(__file__).resolve().parent / ".summary_cache")))
+MAX_NUM_CTX = int(os.getenv("SUMMARY_MAX_NUM_CTX", "8192"))  # cap on the window we ask Ollama for
+DEFAULT_NUM_CTX = 2048  # Ollama's default when the model does not say
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+SUMMARY_TOKENS = 400  # num_predict for each summary
+PROMPT_OVERHEAD_TOKENS = 200  # instructions and question around the text
+TOKEN_ESTIMATE_RATIO = 4  # characters per token
+
+MAP_PROMPT = (
+    "Summarize the following section of {title}. Keep key requirements, definitions, "
+    "controls, roles and numbers.\n\n{text}\n\nSummary:"
+)
+REDUCE_PROMPT = (
+    "Combine these consecutive section summaries of {title} into one summary. Keep key "
+    "requirements, definitions, controls, roles and numbers.\n\n{text}\n\nCombined summary:"
+)
+ANSWER_PROMPT = "Context (summaries of {title}):\n{text}\n\nQuestion: {question}\nAnswer based on this context:"
+
+
+@lru_cache(maxsize=8)
+def model_context_window(model: str = OLLAMA_MODEL) -> int:
+    """num_ctx to request: the model's trained context length, capped at MAX_NUM_CTX."""
+    from ollama_pool import get_pool
+
+    try:
+        resp = get_pool().post("/api/show", {"model": model}, timeout=10)
+        resp.raise_for_status()
+        info = resp.json().get("model_info") or {}
+    except Exception:
+        return DEFAULT_NUM_CTX
+    lengths = [value for key, value in info.items() if key.endswith(".context_length") and isinstance(value, int)]
+    return min(max(lengths), MAX_NUM_CTX) if lengths else DEFAULT_NUM_CTX
+
+
+def leaf_chars_for(num_ctx: int) -> int:
+    return max(1000, (num_ctx - PROMPT_OVERHEAD_TOKENS - SUMMARY_TOKENS) * TOKEN_ESTIMATE_RATIO)
+
+
+def split_leaves(text: str, leaf_chars: int) -> List[str]:
+    """Split text into pieces of at most leaf_chars, preferring to cut after a sentence."""
+    leaves: List[str] = []
+    start = 0
+    while start < len(text):
+        end = min(start + leaf_chars, len(text))
+        if end < len(text):
+            cut = text.rfind(". ", start + leaf_chars // 2, end)
+            if cut != -1:
+                end = cut + 1
+        leaves.append(text[start:end].strip())
+        start = end
+    return [leaf for leaf in leaves if leaf]
+
+
+def group_to_fit(texts: List[str], max_chars: int) -> List[List[str]]:
+    """Group consecutive texts so each group's joined length stays within max_chars."""
+    groups: List[List[str]] = []
+    current: List[str] = []
+    size = 0
+    for text in texts:
+        if current and size + len(text) + 2 > max_chars:
+            groups.append(current)
+            current, size = [], 0
+        current.append(text)
+        size += len(text) + 2
+    if current:
+        groups.append(current)
+    return groups
+
+
+@dataclass
+class SummaryTree:
+    title: str
+    model: str
+    num_ctx: int
+    levels: List[List[str]] = field(default_factory=list)  # levels[0] are leaf summaries, levels[-1] the root
+    cached_nodes: int = 0
+    computed_nodes: int = 0
+
+
+class _NodeCache:
+    def __init__(self, directory: Path):
+        self.directory = directory
+
+    def _path(self, level: int, index: int) -> Path:
+        return self.directory / f"L{level}_{index:05d}.json"
+
+    def _read(self, path: Path) -> Optional[dict]:
+        try:
+            return json.loads(path.read_text())
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, path: Path, payload: dict) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_suffix(f".{os.getpid()}.tmp")
+        temporary.write_text(json.dumps(payload))
+        os.replace(temporary, path)
+
+    def get(self, level: int, index: int, source: str) -> Optional[str]:
+        node = self._read(self._path(level, index))
+        # The source length guards against a changed grouping at the same position
+        return node["summary"] if node and node.get("source_chars") == len(source) else None
+
+    def put(self, level: int, index: int, source: str, summary: str) -> None:
+        self._write(self._path(level, index), {"source_chars": len(source), "summary": summary})
+
+    def load_tree(self, leaf_chars: int) -> Optional[List[List[str]]]:
+        """Every level of a finished tree, from the manifest and its nodes; None if any is missing."""
+        manifest = self._read(self.directory / "tree.json")
+        if not manifest or manifest.get("leaf_chars") != leaf_chars:
+            return None
+        levels = []
+        for level, nodes in enumerate(manifest.get("levels", [])):
+            summaries = [self._read(self._path(level, index)) for index in range(nodes)]
+            if any(node is None for node in summaries):
+                return None
+            levels.append([node["summary"] for node in summaries])
+        return levels or None
+
+    def put_tree(self, leaf_chars: int, levels: List[List[str]]) -> None:
+        self._write(self.directory / "tree.json", {"leaf_chars": leaf_chars, "levels": [len(level) for level in levels]})
+
+
+def _summarize_level(
+    sources: List[str],
+    level: int,
+    prompt: str,
+    tree: SummaryTree,
+    cache: _NodeCache,
+    progress: Optional[Callable[[str], None]],
+) -> List[str]:
+    summaries: List[Optional[str]] = [cache.get(level, i, source) for i, source in enumerate(sources)]
+    missing = [i for i, summary in enumerate(summaries) if summary is None]
+    tree.cached_nodes += len(sources) - len(missing)
+    if progress:
+        progress(f"Level {level}: {len(sources)} nodes, {len(sources) - len(missing)} cached, {len(missing)} to summarize")
+
+    def run(i: int) -> str:
+        data = generate(
+            prompt.format(title=tree.title, text=sources[i]),
+            model=tree.model,
+            options={"num_ctx": tree.num_ctx, "num_predict": SUMMARY_TOKENS},
+            path="map" if level == 0 else "reduce",
+        )
+        summary = data.get("response", "").strip()
+        cache.put(level, i, sources[i], summary)
+        return summary
+
+    with ThreadPoolExecutor(max_workers=SUMMARY_CONCURRENCY) as pool:
+        for i, summary in zip(missing, pool.map(run, missing)):
+            summaries[i] = summary
+    tree.computed_nodes += len(missing)
+    return [summary or "" for summary in summaries]
+
+
+def build_summary_tree(
+    pdf_path: str,
+    model: str = OLLAMA_MODEL,
+    num_ctx: Optional[int] = None,
+    progress: Optional[Callable[[str], None]] = None,
+) -> SummaryTree:
+    """Summary tree for pdf_path, reusing every node already cached for this document version.
+
+    A finished tree is loaded from its manifest without opening the PDF
+    beyond the fingerprint check; otherwise the text is extracted and only
+    the missing nodes are summarized.
+    """
+    from fingerprint import file_hash
+
+    num_ctx = num_ctx or model_context_window(model)
+    leaf_chars = leaf_chars_for(num_ctx)
+    tree = SummaryTree(title=os.path.basename(pdf_path), model=model, num_ctx=num_ctx)
+    version = file_hash(pdf_path)[:16]
+    cache = _NodeCache(SUMMARY_CACHE_DIR / version / f"{re.sub(r'[^A-Za-z0-9_.-]+', '_', model)}_{leaf_chars}")
+    levels = cache.load_tree(leaf_chars)
+    if levels is not None:
+        tree.levels = levels
+        tree.cached_nodes = sum(len(level) for level in levels)
+        if progress:
+            progress(f"Loaded {len(levels)} cached levels ({tree.cached_nodes} nodes)")
+        return tree
+
+    from pdf_extract import iter_pages
+    from rag_store import join_pages
+
+    text, _ = join_pages(list(iter_pages(pdf_path)))
+    sources = split_leaves(text, leaf_chars)
+    level = 0
+    prompt = MAP_PROMPT
+    while True:
+        summaries = _summarize_level(sources, level, prompt, tree, cache, progress)
+        tree.levels.append(summaries)
+        if len(summaries) <= 1:
+            cache.put_tree(leaf_chars, tree.levels)
+            return tree
+        groups = group_to_fit(summaries, leaf_chars)
+        if len(groups) == len(summaries):
+            # Summaries are too long to combine two at a time; pair them anyway to converge
+            groups = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+        sources = ["\n\n".join(group) for group in groups]
+        level += 1
+        prompt = REDUCE_PROMPT
+
+
+def answer_from_tree(question: str, tree: SummaryTree) -> str:
+    """Answer from the most detailed level whose summaries fit into one prompt."""
+    budget = leaf_chars_for(tree.num_ctx)
+    context = tree.levels[-1][0] if tree.levels and tree.levels[-1] else ""
+    for summaries in tree.levels:
+        joined = "\n\n".join(summaries)
+        if len(joined) <= budget:
+            context = joined
+            break
+    data = generate(
+        ANSWER_PROMPT.format(title=tree.title, text=context, question=question),
+        model=tree.model,
+        options={"num_ctx": tree.num_ctx},
+        path="summary-answer",
+    )
+    return data.get("response", "").strip()
+
+
+def answer_question(pdf_path: str, question: str, model: str = OLLAMA_MODEL, progress: Optional[Callable[[str], None]] = None) -> str:
+    return answer_from_tree(question, build_summary_tree(pdf_path, model=model, progress=progress))
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+Synthetic large corpora for scaling tests of RagStore.
+
+Generates documents and chunks with log-normal chunks-per-document and
+chunk-length distributions, and clustered random embeddings (topic centroid ->
+document centroid -> chunk) of any dimension. The rows are bulk-loaded with
+binary COPY, without calling Ollama. Synthetic documents use file paths under
+synthetic:// and are spread over the real framework names, so framework
+filters behave as on the real corpus; `clean` removes them all.
+
+    python synth_corpus.py load --chunks 100000 --dim 768
+    python synth_corpus.py scale --sizes 100000,1000000,10000000 --index hnsw --report scaling.md
+    python synth_corpus.py clean
+
+Use a scratch database (--database-url) for the large sizes. At each size
+`scale` records the load rate, ANALYZE and index build time, table and index
+size, and p50/p99 latency and recall@k of unfiltered and framework-filtered
+searches. The report flags where a budget is exceeded.
+"""
+
+import argparse
+import hashlib
+import json
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+SYNTH_PREFIX = "synthetic://"
+FRAMEWORKS = ["COBIT", "ISO", "ITIL", "NIST", "TOGAF"]
+COPY_BATCH_ROWS = 20000
+PAGE_CHARS = 3000  # characters per synthetic page
+LATENCY_BUDGET_MS = 200.0  # p99 above this is flagged
+RECALL_FLOOR = 0.9
+_WORDS = (
+    "data governance control risk audit policy process management information security service "
+    "framework objective requirement assessment maturity capability owner stakeholder quality "
+    "metadata lifecycle architecture compliance evidence review improvement performance value"
+).split()
+
+
+@dataclass
+class CorpusSpec:
+    dim: int = 768
+    clusters: int = 256  # topics
+    document_spread: float = 0.6  # document centroid distance from its topic
+    chunk_spread: float = 0.8  # chunk distance from its document centroid
+    chunks_per_doc_median: int = 300
+    chunks_per_doc_sigma: float = 1.0
+    chars_median: int = 700
+    chars_sigma: float = 0.3
+    seed: int = 0
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    return matrix / np.linalg.norm(matrix, axis=-1, keepdims=True)
+
+
+class SyntheticCorpus:
+    def __init__(self, spec: CorpusSpec):
+        self.spec = spec
+        self.rng = np.random.default_rng(spec.seed)
+        self.topics = _normalize(self.rng.normal(size=(spec.clusters, spec.dim))).astype(np.float32)
+        self._words = np.asarray(_WORDS)
+
+    def _noise(self, count: int, scale: float) -> np.ndarray:
+        # Per-component deviation scale/sqrt(dim) gives noise vectors of norm ~scale
+        return self.rng.normal(scale=scale / np.sqrt(self.spec.dim), size=(count, self.spec.dim)).astype(np.float32)
+
+    def document(self) -> Tuple[str, np.ndarray, int]:
+        """Framework, centroid and chunk count of a new document."""
+        topic = self.topics[self.rng.integers(self.spec.clusters)]
+        centroid = _normalize(topic + self._noise(1, self.spec.document_spread)[0])
+        count = max(1, int(self.rng.lognormal(np.log(self.spec.chunks_per_doc_median), self.spec.chunks_per_doc_sigma)))
+        return FRAMEWORKS[int(self.rng.integers(len(FRAMEWORKS)))], centroid, count
+
+    def chunks(self, centroid: np.ndarray, count: int) -> Tuple[List[str], np.ndarray]:
+        embeddings = _normalize(centroid + self._noise(count, self.spec.chunk_spread))
+        lengths = self.rng.lognormal(np.log(self.spec.chars_median), self.spec.chars_sigma, size=count).astype(int)
+        texts = []
+        for length in lengths:
+            words = self._words[self.rng.integers(len(self._words), size=max(1, length // 8))]
+            texts.append(" ".join(words)[:length])
+        return texts, embeddings
+
+    def queries(self, count: int) -> np.ndarray:
+        """Query vectors drawn like chunks of fresh documents."""
+        return np.stack([_normalize(self.document()[1] + self._noise(1, self.spec.chunk_spread)[0]) for _ in range(count)])
+
+
+def synthetic_counts(store) -> Tuple[int, int]:
+    from rag_store import sql_text
+
+    with store.engine.connect() as conn:
+        docs = conn.execute(sql_text("SELECT count(*) FROM documents WHERE file_path LIKE :p"), {"p": SYNTH_PREFIX + "%"}).scalar()
+        chunks = conn.execute(
+            sql_text(
+                "SELECT count(*) FROM chunks c JOIN documents d ON d.id = c.document_id WHERE d.file_path LIKE :p"
+            ),
+            {"p": SYNTH_PREFIX + "%"},
+        ).scalar()
+    return int(docs), int(chunks)
+
+
+def load(store, corpus: SyntheticCorpus, target_chunks: int, progress=print) -> Dict[str, float]:
+    """Add synthetic documents until target_chunks synthetic chunks exist; returns counts and rate."""
+    from pgvector.psycopg import register_vector
+
+    docs, loaded = synthetic_counts(store)
+    start_count = loaded
+    started = time.perf_counter()
+    raw = store.engine.raw_connection()
+    try:
+        register_vector(raw.driver_connection)
+        cursor = raw.cursor()
+        pending: List[Tuple] = []
+
+        def flush() -> None:
+            with cursor.copy(
+                "COPY chunks (document_id, chunk_index, text, token_count, embedding, char_start, char_end, "
+                "page_start, page_end, framework) FROM STDIN WITH (FORMAT BINARY)"
+            ) as copy:
+                copy.set_types(["int4", "int4", "text", "int4", "vector", "int4", "int4", "int4", "int4", "varchar"])
+                for row in pending:
+                    copy.write_row(row)
+            raw.commit()
+            pending.clear()
+
+        while loaded < target_chunks:
+            framework, centroid, count = corpus.document()
+            count = min(count, target_chunks - loaded)
+            path = f"{SYNTH_PREFIX}{corpus.spec.seed}/{framework}/doc_{docs:07d}.pdf"
+            cursor.execute(
+                "INSERT INTO documents (title, file_path, content_hash, framework) VALUES (%s, %s, %s, %s) RETURNING id",
+                (path.rsplit("/", 1)[1], path, hashlib.sha256(path.encode()).hexdigest(), framework),
+            )
+            document_id = cursor.fetchone()[0]
+            texts, embeddings = corpus.chunks(centroid, count)
+            offset = 0
+            for i, (text, embedding) in enumerate(zip(texts, embeddings)):
+                pending.append(
+                    (document_id, i, text, len(text), embedding, offset, offset + len(text),
+                     offset // PAGE_CHARS + 1, (offset + len(text)) // PAGE_CHARS + 1, framework)
+                )
+                offset += len(text)
+            docs += 1
+            loaded += count
+            if len(pending) >= COPY_BATCH_ROWS:
+                flush()
+                if progress:
+                    rate = (loaded - start_count) / (time.perf_counter() - started)
+                    progress(f"Loaded {loaded}/{target_chunks} chunks in {docs} documents ({rate:.0f} rows/s)")
+        if pending:
+            flush()
+        raw.commit()
+    finally:
+        raw.close()
+    store.refresh_centroids(missing_only=True)  # for the document router (RagStore.search_routed)
+    elapsed = time.perf_counter() - started
+    return {
+        "documents": docs,
+        "chunks": loaded,
+        "load_seconds": elapsed,
+        "rows_per_second": (loaded - start_count) / elapsed if elapsed else 0.0,
+    }
+
+
+def clean(store) -> int:
+    from rag_store import sql_text
+
+    with store.engine.begin() as conn:
+        return conn.execute(sql_text("DELETE FROM documents WHERE file_path LIKE :p"), {"p": SYNTH_PREFIX + "%"}).rowcount
+
+
+@dataclass
+class ScalePoint:
+    chunks: int
+    documents: int
+    rows_per_second: float
+    analyze_seconds: float
+    index_seconds: Optional[float]  # None: not built (or timed out)
+    table_mb: float
+    index_mb: float
+    p50_ms: float
+    p99_ms: float
+    recall: float
+    filtered_p50_ms: float
+    filtered_p99_ms: float
+    filtered_recall: float
+    notes: str = ""
+
+
+def _timed_searches(store, queries: np.ndarray, k: int, frameworks: Optional[List[str]]) -> Tuple[List[float], List[List]]:
+    latencies, found = [], []
+    for query in queries:
+        started = time.perf_counter()
+        results = store.search(query.tolist(), k=k, frameworks=frameworks)
+        latencies.append((time.perf_counter() - started) * 1000)
+        found.append([(r.document_id, r.chunk_index) for r in results])
+    return latencies, found
+
+
+def _exact(store, queries: np.ndarray, k: int, frameworks: Optional[List[str]]) -> List[List[Tuple[int, int]]]:
+    """Ground truth: the same search with index scans disabled."""
+    from rag_store import sql_text
+
+    truth = []
+    with store.SessionLocal() as session:
+        session.execute(sql_text("SET LOCAL enable_indexscan = off"))
+        session.execute(sql_text("SET LOCAL enable_bitmapscan = off"))
+        for query in queries:
+            results = store._search_in_session(session, query.tolist(), None, k, frameworks=frameworks)
+            truth.append([(r.document_id, r.chunk_index) for r in results])
+    return truth
+
+
+def _recall(found: List[List], truth: List[List]) -> float:
+    return float(np.mean([len(set(f) & set(t)) / max(1, len(t)) for f, t in zip(found, truth)]))
+
+
+def _percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def measure(store, queries: np.ndarray, truth_queries: int, k: int, index: str, build_timeout_s: int) -> Dict:
+    from rag_store import sql_text
+
+    started = time.perf_counter()
+    with store.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(sql_text("ANALYZE documents"))
+        conn.execute(sql_text("ANALYZE chunks"))
+    analyze_seconds = time.perf_counter() - started
+
+    notes = []
+    index_seconds = None
+    with store.engine.connect() as conn:
+        maintenance_mb = conn.execute(
+            sql_text("SELECT setting::bigint * 1024 / 1048576 FROM pg_settings WHERE name = 'maintenance_work_mem'")
+        ).scalar()
+    if index != "none":
+        with store.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(sql_text(f"DROP INDEX IF EXISTS ix_chunks_embedding_{index}"))  # rebuilt at each size
+        started = time.perf_counter()
+        try:
+            store.ensure_vector_index(index, timeout_s=build_timeout_s)
+            index_seconds = time.perf_counter() - started
+        except Exception as e:
+            notes.append(f"index build failed after {time.perf_counter() - started:.0f}s: {str(e).splitlines()[0]}")
+    with store.engine.connect() as conn:
+        table_mb = conn.execute(sql_text("SELECT pg_table_size('chunks') / 1048576.0")).scalar()
+        index_mb = conn.execute(sql_text("SELECT pg_indexes_size('chunks') / 1048576.0")).scalar()
+    if index == "hnsw" and index_seconds is not None and index_mb > maintenance_mb:
+        notes.append(f"HNSW graph ({index_mb:.0f} MB) exceeds maintenance_work_mem ({maintenance_mb} MB): builds spill to disk")
+
+    truth_set = queries[:truth_queries]
+    latencies, found = _timed_searches(store, queries, k, None)
+    recall = _recall(found[:truth_queries], _exact(store, truth_set, k, None))
+    framework = [FRAMEWORKS[0]]
+    filtered_latencies, filtered_found = _timed_searches(store, queries, k, framework)
+    filtered_recall = _recall(filtered_found[:truth_queries], _exact(store, truth_set, k, framework))
+    return {
+        "analyze_seconds": analyze_seconds,
+        "index_seconds": index_seconds,
+        "table_mb": float(table_mb),
+        "index_mb": float(index_mb),
+        "p50_ms": _percentile(latencies, 50),
+        "p99_ms": _percentile(latencies, 99),
+        "recall": recall,
+        "filtered_p50_ms": _percentile(filtered_latencies, 50),
+        "filtered_p99_ms": _percentile(filtered_latencies, 99),
+        "filtered_recall": filtered_recall,
+        "notes": "; ".join(notes),
+    }
+
+
+def breakdowns(point: ScalePoint) -> List[str]:
+    flags = []
+    if point.p99_ms > LATENCY_BUDGET_MS:
+        flags.append(f"p99 {point.p99_ms:.0f} ms > {LATENCY_BUDGET_MS:.0f} ms")
+    if point.filtered_p99_ms > LATENCY_BUDGET_MS:
+        flags.append(f"filtered p99 {point.filtered_p99_ms:.0f} ms > {LATENCY_BUDGET_MS:.0f} ms")
+    if point.recall < RECALL_FLOOR:
+        flags.append(f"recall {point.recall:.2f} < {RECALL_FLOOR}")
+    if point.filtered_recall < RECALL_FLOOR:
+        flags.append(f"filtered recall {point.filtered_recall:.2f} < {RECALL_FLOOR} (post-filtering an ANN scan)")
+    if point.notes:
+        flags.append(point.notes)
+    return flags
+
+
+def write_report(points: List[ScalePoint], spec: CorpusSpec, index: str, path: Optional[str]) -> str:
+    lines = [
+        f"# RagStore scaling report ({index} index, {spec.dim} dims, {spec.clusters} topics)",
+        "",
+        "| chunks | load rows/s | analyze s | index build s | table MB | index MB | p50 ms | p99 ms | recall | filtered p50 | filtered p99 | filtered recall |",
+        "|---:|---:|---:|---:|---:|---:|---:|---:|---:|---:|---:|---:|",
+    ]
+    for p in points:
+        build = f"{p.index_seconds:.1f}" if p.index_seconds is not None else "-"
+        lines.append(
+            f"| {p.chunks:,} | {p.rows_per_second:,.0f} | {p.analyze_seconds:.1f} | {build} | {p.table_mb:,.0f} | "
+            f"{p.index_mb:,.0f} | {p.p50_ms:.1f} | {p.p99_ms:.1f} | {p.recall:.3f} | {p.filtered_p50_ms:.1f} | "
+            f"{p.filtered_p99_ms:.1f} | {p.filtered_recall:.3f} |"
+        )
+    lines += ["", "## Breakdowns", ""]
+    flagged = [(p, breakdowns(p)) for p in points]
+    for p, flags in flagged:
+        if flags:
+            lines.append(f"- {p.chunks:,} chunks: " + "; ".join(flags))
+    if not any(flags for _, flags in flagged):
+        lines.append("- none within the tested sizes")
+    report = "\n".join(lines) + "\n"
+    if path:
+        with open(path, "w", encoding="utf-8") as handle:
+            handle.write(report)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None, help="Database to load into (default DATABASE_URL).")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--clusters", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    sub = parser.add_subparsers(dest="command", required=True)
+    load_cmd = sub.add_parser("load", help="Load synthetic chunks up to a total count.")
+    load_cmd.add_argument("--chunks", type=int, required=True)
+    scale_cmd = sub.add_parser("scale", help="Load up to each size and measure.")
+    scale_cmd.add_argument("--sizes", default="100000,1000000,10000000")
+    scale_cmd.add_argument("--index", choices=["hnsw", "ivfflat", "none"], default="hnsw")
+    scale_cmd.add_argument("--queries", type=int, default=200)
+    scale_cmd.add_argument("--truth-queries", type=int, default=20, help="Queries also run exactly for recall.")
+    scale_cmd.add_argument("--k", type=int, default=6)
+    scale_cmd.add_argument("--build-timeout", type=int, default=4 * 3600, help="Seconds before an index build is abandoned.")
+    scale_cmd.add_argument("--report", default=None, help="Write the markdown report here.")
+    scale_cmd.add_argument("--json", default=None, help="Append each measured point as JSONL here.")
+    sub.add_parser("clean", help="Delete every synthetic document.")
+    args = parser.parse_args()
+
+    from rag_store import RagStore
+
+    store = RagStore(args.database_url)
+    store.ensure_schema()
+    spec = CorpusSpec(dim=args.dim, clusters=args.clusters, seed=args.seed)
+    if args.command == "clean":
+        print(f"Deleted {clean(store)} synthetic documents")
+        return
+    corpus = SyntheticCorpus(spec)
+    if args.command == "load":
+        print(load(store, corpus, args.chunks))
+        return
+
+    queries = corpus.queries(args.queries)
+    points: List[ScalePoint] = []
+    for size in sorted(int(s) for s in args.sizes.split(",")):
+        loaded = load(store, corpus, size)
+        print(f"{size:,} chunks loaded at {loaded['rows_per_second']:,.0f} rows/s; measuring")
+        point = ScalePoint(
+            chunks=int(loaded["chunks"]),
+            documents=int(loaded["documents"]),
+            rows_per_second=loaded["rows_per_second"],
+            **measure(store, queries, args.truth_queries, args.k, args.index, args.build_timeout),
+        )
+        points.append(point)
+        if args.json:
+            with open(args.json, "a", encoding="utf-8") as handle:
+                handle.write(json.dumps(asdict(point)) + "\n")
+        print(write_report(points, spec, args.index, args.report))
+
+
+if __name__ == "__main__":
+    main()
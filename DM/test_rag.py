@@ -139,6 +139,295 @@ def test_rag_store():
         print(f"❌ RAG store test failed: {e}")
         return False
 
+def test_read_write_split():
+    """Test that reads go to the replicas and read_your_writes to the primary (needs DATABASE_REPLICA_URLS)"""
+    try:
+        from rag_store import RagStore, sql_text
+        import os
+        if not os.getenv("DATABASE_REPLICA_URLS"):
+            print("⏭️  DATABASE_REPLICA_URLS not set; point it at a second local Postgres to test routing")
+            return True
+        os.environ.setdefault("DATABASE_URL", "postgresql+psycopg://yavin@localhost:5432/dm")
+        store = RagStore(read_policy="round_robin")
+
+        def server(session):
+            with session:
+                return session.execute(sql_text("SELECT inet_server_port()")).scalar()
+
+        primary = server(store.SessionLocal())
+        reads = {server(store.read_session()) for _ in range(2 * len(store.replica_urls))}
+        if primary in reads:
+            print(f"❌ Reads reached the primary (port {primary})")
+            return False
+        if server(store.read_session(read_your_writes=True)) != primary:
+            print("❌ read_your_writes did not use the primary")
+            return False
+        print(f"✅ Reads spread over replica port(s) {sorted(reads)}; writes and read_your_writes on {primary}")
+        return True
+    except Exception as e:
+        print(f"❌ Read/write split test failed: {e}")
+        return False
+
+def test_context_compression():
+    """Test merging of adjacent overlapping chunks and MMR selection (offline)"""
+    try:
+        from rag_store import SearchResult, simple_overlap_chunk
+        from context_compress import compress_results
+
+        text = " ".join(f"sentence number {i} about data governance." for i in range(200))
+        chunks = simple_overlap_chunk(text, chunk_size=800, overlap=120)
+        candidates = [
+            SearchResult(text=chunks[i], document_title="doc.pdf", file_path="/doc.pdf", distance=0.1 + i / 100,
+                         document_id=1, chunk_index=i, embedding=[1.0, i / 10, 0.0])
+            for i in range(3)
+        ]
+        results, stats = compress_results([1.0, 0.0, 0.0], candidates, k=3)
+        expected = " ".join(text.split())[:len(chunks[0]) + 2 * (800 - 120)]
+        if len(results) != 1 or results[0].text != expected:
+            print(f"❌ Adjacent chunks were not merged cleanly ({len(results)} passages)")
+            return False
+        print(f"✅ Context compression merged {stats.selected} chunks, ~{stats.tokens_saved} tokens saved")
+        return True
+    except Exception as e:
+        print(f"❌ Context compression test failed: {e}")
+        return False
+
+def test_offset_chunks():
+    """Test that offset-only chunks slice back to the stored texts and chunk texts rebuild the document (offline)"""
+    try:
+        import zlib
+        from rag_store import chunk_pages, chunk_text, join_pages, rebuild_text
+
+        pages = [f"Page {n} " + " ".join(f"control{n}_{i}" for i in range(120)) for n in range(1, 6)]
+        text, page_offsets = join_pages(pages)
+        spans = chunk_text(text, page_offsets, chunk_size=300, overlap=60)
+        if spans != chunk_pages(pages, chunk_size=300, overlap=60):
+            print("❌ chunk_text differs from chunk_pages")
+            return False
+        stored = zlib.decompress(zlib.compress(text.encode("utf-8"))).decode("utf-8")
+        if any(stored[s.char_start:s.char_end] != s.text for s in spans):
+            print("❌ Offsets do not slice the stored text back to the chunk texts")
+            return False
+        rebuilt, rebuilt_offsets = rebuild_text((s.text, s.char_start, s.char_end, s.page_start) for s in spans)
+        if rebuilt != text or len(rebuilt_offsets) != len(pages):
+            print("❌ Chunks did not rebuild the document text")
+            return False
+        stored_chars = sum(len(s.text) for s in spans)
+        print(f"✅ Offset chunks round-trip; per-chunk storage would hold {stored_chars / len(text):.2f}x the document text")
+        return True
+    except Exception as e:
+        print(f"❌ Offset chunk test failed: {e}")
+        return False
+
+def test_snapshot_roundtrip():
+    """Test that a snapshot keeps chunks offset-only and that they can be re-chunked after import (needs SNAPSHOT_TEST_DATABASE_URL)"""
+    try:
+        import hashlib
+        import os
+        import tempfile
+        from rag_store import Chunk, Document, DocumentText, RagStore, chunk_text, join_pages
+        from snapshot import export_snapshot, import_snapshot
+        url = os.getenv("SNAPSHOT_TEST_DATABASE_URL")
+        if not url:
+            print("⏭️  SNAPSHOT_TEST_DATABASE_URL not set; point it at a scratch database to test snapshots")
+            return True
+
+        def embed(texts):
+            return [[b / 255 for b in hashlib.sha256(t.encode("utf-8")).digest()[:8]] for t in texts]
+
+        store = RagStore(url, replica_urls=[])
+        store.ensure_schema()
+        path = "/snapshot-test/controls.pdf"
+        text, page_offsets = join_pages([" ".join(f"control{n}_{i}" for i in range(150)) for n in range(3)])
+        spans = chunk_text(text, page_offsets, chunk_size=400, overlap=80)
+        with store.SessionLocal() as session:
+            doc, _ = store.upsert_document(session, title="controls.pdf", file_path=path, content_hash="snapshot-test")
+            store._store_document_text(session, doc.id, "snapshot-test", text, page_offsets)
+            store.ingest_text_chunks(session, doc.id, [s.text for s in spans], embed, spans=spans, offsets_only=True)
+            session.commit()
+        with tempfile.TemporaryDirectory() as out:
+            export_snapshot(store, out, embed_model="snapshot-test")
+            with store.SessionLocal() as session:
+                session.delete(store.get_document_by_path(session, path))
+                session.commit()
+            import_snapshot(store, out, embed_model="snapshot-test", progress=None)
+        with store.SessionLocal() as session:
+            doc_id = store.get_document_by_path(session, path).id
+            stored = session.query(Chunk).filter(Chunk.document_id == doc_id, Chunk.text.isnot(None)).count()
+            has_text = session.get(DocumentText, doc_id) is not None
+        if stored or not has_text:
+            print(f"❌ Imported {stored} chunks with stored text; document text {'present' if has_text else 'missing'}")
+            return False
+        expected = len(chunk_text(text, page_offsets, chunk_size=200, overlap=40))
+        written = store.rechunk(embed, chunk_size=200, overlap=40, document_ids=[doc_id])
+        with store.SessionLocal() as session:
+            session.delete(session.get(Document, doc_id))
+            session.commit()
+        if written != expected:
+            print(f"❌ Re-chunking the imported document wrote {written} chunks, expected {expected}")
+            return False
+        print(f"✅ Snapshot kept {len(spans)} offset-only chunks; re-chunked into {written} after import")
+        return True
+    except Exception as e:
+        print(f"❌ Snapshot round-trip test failed: {e}")
+        return False
+
+def test_chunk_dedup():
+    """Test that a passage shared by two documents yields identical content-defined chunks and one search hit (offline)"""
+    try:
+        from rag_store import SearchResult, body_hash, chunk_text, dedup_results, join_pages
+
+        shared = " ".join(f"The organization shall define control {i} and review it annually." for i in range(60))
+        first, offsets_a = join_pages(["ISO preface on scope and terms. " + shared])
+        second, offsets_b = join_pages(["NIST special publication, chapter 3, with a longer preface. " + shared])
+        hashes = [
+            {body_hash(s.text) for s in chunk_text(text, offsets, chunk_size=400, overlap=60, boundaries=boundaries)}
+            for boundaries in ("fixed", "content")
+            for text, offsets in ((first, offsets_a), (second, offsets_b))
+        ]
+        fixed_shared, content_shared = len(hashes[0] & hashes[1]), len(hashes[2] & hashes[3])
+        if content_shared <= fixed_shared or content_shared < len(hashes[2]) // 2:
+            print(f"❌ Content-defined chunks share {content_shared} bodies, fixed windows {fixed_shared}")
+            return False
+        if any(s.char_end - s.char_start > 400 for s in chunk_text(second, offsets_b, 400, 60, "content")):
+            print("❌ A content-defined chunk exceeds chunk_size")
+            return False
+        results = [
+            SearchResult(text="t", document_title=title, file_path=f"/{title}", distance=d, body_hash=h)
+            for title, d, h in (("iso.pdf", 0.1, "a"), ("nist.pdf", 0.11, "a"), ("nist.pdf", 0.2, "b"), ("cobit.pdf", 0.3, None))
+        ]
+        kept = dedup_results(results, k=3)
+        if [r.document_title for r in kept] != ["iso.pdf", "nist.pdf", "cobit.pdf"] or kept[0].also_in != ["nist.pdf"]:
+            print(f"❌ Unexpected dedup result: {[(r.document_title, r.also_in) for r in kept]}")
+            return False
+        print(f"✅ Shared passage: {content_shared} identical content-defined chunks vs {fixed_shared} fixed; search keeps one")
+        return True
+    except Exception as e:
+        print(f"❌ Chunk dedup test failed: {e}")
+        return False
+
+def test_ollama_pool():
+    """Test least-outstanding routing, failover and ejection against local stub servers (offline)"""
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    try:
+        from ollama_pool import Backend, BackendPool
+
+        def stub(fail):
+            class Handler(BaseHTTPRequestHandler):
+                hits = 0
+
+                def _reply(self, status, body):
+                    data = json.dumps(body).encode()
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+
+                def do_GET(self):
+                    self._reply(200, {"models": [{"name": OLLAMA_MODEL}]})
+
+                def do_POST(self):
+                    type(self).hits += 1
+                    self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                    self._reply(500, {"error": "down"}) if fail["on"] else self._reply(200, {"response": "ok"})
+
+                def log_message(self, *args):
+                    pass
+
+            server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            return server, Handler
+
+        healthy, flaky = {"on": False}, {"on": False}
+        (server_a, handler_a), (server_b, handler_b) = stub(healthy), stub(flaky)
+        pool = BackendPool(
+            [Backend(f"http://127.0.0.1:{server.server_port}") for server in (server_a, server_b)],
+            max_failures=1,
+            health_interval=0,
+        )
+        payload = {"model": OLLAMA_MODEL, "prompt": "hi", "stream": False}
+        for _ in range(4):
+            pool.post("/api/generate", payload, timeout=5)
+        if handler_a.hits != 2 or handler_b.hits != 2:
+            print(f"❌ Requests were not spread evenly ({handler_a.hits}/{handler_b.hits})")
+            return False
+        flaky["on"] = True
+        answers = [pool.post("/api/generate", payload, timeout=5).json()["response"] for _ in range(4)]
+        ejected = not pool.status()[1]["healthy"]
+        pool.check_health()
+        readmitted = pool.status()[1]["healthy"]
+        for server in (server_a, server_b):
+            server.shutdown()
+        if answers != ["ok"] * 4 or handler_b.hits != 3 or not ejected or not readmitted:
+            print(f"❌ Failover/ejection misbehaved (answers {answers}, flaky hits {handler_b.hits}, ejected {ejected}, readmitted {readmitted})")
+            return False
+        print("✅ Backend pool spread requests, failed over, ejected and re-admitted the failing host")
+        return True
+    except Exception as e:
+        print(f"❌ Backend pool test failed: {e}")
+        return False
+
+def test_file_fingerprints():
+    """Test that fingerprints skip re-hashing and the verify sweep catches same-stat rewrites (offline)"""
+    import tempfile
+
+    try:
+        from fingerprint import FingerprintCache
+
+        with tempfile.TemporaryDirectory() as tmp:
+            doc = Path(tmp) / "doc.pdf"
+            doc.write_bytes(b"version one")
+            cache = FingerprintCache(Path(tmp) / "fingerprints.json")
+            first = cache.file_hash(str(doc))
+            if FingerprintCache(cache.path).lookup(str(doc)) != first:
+                print("❌ Fingerprint was not persisted")
+                return False
+            stat = doc.stat()
+            doc.write_bytes(b"version two")  # same size
+            os.utime(doc, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+            if cache.file_hash(str(doc)) != first:
+                print("❌ Unchanged stat signature still triggered a re-hash")
+                return False
+            if cache.verify() != [os.path.abspath(doc)] or cache.file_hash(str(doc)) == first:
+                print("❌ Verify sweep missed a rewrite that kept size and mtime")
+                return False
+        print("✅ Fingerprint cache reused hashes and the verify sweep caught the rewrite")
+        return True
+    except Exception as e:
+        print(f"❌ Fingerprint test failed: {e}")
+        return False
+
+def test_maintenance_plan():
+    """Test that maintenance plans ANALYZE, VACUUM and REINDEX from table/index statistics (offline)"""
+    try:
+        from maintenance import IndexStats, TableStats, plan
+
+        tables = [
+            TableStats("chunks", live_rows=100000, dead_rows=5000, modified_since_analyze=40000, writes=260000, size_bytes=0),
+            TableStats("documents", live_rows=500, dead_rows=200, modified_since_analyze=0, writes=900, size_bytes=0),
+        ]
+        indexes = [
+            IndexStats("ix_chunks_embedding_ivfflat", "chunks", "ivfflat", size_bytes=2**30, scans=0,
+                       options={"lists": "20"}, built_rows=20000, built_bytes=2**27, built_writes=20000),
+            IndexStats("ix_chunks_embedding_hnsw", "chunks", "hnsw", size_bytes=2**27, scans=0),
+        ]
+        actions = {(a.kind, a.target): a for a in plan(tables, indexes)}
+        reindex = actions.get(("reindex", "ix_chunks_embedding_ivfflat"))
+        if set(actions) != {("analyze", "chunks"), ("vacuum", "documents"), ("reindex", "ix_chunks_embedding_ivfflat"), ("baseline", "ix_chunks_embedding_hnsw")}:
+            print(f"❌ Unexpected plan: {sorted(actions)}")
+            return False
+        if reindex.statements != ["ALTER INDEX ix_chunks_embedding_ivfflat SET (lists = 100)", "REINDEX INDEX CONCURRENTLY ix_chunks_embedding_ivfflat"]:
+            print(f"❌ Unexpected reindex statements: {reindex.statements}")
+            return False
+        print(f"✅ Maintenance planned {len(actions)} actions ({reindex.reason})")
+        return True
+    except Exception as e:
+        print(f"❌ Maintenance plan test failed: {e}")
+        return False
+
 def find_random_pdf():
     """Find a random PDF file for testing"""
     docs_dir = Path("/Users/yavin/python_projects/DataManagement_Assistant/DM/it-management-and-audit-source-main")
@@ -237,6 +526,14 @@ def main():
         ("Database Connection", test_database_connection),
         ("pgvector Extension", test_pgvector_extension),
         ("RAG Store", test_rag_store),
+        ("Read/Write Split", test_read_write_split),
+        ("Context Compression", test_context_compression),
+        ("Offset Chunks", test_offset_chunks),
+        ("Snapshot Round Trip", test_snapshot_roundtrip),
+        ("Chunk Dedup", test_chunk_dedup),
+        ("Ollama Backend Pool", test_ollama_pool),
+        ("File Fingerprints", test_file_fingerprints),
+        ("Maintenance Plan", test_maintenance_plan),
         ("Streamlit Endpoint", test_streamlit_endpoint),
     ]
     
@@ -0,0 +1,132 @@
+"""
+Workflow metadata from workflow.md.
+
+Parses the document catalogue (focus, key areas, standards) and the phase ->
+primary documents mapping out of workflow.md, resolves them against actual PDF
+paths and persists the result as document tags in the RagStore, where
+RagStore.search can use them as a pre-filter.
+
+Run directly to tag every indexed document:
+
+    python workflow_meta.py
+"""
+
+import os
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# The file in repo is named with a trailing space: "workflow.md "
+DEFAULT_WORKFLOW_PATH = Path(__file__).resolve().parent / "workflow.md "
+
+
+def _sanitize(name: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "", name.lower())
+
+
+@lru_cache(maxsize=4)
+def load_workflow(workflow_path: Path = DEFAULT_WORKFLOW_PATH) -> Tuple[Dict[str, dict], Dict[str, List[str]]]:
+    """Return (usage_map, phase_documents).
+
+    usage_map maps a sanitized document name to its focus/key_areas/standards;
+    phase_documents maps a phase title to the sanitized names of its primary
+    documents ("all" when the phase uses every document).
+    """
+    usage_map: Dict[str, dict] = {}
+    phase_documents: Dict[str, List[str]] = {}
+    if not workflow_path.exists():
+        return usage_map, phase_documents
+    lines = workflow_path.read_text(encoding="utf-8", errors="ignore").splitlines()
+    current_doc = None
+    current_info: dict = {}
+    # First pass: document sections
+    for line in lines:
+        m = re.match(r"^###\s+\d+\.\s+(.*\.pdf)\s*$", line)
+        if m:
+            if current_doc and current_info:
+                usage_map[_sanitize(current_doc)] = current_info
+            current_doc = m.group(1).strip()
+            current_info = {"focus": None, "key_areas": None, "standards": None}
+            continue
+        if current_doc:
+            if line.strip().lower().startswith("- **focus**:"):
+                current_info["focus"] = line.split(":", 1)[1].strip()
+            elif line.strip().lower().startswith("- **key areas**:"):
+                current_info["key_areas"] = line.split(":", 1)[1].strip()
+            elif line.strip().lower().startswith("- **standards covered**:"):
+                current_info["standards"] = line.split(":", 1)[1].strip()
+    if current_doc and current_info:
+        usage_map[_sanitize(current_doc)] = current_info
+    # Second pass: phases -> primary documents
+    phase = None
+    for line in lines:
+        if line.startswith("### Phase "):
+            phase = line.replace("### ", "").strip()
+        if "**Primary Documents**" in line and phase:
+            # Extract comma-separated list after the colon
+            raw = line.split(":", 1)[1]
+            if raw.strip().lower().startswith("all"):
+                phase_documents[phase] = ["all"]
+                continue
+            docs = [re.sub(r"pdf$", "", _sanitize(d)) for d in re.split(r",|;", raw) if d.strip()]
+            phase_documents[phase] = [d for d in docs if d]
+    return usage_map, phase_documents
+
+
+def get_workflow_usage_for(file_path: str, workflow_path: Path = DEFAULT_WORKFLOW_PATH) -> Optional[dict]:
+    """Focus, key areas, standards and phases for a PDF, or None when workflow.md has nothing on it."""
+    usage_map, phase_documents = load_workflow(workflow_path)
+    s = _sanitize(os.path.basename(file_path))
+    # find best match by substring
+    best_key = None
+    for key in usage_map.keys():
+        if key in s or s in key:
+            best_key = key
+            break
+    if not best_key:
+        # Try fuzzy by dropping years/spaces
+        tokens = re.findall(r"[a-z0-9]+", s)
+        for key in usage_map.keys():
+            if all(tok in key for tok in tokens[:3]):
+                best_key = key
+                break
+    phases = sorted(
+        phase for phase, docs in phase_documents.items() if any(d == "all" or d in s for d in docs)
+    )
+    if not best_key and not phases:
+        return None
+    info = usage_map.get(best_key, {}) if best_key else {}
+    return {"focus": info.get("focus"), "key_areas": info.get("key_areas"), "standards": info.get("standards"), "phases": phases}
+
+
+def document_tags(file_path: str, workflow_path: Path = DEFAULT_WORKFLOW_PATH) -> Dict[str, List[str]]:
+    usage = get_workflow_usage_for(file_path, workflow_path)
+    if not usage:
+        return {}
+    tags: Dict[str, List[str]] = {"phase": usage["phases"]}
+    for kind in ("focus", "standards"):
+        if usage.get(kind):
+            tags[kind] = [usage[kind]]
+    return tags
+
+
+def sync_workflow_tags(store, file_paths: Optional[List[str]] = None, workflow_path: Path = DEFAULT_WORKFLOW_PATH) -> int:
+    """Persist workflow tags for file_paths (default: every indexed document); returns documents updated."""
+    paths = file_paths if file_paths is not None else store.list_document_paths()
+    return store.set_document_tags({path: document_tags(path, workflow_path) for path in paths})
+
+
+def main() -> None:
+    from rag_store import RagStore
+
+    store = RagStore()
+    store.ensure_schema()
+    updated = sync_workflow_tags(store)
+    print(f"Tagged {updated} documents")
+    for phase in store.tag_values("phase"):
+        print(f"  {phase}")
+
+
+if __name__ == "__main__":
+    main()